@@ -2,22 +2,44 @@ import json
 import streamlit.components.v1 as components
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
+import uuid
 import grade_logic
+import workbook_cache
+import search_index
+import intake_index
+import batch_analytics
+import merit_list
+import edit_journal
+import save_coordinator
 from datetime import datetime
 
 # Page Config
 st.set_page_config(page_title="Student Result System", page_icon="🎓", layout="wide")
 
 # Session State Initialization
-if 'all_sheets_data' not in st.session_state:
-    st.session_state.all_sheets_data = {}
+# Parsed workbooks live in the process-wide workbook_cache; a session keeps only its selections and edits
+# (plus its own copy of the running statistics of batches it has viewed, with its edits applied).
+if 'sheet_names' not in st.session_state:
+    st.session_state.sheet_names = []
 if 'current_file' not in st.session_state:
     st.session_state.current_file = None
 if 'pending_changes' not in st.session_state:
     st.session_state.pending_changes = {}
 if 'pending_deletes' not in st.session_state:
     st.session_state.pending_deletes = {}
+if 'batch_analytics' not in st.session_state:
+    st.session_state.batch_analytics = {}
+if 'session_id' not in st.session_state:
+    # Tags this session's journaled edits. It is kept in the page URL, so a tab reopened after a crash
+    # restores its own unsaved edits and never another user's
+    st.session_state.session_id = st.query_params.get("session") or uuid.uuid4().hex
+st.query_params["session"] = st.session_state.session_id
+if 'save_conflicts' not in st.session_state:
+    st.session_state.save_conflicts = []
+if 'auto_save_paused' not in st.session_state:
+    st.session_state.auto_save_paused = False  # An auto-save failed; edits wait for the next manual save
 if 'theme' not in st.session_state:
     st.session_state.theme = "Light"
 
@@ -147,6 +169,128 @@ st.markdown(f"""
 </style>
 """, unsafe_allow_html=True)
 
+def load_batch(file_path, sheet_name):
+    """Returns (df, subject_cols, subject_credits) for a batch from the shared workbook cache, or None."""
+    if lazy_load:
+        return workbook_cache.load_sheet_data(file_path, sheet_name)
+    data, cols, credits = workbook_cache.load_workbook_data(file_path, workers=load_workers)
+    if not data or sheet_name not in data:
+        return None
+    return data[sheet_name], cols[sheet_name], credits[sheet_name]
+
+def load_batch_frames(file_path, sheet_names):
+    """{sheet: df} of every batch of an intake (parses batches that are not loaded yet)."""
+    batches = {}
+    for sheet_name in sheet_names:
+        batch = load_batch(file_path, sheet_name)
+        if batch is not None:
+            batches[sheet_name] = batch[0]
+    return batches
+
+def build_name_index(file_path, sheet_names):
+    """Fuzzy name index over every batch of an intake."""
+    return search_index.NameIndex(load_batch_frames(file_path, sheet_names))
+
+def build_duplicate_map(file_path, sheet_names):
+    """Registration numbers entered more than once anywhere in an intake."""
+    return search_index.DuplicateMap(load_batch_frames(file_path, sheet_names))
+
+def scan_intake_duplicates(file_path):
+    st.session_state.duplicate_scan = file_path
+
+def student_option(row, name_col):
+    """Label of a student in the "Search Student" box."""
+    reg = str(row['Registration Number'])
+    if not name_col:
+        return reg
+    name = str(row[name_col]) if pd.notna(row[name_col]) else "Unknown"
+    return f"{reg} - {name}"
+
+def build_search_options(df, name_col):
+    """("Search Student" options, option -> RegNo) for a batch, built with vectorised string ops."""
+    if name_col:
+        regs = df['Registration Number'].astype(str)
+        names = df[name_col].astype(object)
+        labels = regs + " - " + names.where(names.notna(), "Unknown").astype(str)
+        search_map = dict(zip(labels, regs))
+        return ["Select a student..."] + sorted(search_map), search_map
+    # Fallback if no name column found
+    all_regs = df['Registration Number'].dropna().astype(str).unique().tolist()
+    return ["Select a student..."] + sorted(all_regs), {r: r for r in all_regs}
+
+def shared_analytics(file_path, sheet_name, df, subject_cols, subject_credits):
+    """Running GPA totals and batch statistics of a saved batch, shared by all sessions."""
+    return workbook_cache.cached_in_memory(
+        file_path, "analytics:" + sheet_name,
+        lambda: batch_analytics.BatchAnalytics(df, subject_cols, subject_credits)
+    )
+
+def session_analytics(file_path, sheet_name, df, subject_cols, subject_credits):
+    """Running GPA totals and batch statistics for this session: the shared ones with its pending edits applied."""
+    shared = shared_analytics(file_path, sheet_name, df, subject_cols, subject_credits)
+    cached = st.session_state.batch_analytics.get((file_path, sheet_name))
+    if cached is not None and cached[0] is shared:
+        return cached[1]
+
+    # First use, or the workbook changed underneath: copy the shared statistics and replay pending edits
+    analytics = shared.copy()
+    regs = df['Registration Number'].to_numpy()
+    for reg_no, changes in st.session_state.pending_changes.get(sheet_name, {}).items():
+        for pos in np.flatnonzero(regs == reg_no):
+            for sub, grade in changes.items():
+                analytics.set_grade(pos, sub, grade)
+    st.session_state.batch_analytics[(file_path, sheet_name)] = (shared, analytics)
+    return analytics
+
+def merit_entries(file_name, sheet_names):
+    """Merit list rows of the given batches of an intake. The open intake is ranked with this
+    session's unsaved edits; other intakes as saved."""
+    file_path = os.path.join(sheets_dir, file_name)
+    frames = []
+    for sheet_name in sheet_names:
+        batch = load_batch(file_path, sheet_name)
+        if batch is None: continue
+        if file_name == st.session_state.current_file:
+            analytics = session_analytics(file_path, sheet_name, *batch)
+        else:
+            analytics = shared_analytics(file_path, sheet_name, *batch)
+        frames.append(merit_list.batch_entries(batch[0], analytics.totals, sheet_name, file_name))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=merit_list.MERIT_COLUMNS)
+
+def save_pending(file_path, sheet_names, overwrite=False):
+    """Saves this session's edits to an intake through its process-wide coordinator, which runs one save
+    of a workbook at a time. Edits of results another session has saved since are not written unless
+    overwrite is set; they are left in session_state.save_conflicts. Returns (ok, message)."""
+    coordinator = save_coordinator.coordinator_for(file_path)
+    # Loaded batches carry the layout recorded while they were streamed, so the save looks rows and
+    # columns up instead of scanning each sheet (it rescans only if the file changed since)
+    ok, message = coordinator.save(
+        st.session_state.session_id,
+        lambda affected: load_batch_frames(file_path, [s for s in sheet_names if s in affected]),
+        overwrite=overwrite
+    )
+    st.session_state.save_conflicts = coordinator.take_conflicts(st.session_state.session_id)
+    if ok:
+        st.session_state.auto_save_paused = False
+        st.session_state.pending_changes = {}
+        st.session_state.pending_deletes = {}
+        st.session_state.batch_analytics = {}
+    return ok, message
+
+def select_student(sheet_name, option):
+    """Jumps the batch and student boxes to a name search hit."""
+    st.session_state.selected_sheet = sheet_name
+    st.session_state.student_option = option
+
+def open_student(file_name, sheet_name, row):
+    """Jumps the intake, batch and student boxes to an all-intake search hit."""
+    st.session_state.selected_file = file_name
+    st.session_state.selected_sheet = sheet_name
+    batch = load_batch(os.path.join(sheets_dir, file_name), sheet_name)
+    if batch is not None and row in batch[0].index:
+        df = batch[0]
+        st.session_state.student_option = student_option(df.loc[row], search_index.find_name_column(df))
+
 # Main Header
 st.markdown('<div class="main-header">🎓 Student Result System</div>', unsafe_allow_html=True)
 
@@ -155,350 +299,594 @@ st.sidebar.title("Control Panel")
 
 # File Selection
 sheets_dir = "sheets"
+# Worker processes used to parse a workbook's sheets (1 = serial)
+load_workers = min(4, os.cpu_count() or 1)
+# Parse each batch only when it is first selected instead of the whole workbook up front
+lazy_load = True
+# Memory shared by all sessions for parsed workbooks (least recently used batches are dropped first)
+workbook_cache.memory_cache.set_budget(1024 * 1024 * 1024)
 if not os.path.exists(sheets_dir):
     os.makedirs(sheets_dir)
 
 files = [f for f in os.listdir(sheets_dir) if f.endswith(('.xlsx', '.xls'))]
-selected_file = st.sidebar.selectbox("Select Intake", ["Select a file..."] + files)
+
+# Search every intake through the SQLite student index, which one background thread per process keeps in step with sheets/
+indexer = intake_index.start_indexer(sheets_dir)
+global_query = st.sidebar.text_input("Search All Intakes (Reg No or Name)")
+if global_query.strip():
+    hits = intake_index.search(global_query, limit=20)
+    if not hits:
+        st.sidebar.caption("No matching students." if indexer.indexed.is_set() else "Still indexing intakes...")
+    for file_name, sheet_name, row, reg, name in hits:
+        st.sidebar.button(f"[{file_name} / {sheet_name}] {reg} - {name or 'Unknown'}",
+                          key=f"intake-hit-{file_name}-{sheet_name}-{row}",
+                          on_click=open_student, args=(file_name, sheet_name, row))
+
+intake_options = ["Select a file..."] + files
+if st.session_state.get("selected_file") not in intake_options:
+    st.session_state.pop("selected_file", None)
+selected_file = st.sidebar.selectbox("Select Intake", intake_options, key="selected_file")
 
 if selected_file != "Select a file..." and selected_file != st.session_state.current_file:
     file_path = os.path.join(sheets_dir, selected_file)
     with st.spinner(f"Loading {selected_file}..."):
-        data, cols, credits = grade_logic.load_workbook_data(file_path)
-        if data:
-            st.session_state.all_sheets_data = data
-            st.session_state.subject_columns_per_sheet = cols
-            st.session_state.subject_credits_per_sheet = credits
+        if lazy_load:
+            sheet_names = workbook_cache.list_result_sheets(file_path)
+        else:
+            data, cols, credits = workbook_cache.load_workbook_data(file_path, workers=load_workers)
+            sheet_names = list(data.keys()) if data else None
+        if sheet_names:
+            st.session_state.sheet_names = sheet_names
             st.session_state.current_file = selected_file
-            st.session_state.pending_changes = {}
-            st.session_state.pending_deletes = {}
+            # Edits this session journaled for the intake but did not save (e.g. before its tab crashed) are picked up
+            journal = edit_journal.journal_for(file_path)
+            session_id = st.session_state.session_id
+            st.session_state.pending_changes, st.session_state.pending_deletes = journal.replay(session_id)
+            st.session_state.batch_analytics = {}
             st.success(f"Loaded {selected_file}")
+            if journal.count(session_id):
+                st.info(f"Restored {journal.count(session_id)} unsaved edit(s) from the journal.")
         else:
             st.error("Failed to load workbook.")
 
 if st.session_state.current_file:
-    sheet_names = list(st.session_state.all_sheets_data.keys())
-    selected_sheet = st.sidebar.selectbox("Select Batch", sheet_names)
+    sheet_names = st.session_state.sheet_names
+    batch_path = os.path.join(sheets_dir, st.session_state.current_file)
+    journal = edit_journal.journal_for(batch_path)
+
+    # Name search across all batches of the intake; picking a hit selects its batch and student
+    name_query = st.sidebar.text_input("Find Student by Name (all batches)")
+    if name_query.strip():
+        name_index = workbook_cache.cached_in_memory(
+            batch_path, "name-index", lambda: build_name_index(batch_path, sheet_names)
+        )
+        hits = name_index.search(name_query)
+        if not hits:
+            st.sidebar.caption("No matching names.")
+        for sheet_name, idx, score in hits:
+            hit_df = load_batch(batch_path, sheet_name)[0]
+            option = student_option(hit_df.loc[idx], search_index.find_name_column(hit_df))
+            st.sidebar.button(f"[{sheet_name}] {option} ({score:.0%})", key=f"name-hit-{sheet_name}-{idx}",
+                              on_click=select_student, args=(sheet_name, option))
+
+    if st.session_state.get("selected_sheet") not in sheet_names:
+        st.session_state.pop("selected_sheet", None)
+    selected_sheet = st.sidebar.selectbox("Select Batch", sheet_names, key="selected_sheet")
+    
+    # Batches come from the shared cache; in lazy mode a batch is parsed the first time anyone selects it
+    batch = None
+    if selected_sheet:
+        with st.spinner(f"Loading {selected_sheet}..."):
+            batch = load_batch(batch_path, selected_sheet)
+        if batch is None:
+            st.warning(f"No student results found in {selected_sheet}.")
     
     include_gpa = st.sidebar.checkbox("Include GPA & Class in Transcript", value=True)
 
-    if selected_sheet:
-        df = st.session_state.all_sheets_data[selected_sheet]
+    has_pending = bool(st.session_state.pending_changes or st.session_state.pending_deletes)
+    if st.sidebar.button("Save Changes to Excel", disabled=not has_pending):
+        with st.spinner("Saving..."):
+            ok, message = save_pending(batch_path, sheet_names)
+        if ok:
+            st.sidebar.success(message)
+        else:
+            st.sidebar.error(message)
 
-        # Search via Selectbox
-        # Identify Name Column
-        name_col = next((c for c in df.columns if "name" in c.lower()), None)
+    # Results another session saved after this one edited them: nothing is written until the user
+    # chooses to overwrite them or changes their edits to match
+    if st.session_state.save_conflicts and has_pending:
+        st.sidebar.warning("Another session has saved different results for cells you edited:\n" + "\n".join(
+            f"- {c['sheet']} / {c['reg']} / {c['subject']}: {c['was'] or '(blank)'} → saved {c['saved'] or '(blank)'}, "
+            f"yours {c['yours'] or '(blank)'}"
+            for c in st.session_state.save_conflicts
+        ))
+        if st.sidebar.button("Save Anyway (overwrite their results)"):
+            with st.spinner("Saving..."):
+                ok, message = save_pending(batch_path, sheet_names, overwrite=True)
+            if ok:
+                st.sidebar.success(message)
+            else:
+                st.sidebar.error(message)
+
+    if batch is not None:
+        df, valid_subjects, subject_credits = batch
+
+        # Duplicate registration numbers of the batch, grouped once per version of the workbook
+        batch_duplicates = workbook_cache.cached_in_memory(
+            batch_path, "duplicates:" + selected_sheet,
+            lambda: search_index.DuplicateMap({selected_sheet: df})
+        )
+
+        tab_student, tab_analytics, tab_merit, tab_quality = st.tabs(["Student Results", "Batch Analytics", "Merit List", "Data Quality"])
+
+        with tab_student:
+            # Search via Selectbox
+            # Identify Name Column
+            name_col = next((c for c in df.columns if "name" in c.lower()), None)
         
-        # Create Search Options: "RegNo - Name"
-        if name_col:
-            # Create a dictionary for mapping: "RegNo - Name" -> RegNo
-            # We use a list comprehension to handle potential missing values gracefully
-            search_map = {}
-            for idx, row in df.iterrows():
-                reg = str(row['Registration Number'])
-                name = str(row[name_col]) if pd.notna(row[name_col]) else "Unknown"
-                display_str = f"{reg} - {name}"
-                search_map[display_str] = reg
-            
-            search_options = ["Select a student..."] + sorted(list(search_map.keys()))
-        else:
-            # Fallback if no name column found
-            all_regs = df['Registration Number'].dropna().astype(str).unique().tolist()
-            search_options = ["Select a student..."] + sorted(all_regs)
-            search_map = {r: r for r in all_regs}
+            # Create Search Options: "RegNo - Name"
+            # Built once per version of the workbook and batch rather than on every rerun (each grade edit reruns)
+            search_options, search_map = workbook_cache.cached_in_memory(
+                batch_path, "search-options:" + selected_sheet,
+                lambda: build_search_options(df, name_col)
+            )
 
-        selected_option = st.selectbox("Search Student", search_options, index=0)
+            # A name search hit may have picked a student; anything not in this batch resets the box
+            if st.session_state.get("student_option") not in search_options:
+                st.session_state.pop("student_option", None)
+            selected_option = st.selectbox("Search Student", search_options, key="student_option")
+            repeated = batch_duplicates.sheet_count(selected_sheet)
+            if repeated:
+                st.warning(f"{repeated} registration number(s) appear more than once in this batch. See the Data Quality tab.")
         
-        student_row = None
-        student_idx = None
+            student_row = None
+            student_idx = None
         
-        if selected_option != "Select a student...":
-            # Extract RegNo from selection
-            if name_col:
-                selected_reg = search_map[selected_option]
-            else:
-                selected_reg = selected_option
+            if selected_option != "Select a student...":
+                # Extract RegNo from selection
+                if name_col:
+                    selected_reg = search_map[selected_option]
+                else:
+                    selected_reg = selected_option
                 
-            matches = df[df['Registration Number'].astype(str) == selected_reg]
+                # Registration lookups go through an index built once per batch and shared by all sessions
+                reg_index = workbook_cache.cached_in_memory(
+                    batch_path, "reg-index:" + selected_sheet,
+                    lambda: search_index.RegistrationIndex({selected_sheet: df})
+                )
+                # Repeated numbers come straight from the duplicate groups
+                rows = batch_duplicates.in_sheet(selected_sheet, selected_reg) or [idx for _, idx in reg_index.exact(selected_reg)]
+                matches = df.loc[rows]
             
-            if len(matches) == 0:
-                st.warning("Student not found.")
-            elif len(matches) > 1:
-                st.info(f"Multiple entries found for {selected_reg}. Select one below.")
-                cols_to_show = ['Registration Number']
-                if len(matches.columns) > 1:
-                    second_col = matches.columns[1]
-                    if second_col != 'Registration Number':
-                        cols_to_show.append(second_col)
+                if len(matches) == 0:
+                    st.warning("Student not found.")
+                elif len(matches) > 1:
+                    st.info(f"Multiple entries found for {selected_reg}. Select one below.")
+                    cols_to_show = ['Registration Number']
+                    if len(matches.columns) > 1:
+                        second_col = matches.columns[1]
+                        if second_col != 'Registration Number':
+                            cols_to_show.append(second_col)
                 
-                event = st.dataframe(
-                    matches[cols_to_show],
-                    on_select="rerun",
-                    selection_mode="single-row",
-                    width="stretch",
-                    hide_index=True
-                )
+                    event = st.dataframe(
+                        matches[cols_to_show],
+                        on_select="rerun",
+                        selection_mode="single-row",
+                        width="stretch",
+                        hide_index=True
+                    )
                 
-                if len(event.selection.rows) > 0:
-                    selected_row_idx = event.selection.rows[0]
-                    student_idx = matches.index[selected_row_idx]
-                    student_row = matches.loc[student_idx]
-            else:
-                student_idx = matches.index[0]
-                student_row = matches.iloc[0]
+                    if len(event.selection.rows) > 0:
+                        selected_row_idx = event.selection.rows[0]
+                        student_idx = matches.index[selected_row_idx]
+                        student_row = matches.loc[student_idx]
+                else:
+                    student_idx = matches.index[0]
+                    student_row = matches.iloc[0]
 
-        if student_row is not None:
-            # Student Info
-            name_col = next((c for c in df.columns if "name" in c.lower()), None)
-            name = student_row[name_col] if name_col else "Unknown"
-            reg_no = student_row['Registration Number']
-            
-            # Prepare Data for Editor
-            valid_subjects = st.session_state.subject_columns_per_sheet.get(selected_sheet, [])
-            subject_credits = st.session_state.subject_credits_per_sheet.get(selected_sheet, {})
+            if student_row is not None:
+                # Student Info
+                name_col = next((c for c in df.columns if "name" in c.lower()), None)
+                name = student_row[name_col] if name_col else "Unknown"
+                reg_no = student_row['Registration Number']
             
-            editor_data = []
-            for sub in valid_subjects:
-                grade = student_row[sub]
-                # Ensure grade is a scalar value (not a Series)
-                if isinstance(grade, pd.Series):
-                    grade = grade.iloc[0] if len(grade) > 0 else ""
-                grade_display = grade if pd.notna(grade) and str(grade).strip() != "" else ""
+                # Prepare Data for Editor
+                editor_data = []
+                for sub in valid_subjects:
+                    grade = student_row[sub]
+                    # Ensure grade is a scalar value (not a Series)
+                    if isinstance(grade, pd.Series):
+                        grade = grade.iloc[0] if len(grade) > 0 else ""
+                    grade_display = grade if pd.notna(grade) and str(grade).strip() != "" else ""
                 
-                # Check for pending changes
-                if selected_sheet in st.session_state.pending_changes:
-                    if reg_no in st.session_state.pending_changes[selected_sheet]:
-                        if sub in st.session_state.pending_changes[selected_sheet][reg_no]:
-                            grade_display = st.session_state.pending_changes[selected_sheet][reg_no][sub]
+                    # Check for pending changes
+                    if selected_sheet in st.session_state.pending_changes:
+                        if reg_no in st.session_state.pending_changes[selected_sheet]:
+                            if sub in st.session_state.pending_changes[selected_sheet][reg_no]:
+                                grade_display = st.session_state.pending_changes[selected_sheet][reg_no][sub]
 
-                editor_data.append({"Subject": sub, "Grade": grade_display})
+                    editor_data.append({"Subject": sub, "Grade": grade_display})
                 
-            editor_df = pd.DataFrame(editor_data)
-            editor_df.index = editor_df.index + 1
+                editor_df = pd.DataFrame(editor_data)
+                editor_df.index = editor_df.index + 1
             
-            # Calculate GPA (Initial)
-            current_grades = [row['Grade'] for row in editor_data]
-            current_credits = [subject_credits.get(row['Subject'], None) for row in editor_data]
-            gpa = grade_logic.calculate_gpa(current_grades, current_credits)
-            class_awarded = grade_logic.calculate_class(gpa)
-
-            # Layout: Info & Metrics Side-by-Side
-            col_info, col_metrics = st.columns([2, 1])
+                # GPA comes from the batch's running totals, which each grade edit updates without rescanning the sheet
+                analytics = session_analytics(batch_path, selected_sheet, df, valid_subjects, subject_credits)
+                student_positions = np.flatnonzero(df['Registration Number'].to_numpy() == reg_no)
+
+                # Layout: Info & Metrics Side-by-Side
+                col_info, col_metrics = st.columns([2, 1])
             
-            with col_info:
-                st.markdown(f"""
-                <div class="card">
-                    <div style="font-size: 1.2rem; font-weight: bold; margin-bottom: 5px;">{name}</div>
-                    <p style="margin: 0; font-size: 0.9rem;"><b>Reg:</b> {reg_no} | <b>Sheet:</b> {selected_sheet}</p>
-                </div>
-                """, unsafe_allow_html=True)
+                with col_info:
+                    st.markdown(f"""
+                    <div class="card">
+                        <div style="font-size: 1.2rem; font-weight: bold; margin-bottom: 5px;">{name}</div>
+                        <p style="margin: 0; font-size: 0.9rem;"><b>Reg:</b> {reg_no} | <b>Sheet:</b> {selected_sheet}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
             
-            with col_metrics:
-                st.markdown(f"""
-                <div class="metric-box">
-                    <div class="metric-label">GPA</div>
-                    <div class="metric-value">{gpa:.2f}</div>
-                    <div class="metric-label" style="margin-top:5px;">{class_awarded}</div>
-                </div>
-                """, unsafe_allow_html=True)
+                # Filled in below, once this run's edits have reached the GPA totals
+                metrics_slot = col_metrics.empty()
             
-            st.markdown('<div class="sub-header">Results</div>', unsafe_allow_html=True)
+                st.markdown('<div class="sub-header">Results</div>', unsafe_allow_html=True)
             
-            edited_df = st.data_editor(
-                editor_df, 
-                column_config={
-                    "Subject": st.column_config.TextColumn("Subject", disabled=True),
-                    "Grade": st.column_config.TextColumn("Grade")
-                },
-                width="stretch",
-                key="grade_editor"
-            )
+                edited_df = st.data_editor(
+                    editor_df, 
+                    column_config={
+                        "Subject": st.column_config.TextColumn("Subject", disabled=True),
+                        "Grade": st.column_config.TextColumn("Grade")
+                    },
+                    width="stretch",
+                    key="grade_editor"
+                )
             
-            # Process Edits & Recalculate GPA if needed
-            changes_detected = False
-            recalc_needed = False
+                # Process Edits & Recalculate GPA if needed
+                changes_detected = False
             
-            for index, row in edited_df.iterrows():
-                sub = row['Subject']
-                new_grade = row['Grade']
-                original_grade = next((item['Grade'] for item in editor_data if item['Subject'] == sub), "")
+                for index, row in edited_df.iterrows():
+                    sub = row['Subject']
+                    new_grade = row['Grade']
+                    original_grade = next((item['Grade'] for item in editor_data if item['Subject'] == sub), "")
                 
-                if new_grade != original_grade:
-                    changes_detected = True
-                    recalc_needed = True
-                    # Update Pending Changes
-                    if selected_sheet not in st.session_state.pending_changes:
-                        st.session_state.pending_changes[selected_sheet] = {}
-                    if reg_no not in st.session_state.pending_changes[selected_sheet]:
-                        st.session_state.pending_changes[selected_sheet][reg_no] = {}
+                    if new_grade != original_grade:
+                        changes_detected = True
+                        # Update Pending Changes
+                        if selected_sheet not in st.session_state.pending_changes:
+                            st.session_state.pending_changes[selected_sheet] = {}
+                        if reg_no not in st.session_state.pending_changes[selected_sheet]:
+                            st.session_state.pending_changes[selected_sheet][reg_no] = {}
                     
-                    st.session_state.pending_changes[selected_sheet][reg_no][sub] = new_grade
+                        st.session_state.pending_changes[selected_sheet][reg_no][sub] = new_grade
+                        journal.record_grade(selected_sheet, reg_no, sub, new_grade,
+                                             session=st.session_state.session_id, was=original_grade)
+                        for pos in student_positions:
+                            analytics.set_grade(pos, sub, new_grade)
             
-            if recalc_needed:
-                # Recalculate GPA with new values for display update (requires rerun or dynamic update)
-                # Since we can't easily update the metrics above without a rerun, we'll rely on the next rerun.
-                # However, st.data_editor triggers a rerun on edit, so the values above will update automatically!
-                pass
-
-            if changes_detected:
-                st.info("Changes detected. Click 'Save Changes to Excel' in the sidebar to commit.")
+                gpa = analytics.totals.student_gpa(df.index.get_loc(student_idx))
+                class_awarded = analytics.totals.student_class(df.index.get_loc(student_idx))
+                metrics_slot.markdown(f"""
+                <div class="metric-box">
+                    <div class="metric-label">GPA</div>
+                    <div class="metric-value">{gpa:.2f}</div>
+                    <div class="metric-label" style="margin-top:5px;">{class_awarded}</div>
+                </div>
+                """, unsafe_allow_html=True)
+
+                if changes_detected and journal.due(st.session_state.session_id) and not st.session_state.auto_save_paused:
+                    # Enough edits are journaled: checkpoint them into the workbook now
+                    with st.spinner("Auto-saving journaled edits..."):
+                        ok, message = save_pending(batch_path, sheet_names)
+                    if ok:
+                        st.success("Journaled edits auto-saved to Excel.")
+                    else:
+                        # Retrying on every edit would run a full failing save each time: say so once and wait
+                        st.session_state.auto_save_paused = True
+                        st.warning(f"Auto-save failed, edits kept in journal: {message} "
+                                   "Auto-save is paused until you click 'Save Changes to Excel'.")
+                elif changes_detected:
+                    st.info("Changes detected. Click 'Save Changes to Excel' in the sidebar to commit.")
             
-            # Actions in Sidebar
-            st.sidebar.markdown("---")
-            st.sidebar.markdown("### Actions")
+                # Actions in Sidebar
+                st.sidebar.markdown("---")
+                st.sidebar.markdown("### Actions")
             
-            if st.sidebar.button("Print Transcript"):
-                # Generate HTML
-                date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                if st.sidebar.button("Print Transcript"):
+                    # Generate HTML
+                    date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 
-                table_rows = ""
-                for idx, (_, row) in enumerate(edited_df.iterrows()):
-                    table_rows += f"<tr><td style='padding:8px; border-bottom:1px solid #ddd;'>{idx+1}</td><td style='padding:8px; border-bottom:1px solid #ddd;'>{row['Subject']}</td><td style='padding:8px; border-bottom:1px solid #ddd; text-align:center;'><b>{row['Grade']}</b></td></tr>"
+                    table_rows = ""
+                    for idx, (_, row) in enumerate(edited_df.iterrows()):
+                        table_rows += f"<tr><td style='padding:8px; border-bottom:1px solid #ddd;'>{idx+1}</td><td style='padding:8px; border-bottom:1px solid #ddd;'>{row['Subject']}</td><td style='padding:8px; border-bottom:1px solid #ddd; text-align:center;'><b>{row['Grade']}</b></td></tr>"
 
-                summary_rows = ""
-                if include_gpa:
-                    summary_rows += f"<tr><td><b>GPA:</b></td><td>{gpa:.2f}</td></tr>"
-                    summary_rows += f"<tr><td><b>Class Awarded:</b></td><td>{class_awarded}</td></tr>"
+                    summary_rows = ""
+                    if include_gpa:
+                        summary_rows += f"<tr><td><b>GPA:</b></td><td>{gpa:.2f}</td></tr>"
+                        summary_rows += f"<tr><td><b>Class Awarded:</b></td><td>{class_awarded}</td></tr>"
                 
-                html_content = f"""
-                <html>
-                <head>
-                    <title>Result Sheet - {reg_no}</title>
-                    <style>
-                        body {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 25px 35px; color: #333; }}
-                        h1,h2 {{ text-align: center; margin: 0; padding: 0; }}
-                        h3 {{ text-align: center; color: #666; margin: 5px 0; }}
-                        .header-box {{ display: flex; justify-content: space-between; border-top: 2px solid #333; border-bottom: 2px solid #333; padding: 10px 0; margin: 10px 0; }}
-                        .header-left, .header-right {{ width: 48%; }}
-                        .info-row {{ margin-bottom: 4px; font-size: 14px; }}
-                        table {{ width: 100%; border-collapse: collapse; margin-top: 5px; }}
-                        th {{ background-color: #f2f2f2; text-align: left; padding: 8px; border-bottom: 2px solid #aaa; font-size: 14px; }}
-                        td {{ padding: 6px 8px; font-size: 13px; }}
-                        .summary-box {{ margin-top: 15px; padding: 12px; background-color: #f9f9f9; border: 1px solid #ddd; }}
-                        
-                        /* Footer styling for print */
-                        .page-footer {{
-                            text-align: center;
-                            font-size: 11px;
-                            color: #666;
-                            margin-top: 25px;
-                        }}
+                    html_content = f"""
+                    <html>
+                    <head>
+                        <title>Result Sheet - {reg_no}</title>
+                        <style>
+                            body {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 25px 35px; color: #333; }}
+                            h1,h2 {{ text-align: center; margin: 0; padding: 0; }}
+                            h3 {{ text-align: center; color: #666; margin: 5px 0; }}
+                            .header-box {{ display: flex; justify-content: space-between; border-top: 2px solid #333; border-bottom: 2px solid #333; padding: 10px 0; margin: 10px 0; }}
+                            .header-left, .header-right {{ width: 48%; }}
+                            .info-row {{ margin-bottom: 4px; font-size: 14px; }}
+                            table {{ width: 100%; border-collapse: collapse; margin-top: 5px; }}
+                            th {{ background-color: #f2f2f2; text-align: left; padding: 8px; border-bottom: 2px solid #aaa; font-size: 14px; }}
+                            td {{ padding: 6px 8px; font-size: 13px; }}
+                            .summary-box {{ margin-top: 15px; padding: 12px; background-color: #f9f9f9; border: 1px solid #ddd; }}
                         
-                        @media print {{
-                            body {{ -webkit-print-color-adjust: exact; margin: 15px 25px; }}
-                            
-                            /* Minimize spacing for print to fit table on first page */
-                            h1, h2 {{ margin: 0; padding: 0; font-size: 18px; }}
-                            h3 {{ margin: 3px 0; font-size: 14px; }}
-                            .header-box {{ padding: 8px 0; margin: 8px 0; }}
-                            .info-row {{ margin-bottom: 2px; font-size: 12px; }}
-                            table {{ margin-top: 5px; }}
-                            th {{ padding: 6px; font-size: 12px; }}
-                            td {{ padding: 5px 6px; font-size: 11px; }}
-                            
-                            /* Fixed footer on every page */
+                            /* Footer styling for print */
                             .page-footer {{
-                                position: fixed;
-                                bottom: 0;
-                                left: 0;
-                                right: 0;
                                 text-align: center;
-                                font-size: 9px;
-                                color: #888;
-                                padding: 8px 0;
-                                border-top: 1px solid #ddd;
-                                background: white;
-                                height: 35px;
+                                font-size: 11px;
+                                color: #666;
+                                margin-top: 25px;
                             }}
+                        
+                            @media print {{
+                                body {{ -webkit-print-color-adjust: exact; margin: 15px 25px; }}
                             
-                            /* Minimal space for footer */
-                            body {{
-                                margin-bottom: 45px;
-                            }}
+                                /* Minimize spacing for print to fit table on first page */
+                                h1, h2 {{ margin: 0; padding: 0; font-size: 18px; }}
+                                h3 {{ margin: 3px 0; font-size: 14px; }}
+                                .header-box {{ padding: 8px 0; margin: 8px 0; }}
+                                .info-row {{ margin-bottom: 2px; font-size: 12px; }}
+                                table {{ margin-top: 5px; }}
+                                th {{ padding: 6px; font-size: 12px; }}
+                                td {{ padding: 5px 6px; font-size: 11px; }}
                             
-                            /* Ensure tables don't break awkwardly */
-                            .summary-box {{
-                                page-break-inside: avoid;
+                                /* Fixed footer on every page */
+                                .page-footer {{
+                                    position: fixed;
+                                    bottom: 0;
+                                    left: 0;
+                                    right: 0;
+                                    text-align: center;
+                                    font-size: 9px;
+                                    color: #888;
+                                    padding: 8px 0;
+                                    border-top: 1px solid #ddd;
+                                    background: white;
+                                    height: 35px;
+                                }}
+                            
+                                /* Minimal space for footer */
+                                body {{
+                                    margin-bottom: 45px;
+                                }}
+                            
+                                /* Ensure tables don't break awkwardly */
+                                .summary-box {{
+                                    page-break-inside: avoid;
+                                }}
                             }}
-                        }}
-                    </style>
-                </head>
-                <body>
-                    <h2>SAB Campus of Chartered Accountants Sri Lanka </h2>
-                    <h1>Student Result Sheet</h1>
-                    <h3>{selected_sheet}</h3>
-                    <div class="header-box">
-                        <div class="header-left">
-                            <div class="info-row"><b>Name:</b> {name}</div>
-                            <div class="info-row"><b>Registration No:</b> {reg_no}</div>
-                        </div>
-                        <div class="header-right">
-                            <div class="info-row"><b>Date Issued:</b> {date_str}</div>
+                        </style>
+                    </head>
+                    <body>
+                        <h2>SAB Campus of Chartered Accountants Sri Lanka </h2>
+                        <h1>Student Result Sheet</h1>
+                        <h3>{selected_sheet}</h3>
+                        <div class="header-box">
+                            <div class="header-left">
+                                <div class="info-row"><b>Name:</b> {name}</div>
+                                <div class="info-row"><b>Registration No:</b> {reg_no}</div>
+                            </div>
+                            <div class="header-right">
+                                <div class="info-row"><b>Date Issued:</b> {date_str}</div>
+                            </div>
                         </div>
-                    </div>
-                    <table>
-                        <thead>
-                            <tr>
-                                <th width="10%">#</th>
-                                <th width="70%">Subject</th>
-                                <th width="20%" style="text-align:center;">Grade</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                            {table_rows}
-                        </tbody>
-                    </table>
-                    <div class="summary-box">
-                        <table style="margin-top:0; width:50%">
-                            {summary_rows}
+                        <table>
+                            <thead>
+                                <tr>
+                                    <th width="10%">#</th>
+                                    <th width="70%">Subject</th>
+                                    <th width="20%" style="text-align:center;">Grade</th>
+                                </tr>
+                            </thead>
+                            <tbody>
+                                {table_rows}
+                            </tbody>
                         </table>
-                    </div>
+                        <div class="summary-box">
+                            <table style="margin-top:0; width:50%">
+                                {summary_rows}
+                            </table>
+                        </div>
                     
-                    <!-- Footer appears on every page when printed -->
-                    <div class="page-footer">
-                        <p style="margin: 5px 0;">Generated by SAB Campus - Student Results System</p>
-                        <p style="position: absolute; right: 20px; bottom: 10px; margin: 0; font-size: 9px; color: #aaa;">Dev@Salinda</p>
-                    </div>
-                </body>
-                </html>
-                """
+                        <!-- Footer appears on every page when printed -->
+                        <div class="page-footer">
+                            <p style="margin: 5px 0;">Generated by SAB Campus - Student Results System</p>
+                            <p style="position: absolute; right: 20px; bottom: 10px; margin: 0; font-size: 9px; color: #aaa;">Dev@Salinda</p>
+                        </div>
+                    </body>
+                    </html>
+                    """
                 
-                # JavaScript to open window and print
-                js_code = f"""
-                <script>
-                    var printWindow = window.open('', '_blank');
-                    printWindow.document.write({json.dumps(html_content)});
-                    printWindow.document.close();
-                    printWindow.focus();
-                    printWindow.print();
-                </script>
-                """
-                components.html(js_code, height=0, width=0)
+                    # JavaScript to open window and print
+                    js_code = f"""
+                    <script>
+                        var printWindow = window.open('', '_blank');
+                        printWindow.document.write({json.dumps(html_content)});
+                        printWindow.document.close();
+                        printWindow.focus();
+                        printWindow.print();
+                    </script>
+                    """
+                    components.html(js_code, height=0, width=0)
             
-            # Download Student Results as Excel
-            # Create a DataFrame with the student's results
-            download_df = edited_df.copy()
-            download_df.insert(0, 'Student Name', name)
-            download_df.insert(1, 'Registration Number', reg_no)
-            download_df.insert(2, 'Batch', selected_sheet)
-            if include_gpa:
-                download_df['GPA'] = gpa
-                download_df['Class'] = class_awarded
+                # Download Student Results as Excel
+                # Create a DataFrame with the student's results
+                download_df = edited_df.copy()
+                download_df.insert(0, 'Student Name', name)
+                download_df.insert(1, 'Registration Number', reg_no)
+                download_df.insert(2, 'Batch', selected_sheet)
+                if include_gpa:
+                    download_df['GPA'] = gpa
+                    download_df['Class'] = class_awarded
             
-            # Convert to Excel
-            from io import BytesIO
-            excel_buffer = BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                download_df.to_excel(writer, index=True, sheet_name='Results')
-            excel_buffer.seek(0)
+                # Convert to Excel
+                from io import BytesIO
+                excel_buffer = BytesIO()
+                with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
+                    download_df.to_excel(writer, index=True, sheet_name='Results')
+                excel_buffer.seek(0)
             
-            st.sidebar.download_button(
-                label="📥 Download Excel",
-                data=excel_buffer,
-                file_name=f"{reg_no}_{name}_Results.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                st.sidebar.download_button(
+                    label="📥 Download Excel",
+                    data=excel_buffer,
+                    file_name=f"{reg_no}_{name}_Results.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+
+        with tab_analytics:
+            # Kept current by the same running statistics the editor updates, so nothing is rescanned here
+            analytics = session_analytics(batch_path, selected_sheet, df, valid_subjects, subject_credits)
+            students = analytics.student_count()
+            classes = analytics.class_breakdown()
+
+            st.markdown(f'<div class="sub-header">{selected_sheet}</div>', unsafe_allow_html=True)
+            if st.session_state.pending_changes.get(selected_sheet):
+                st.caption("Includes your unsaved grade changes.")
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Students", students)
+            m2.metric("Mean GPA", f"{analytics.totals.mean_gpa():.2f}")
+            m3.metric("First Class", int(classes["First Class"]))
+            m4.metric("Fail", int(classes["Fail"]))
+
+            col_class, col_gpa = st.columns(2)
+            with col_class:
+                st.markdown("**Class Awarded**")
+                class_table = classes.to_frame()
+                class_table["Share"] = classes * 100 / students if students else 0.0
+                st.dataframe(
+                    class_table,
+                    column_config={"Share": st.column_config.ProgressColumn("Share", format="%.1f%%", min_value=0, max_value=100)},
+                    width="stretch"
+                )
+            with col_gpa:
+                st.markdown("**GPA Distribution**")
+                st.bar_chart(analytics.gpa_distribution())
+
+            subject_columns = {
+                "Pass Rate": st.column_config.ProgressColumn("Pass Rate (%)", format="%.1f%%", min_value=0, max_value=100),
+                "Mean Points": st.column_config.NumberColumn("Mean Points", format="%.2f"),
+            }
+            as_percent = lambda t: t.assign(**{'Pass Rate': t['Pass Rate'] * 100})
+
+            st.markdown("**Subject Results**")
+            st.dataframe(as_percent(analytics.subject_summary()), column_config=subject_columns, width="stretch")
+
+            col_best, col_worst = st.columns(2)
+            with col_best:
+                st.markdown("**Strongest Subjects**")
+                st.dataframe(as_percent(analytics.ranked_subjects(5)[['Mean Points', 'Pass Rate']]),
+                             column_config=subject_columns, width="stretch")
+            with col_worst:
+                st.markdown("**Weakest Subjects**")
+                st.dataframe(as_percent(analytics.ranked_subjects(5, best=False)[['Mean Points', 'Pass Rate']]),
+                             column_config=subject_columns, width="stretch")
+
+        with tab_merit:
+            scope_col, top_col = st.columns([3, 1])
+            scope = scope_col.radio("Rank", ["This batch", "This intake", "All intakes"], horizontal=True, key="merit_scope")
+            top_n = top_col.number_input("Top", min_value=1, value=10, step=5, key="merit_top")
+
+            # Each scope reads the batches' running GPA totals. The list comes from top-k selection rather
+            # than a full sort; a rank lookup sorts the cohort once and then binary-searches it
+            with st.spinner("Ranking students..."):
+                if scope == "This batch":
+                    entries = merit_entries(st.session_state.current_file, [selected_sheet])
+                    scope_name = f"{st.session_state.current_file} - {selected_sheet}"
+                elif scope == "This intake":
+                    entries = merit_entries(st.session_state.current_file, sheet_names)
+                    scope_name = st.session_state.current_file
+                else:
+                    entries = pd.concat(
+                        [merit_entries(f, sheet_names if f == st.session_state.current_file
+                                       else workbook_cache.list_result_sheets(os.path.join(sheets_dir, f)) or [])
+                         for f in files] or [pd.DataFrame(columns=merit_list.MERIT_COLUMNS)],
+                        ignore_index=True
+                    )
+                    scope_name = "All intakes"
+                merit = merit_list.MeritList(entries)
+                ranked = merit.top(int(top_n))
+
+            tied = len(ranked) - min(int(top_n), len(merit))
+            st.caption(f"Top {min(int(top_n), len(merit))} of {len(merit)} students, ranked by GPA and then total credits"
+                       + (f" (+{tied} tied at the last place)." if tied > 0 else "."))
+            st.dataframe(
+                ranked,
+                column_config={
+                    "GPA": st.column_config.NumberColumn("GPA", format="%.2f"),
+                    "Total Credits": st.column_config.NumberColumn("Total Credits", format="%g"),
+                },
+                hide_index=True,
+                width="stretch"
             )
 
+            rank_query = st.text_input("Rank of Registration Number", key="merit_rank_query")
+            if rank_query.strip():
+                positions = merit.find(rank_query)
+                if not len(positions):
+                    st.warning(f"{rank_query.strip()} is not in {scope_name}.")
+                for pos in positions:
+                    rank, percentile = merit.rank_of(pos)
+                    entry = merit.entries.iloc[pos]
+                    st.success(f"{entry['Registration Number']} ({entry['Batch']}): rank {rank} of {len(merit)}, "
+                               f"GPA {entry['GPA']:.2f}, ahead of {percentile:.1f}% of students")
+
+            if len(ranked):
+                html_content = merit_list.to_html(ranked, "Merit List", scope_name)
+                print_col, download_col = st.columns(2)
+                if print_col.button("Print Merit List"):
+                    # The page prints itself once written
+                    components.html(f"""
+                    <script>
+                        var printWindow = window.open('', '_blank');
+                        printWindow.document.write({json.dumps(html_content)});
+                        printWindow.document.close();
+                        printWindow.focus();
+                    </script>
+                    """, height=0, width=0)
+                download_col.download_button(
+                    label="📥 Download Merit List (HTML)",
+                    data=html_content,
+                    file_name=f"Merit_List_{scope_name.replace(' ', '_')}.html",
+                    mime="text/html"
+                )
+
+        with tab_quality:
+            st.markdown('<div class="sub-header">Duplicate Registration Numbers</div>', unsafe_allow_html=True)
+            if st.session_state.get("duplicate_scan") == batch_path:
+                with st.spinner("Checking every batch..."):
+                    duplicates = workbook_cache.cached_in_memory(
+                        batch_path, "duplicates", lambda: build_duplicate_map(batch_path, sheet_names)
+                    )
+                scope_name = st.session_state.current_file
+            else:
+                duplicates = batch_duplicates
+                scope_name = selected_sheet
+                st.button("Check All Batches", on_click=scan_intake_duplicates, args=(batch_path,),
+                          help="Also finds numbers entered in more than one batch of the intake.")
+
+            report = duplicates.report()
+            if report.empty:
+                st.success(f"Every registration number in {scope_name} appears only once.")
+            else:
+                st.warning(f"{len(duplicates)} registration number(s) with {len(report)} entries in {scope_name}. "
+                           "'In Batch' counts a number's entries in that batch; 'Batches' the batches holding it.")
+                st.dataframe(report, hide_index=True, width="stretch")
+                st.download_button(
+                    label="📥 Download Report (CSV)",
+                    data=report.to_csv(index=False),
+                    file_name=f"Duplicates_{scope_name.replace(' ', '_')}.csv",
+                    mime="text/csv"
+                )
+
 
 
 
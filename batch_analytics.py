@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import grade_logic
+
+# GPA distribution bins: 0.25 wide from 0.00, the last one closed at 4.00
+GPA_BIN_WIDTH = 0.25
+GPA_BIN_COUNT = 16
+
+class BatchAnalytics:
+    """Exam board statistics of one sheet: GPA distribution, class breakdown and per-subject results.
+
+    Built once from the grade code matrix; set_grade() keeps every statistic current per pending
+    edit (through a GpaAccumulator for the GPA side), so dashboards never rescan a sheet."""
+
+    def __init__(self, df, subject_cols, subject_credits=None, unweighted_fallback=False, grade_points=grade_logic.GRADE_POINTS):
+        self.totals = grade_logic.GpaAccumulator(df, subject_cols, subject_credits, unweighted_fallback, grade_points)
+        codes = self.totals.codes
+        # Each subject once, read from its first column
+        self.subjects = list(self.totals.subject_pos)
+        self._first = [self.totals.subject_pos[s][0] for s in self.subjects]
+
+        # Students per grade code and subject; column 0 counts blank cells (code -1)
+        width = len(self.totals.categories) + 1
+        self.grade_counts = np.zeros((len(self.subjects), width), dtype=np.int64)
+        for k, j in enumerate(self._first):
+            self.grade_counts[k] = np.bincount(codes[:, j].astype(np.intp) + 1, minlength=width)
+        self.gpa_histogram = np.bincount(self._gpa_bins(self.totals.gpa), minlength=GPA_BIN_COUNT)
+
+    @staticmethod
+    def _gpa_bins(gpa):
+        return np.minimum((np.asarray(gpa) / GPA_BIN_WIDTH).astype(np.intp), GPA_BIN_COUNT - 1)
+
+    def _grow_counts(self):
+        missing = len(self.totals.categories) + 1 - self.grade_counts.shape[1]
+        if missing > 0:
+            self.grade_counts = np.pad(self.grade_counts, ((0, 0), (0, missing)))
+
+    def copy(self):
+        other = object.__new__(BatchAnalytics)
+        other.__dict__ = dict(self.__dict__)
+        other.totals = self.totals.copy()
+        other.grade_counts = self.grade_counts.copy()
+        other.gpa_histogram = self.gpa_histogram.copy()
+        return other
+
+    def set_grade(self, pos, subject, value):
+        """Applies one grade change to the student's GPA and every batch statistic."""
+        if subject not in self.totals.subject_pos: return
+        k = self.subjects.index(subject)
+        j = self._first[k]
+        old_code = self.totals.codes[pos, j]
+        old_bin = self._gpa_bins(self.totals.gpa[pos])[()]
+
+        self.totals.set_grade(pos, subject, value)
+        self._grow_counts()
+        self.grade_counts[k, old_code + 1] -= 1
+        self.grade_counts[k, self.totals.codes[pos, j] + 1] += 1
+        self.gpa_histogram[old_bin] -= 1
+        self.gpa_histogram[self._gpa_bins(self.totals.gpa[pos])[()]] += 1
+
+    def remove_row(self, pos):
+        """Drops a deleted student; later rows move up one position."""
+        for k, j in enumerate(self._first):
+            self.grade_counts[k, self.totals.codes[pos, j] + 1] -= 1
+        self.gpa_histogram[self._gpa_bins(self.totals.gpa[pos])[()]] -= 1
+        self.totals.remove_row(pos)
+
+    def student_count(self):
+        return len(self.totals.gpa)
+
+    def gpa_distribution(self):
+        """Students per GPA band, as a Series indexed by band label."""
+        labels = [f"{i * GPA_BIN_WIDTH:.2f}-{(i + 1) * GPA_BIN_WIDTH - 0.01:.2f}" for i in range(GPA_BIN_COUNT)]
+        labels[-1] = f"{(GPA_BIN_COUNT - 1) * GPA_BIN_WIDTH:.2f}-4.00"
+        return pd.Series(self.gpa_histogram, index=labels, name="Students")
+
+    def class_breakdown(self):
+        """Students per class awarded, as a Series in class order."""
+        return pd.Series(self.totals.class_breakdown(), name="Students")
+
+    def subject_summary(self):
+        """One row per subject: candidates graded, passes, pass rate, mean grade points and blanks,
+        scored with the grade point table the GPAs use."""
+        points = self.totals.points_table[:-1]
+        graded_codes = ~np.isnan(points)
+        passing_codes = graded_codes & (np.nan_to_num(points) >= grade_logic.SUBJECT_PASS_POINTS)
+        per_code = self.grade_counts[:, 1:len(points) + 1]
+        graded = per_code[:, graded_codes].sum(axis=1)
+        passed = per_code[:, passing_codes].sum(axis=1)
+        quality = (per_code[:, graded_codes] * points[graded_codes]).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pass_rate = np.where(graded > 0, passed / graded, np.nan)
+            mean_points = np.where(graded > 0, quality / graded, np.nan)
+        return pd.DataFrame({
+            'Graded': graded,
+            'Passed': passed,
+            'Pass Rate': pass_rate,
+            'Mean Points': mean_points,
+            'Blank': self.grade_counts[:, 0],
+        }, index=pd.Index(self.subjects, name="Subject"))
+
+    def ranked_subjects(self, k=5, best=True):
+        """The k subjects with the highest (best) or lowest mean grade points; pass rate breaks ties."""
+        summary = self.subject_summary().dropna(subset=['Mean Points'])
+        return summary.sort_values(['Mean Points', 'Pass Rate'], ascending=not best, kind="stable").head(k)
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self.totals.__sizeof__() + self.grade_counts.nbytes + self.gpa_histogram.nbytes
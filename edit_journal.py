@@ -0,0 +1,198 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+# Write-ahead journal of unsaved edits: every grade change and delete is appended to a per-intake
+# file (and fsynced) as it is made, so a crashed app or browser tab loses nothing. Saves become
+# checkpoints: they write the journaled edits to the workbook and then drop them from the journal.
+JOURNAL_DIR = ".edit_journal"
+# Journaled edits that make a checkpoint due
+CHECKPOINT_EDITS = 50
+
+def _json_value(value):
+    # numpy scalars (e.g. an int64 registration number read from a sheet) are stored as the Python
+    # value they hold, so a replayed key matches the frame's; anything else falls back to its text
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+class EditJournal:
+    """Append-only log of one intake file's unsaved grade edits and deletes.
+
+    Records are JSON lines: {"op": "grade", "sheet", "reg", "subject", "value"} or
+    {"op": "delete", "sheet", "reg"}, plus "session" when several sessions share the journal and
+    "was" when the caller knows the grade it replaced. Each session replays, saves and counts only
+    its own records (None stands for the records written without one). snapshot() folds them into
+    the pending_changes / pending_deletes shapes the save path takes, together with a mark;
+    checkpoint(mark) drops the session's records up to that mark once they are saved, keeping other
+    sessions' records and any appended meanwhile."""
+
+    def __init__(self, file_path, journal_dir=JOURNAL_DIR):
+        self.file_path = os.path.abspath(file_path)
+        key = hashlib.sha1(self.file_path.encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(journal_dir, f"{os.path.basename(file_path)}.{key}.jsonl")
+        self._lock = threading.Lock()
+        self._counts = None  # session -> its records since the last checkpoint, counted on first use
+
+    def _append(self, record):
+        line = json.dumps(record, default=_json_value) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a+b") as f:
+                size = f.seek(0, os.SEEK_END)
+                if size:
+                    # A record torn by a crash must not run into this one
+                    f.seek(size - 1)
+                    if f.read(1) != b"\n": line = "\n" + line
+                f.write(line.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            if self._counts is not None:
+                session = record.get("session")
+                self._counts[session] = self._counts.get(session, 0) + 1
+
+    def record_grade(self, sheet_name, reg_no, subject, value, session=None, was=None):
+        record = {"op": "grade", "sheet": sheet_name, "reg": reg_no, "subject": subject, "value": value}
+        if session is not None: record["session"] = session
+        if was is not None: record["was"] = was
+        self._append(record)
+
+    def record_delete(self, sheet_name, reg_no, session=None):
+        record = {"op": "delete", "sheet": sheet_name, "reg": reg_no}
+        if session is not None: record["session"] = session
+        self._append(record)
+
+    def _read(self):
+        # (records, byte offset after the last complete line); lines torn by a crash are skipped
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+        records, end = [], 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"): break
+            end += len(line)
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records, end
+
+    def _count(self, records):
+        self._counts = {}
+        for record in records:
+            session = record.get("session")
+            self._counts[session] = self._counts.get(session, 0) + 1
+
+    def snapshot(self, session=None):
+        """(pending_changes, pending_deletes, mark, base) of what session journaled since its last checkpoint.
+
+        The latest edit of a cell wins. base maps each (sheet, reg, subject) cell edited with a recorded
+        "was" to the value it had before the session's first edit of it, so a save can tell whether
+        someone else has changed the cell since."""
+        pending, mark = self.snapshots([session])
+        return (*pending[session][:2], mark, pending[session][2])
+
+    def snapshots(self, sessions):
+        """({session: (pending_changes, pending_deletes, base)}, mark) for several sessions from one read
+        of the journal, so one save can write them all and checkpoint them with a single mark."""
+        with self._lock:
+            records, mark = self._read()
+            self._count(records)
+        return {session: self._pending(records, session) for session in sessions}, mark
+
+    @staticmethod
+    def _pending(records, session):
+        pending_changes, pending_deletes, base = {}, {}, {}
+        for record in records:
+            if record.get("session") != session: continue
+            sheet_name, reg_no = record.get("sheet"), record.get("reg")
+            if record.get("op") == "grade":
+                subject = record.get("subject")
+                if "was" in record:
+                    base.setdefault((sheet_name, reg_no, subject), record["was"])
+                pending_changes.setdefault(sheet_name, {}).setdefault(reg_no, {})[subject] = record.get("value")
+            elif record.get("op") == "delete":
+                pending_deletes.setdefault(sheet_name, []).append(reg_no)
+        return pending_changes, pending_deletes, base
+
+    def replay(self, session=None):
+        """(pending_changes, pending_deletes) that session left unsaved in earlier runs, in the order they
+        were made. Edits journaled by other sessions are theirs to restore and are left out."""
+        return self.snapshot(session)[:2]
+
+    def mark(self):
+        """Position up to which the journal is covered by a save that starts now."""
+        with self._lock:
+            try:
+                return os.path.getsize(self.path)
+            except FileNotFoundError:
+                return 0
+
+    def checkpoint(self, mark, session=None):
+        """Drops session's records up to mark, which a successful save has written to the workbook."""
+        self.checkpoint_sessions(mark, [session])
+
+    def checkpoint_sessions(self, mark, sessions):
+        """checkpoint() for every session in sessions at once (a mark is only valid until the journal is
+        rewritten, so sessions saved together are checkpointed together)."""
+        sessions = set(sessions)
+        with self._lock:
+            try:
+                with open(self.path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return
+            # Other sessions' records before the mark are still unsaved; torn lines are dropped
+            kept = []
+            for line in data[:mark].splitlines(keepends=True):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("session") not in sessions:
+                    kept.append(line if line.endswith(b"\n") else line + b"\n")
+            rest = b"".join(kept) + data[mark:]
+            if not rest:
+                os.remove(self.path)
+                self._counts = {}
+                return
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(rest)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._counts = None
+
+    def count(self, session=None):
+        """Records journaled by session since the last checkpoint."""
+        with self._lock:
+            if self._counts is None:
+                self._count(self._read()[0])
+            return self._counts.get(session, 0)
+
+    def __len__(self):
+        with self._lock:
+            if self._counts is None:
+                self._count(self._read()[0])
+            return sum(self._counts.values())
+
+    def due(self, session=None):
+        """True once session has journaled enough edits that they should be checkpointed into the workbook."""
+        return self.count(session) >= CHECKPOINT_EDITS
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+def journal_for(file_path, journal_dir=JOURNAL_DIR):
+    """The process-wide journal of an intake file (shared by every session editing it, each reading back its own records)."""
+    key = (os.path.abspath(file_path), journal_dir)
+    with _journals_lock:
+        journal = _journals.get(key)
+        if journal is None:
+            journal = _journals[key] = EditJournal(file_path, journal_dir)
+        return journal
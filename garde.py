@@ -2,13 +2,24 @@ import customtkinter as ctk
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 import pandas as pd
-import openpyxl
 import os
 import webbrowser
 import tempfile
 import re
 import math
+import queue
+import threading
 from datetime import datetime
+import grade_logic
+import search_index
+import virtual_tree
+import batch_analytics
+import merit_list
+import edit_journal
+
+# Grade points as the desktop app has always counted them: F carries no points, so it is left out
+# of GPAs and shown without points
+GPA_GRADE_POINTS = {g: p for g, p in grade_logic.GRADE_POINTS.items() if g != 'F'}
 
 # Set Appearance and Theme
 ctk.set_appearance_mode("Dark")  # Modes: "System" (standard), "Dark", "Light"
@@ -24,6 +35,10 @@ class StudentResultApp(ctk.CTk):
         
         # Variables
         self.all_sheets_data = {} 
+        self.reg_index = None  # Registration number index over all sheets, built on load
+        self.name_index = None  # Fuzzy student name index, used when no registration number matches
+        self.duplicates = None  # Registration numbers entered more than once, grouped on load
+        self.batch_analytics = {}  # Per-sheet GPA totals and batch statistics, updated as grades are edited
         self.file_path = None
         self.current_sheet_name = None
         self.current_student_idx = None
@@ -32,10 +47,22 @@ class StudentResultApp(ctk.CTk):
         self.include_gpa_class = True  # Toggle for including GPA and Class in transcript
         self.current_subject_rows = []
         self.subject_results_window = None
+        self.analytics_window = None
+        self.merit_window = None
+        self.refresh_analytics_window = None  # Redraws the open analytics window after an edit
+        self.load_workers = os.cpu_count() or 1  # Worker processes for sheet parsing (1 = serial)
         
         # Trackers
         self.pending_changes = {} 
         self.pending_deletes = {} 
+        self.journal = None  # Write-ahead journal of the open file's unsaved edits
+        self.save_thread = None  # Background save in progress, if any
+        self.save_results = queue.Queue()  # (ok, message) posted by the save thread
+        self.save_again = None  # Set while saving if another save was asked for: None, or its quiet flag
+        self.closing = False  # Window closed during a save; it closes once the save is done
+        self.auto_save_paused = False  # An auto-save failed; edits wait for the next manual save
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Layout Configuration
         self.grid_columnconfigure(1, weight=1)
@@ -44,7 +71,7 @@ class StudentResultApp(ctk.CTk):
         # --- SIDEBAR ---
         self.sidebar_frame = ctk.CTkFrame(self, width=200, corner_radius=0)
         self.sidebar_frame.grid(row=0, column=0, sticky="nsew")
-        self.sidebar_frame.grid_rowconfigure(7, weight=1)
+        self.sidebar_frame.grid_rowconfigure(8, weight=1)
 
 
 
@@ -54,15 +81,24 @@ class StudentResultApp(ctk.CTk):
         self.btn_load = ctk.CTkButton(self.sidebar_frame, text="Load Workbook", command=self.load_workbook, fg_color="#2E7D32", hover_color="#1B5E20")
         self.btn_load.grid(row=1, column=0, padx=20, pady=10)
 
-        self.btn_save = ctk.CTkButton(self.sidebar_frame, text="Save Changes", command=self.smart_save, state="disabled", fg_color="#C62828", hover_color="#B71C1C")
-        self.btn_save.grid(row=2, column=0, padx=20, pady=10)
+        self.save_frame = ctk.CTkFrame(self.sidebar_frame, fg_color="transparent")
+        self.save_frame.grid(row=2, column=0, padx=20, pady=10)
+
+        self.btn_save = ctk.CTkButton(self.save_frame, text="Save Changes", command=self.smart_save, state="disabled", fg_color="#C62828", hover_color="#B71C1C")
+        self.btn_save.pack()
+
+        # Shown while a save runs in the background
+        self.save_progress = ctk.CTkProgressBar(self.save_frame, mode="indeterminate", width=140, height=6)
 
         self.btn_export_sheet = ctk.CTkButton(self.sidebar_frame, text="Export Sheet", command=self.print_full_sheet, state="disabled", fg_color="#455A64", hover_color="#37474F")
         self.btn_export_sheet.grid(row=3, column=0, padx=20, pady=10)
+
+        self.btn_duplicates = ctk.CTkButton(self.sidebar_frame, text="Duplicate Report", command=self.print_duplicate_report, state="disabled", fg_color="#455A64", hover_color="#37474F")
+        self.btn_duplicates.grid(row=4, column=0, padx=20, pady=10)
         
         # Toggle for GPA and Class in Transcript
         self.toggle_frame = ctk.CTkFrame(self.sidebar_frame, fg_color="transparent")
-        self.toggle_frame.grid(row=4, column=0, padx=20, pady=10, sticky="ew")
+        self.toggle_frame.grid(row=5, column=0, padx=20, pady=10, sticky="ew")
         
         self.lbl_toggle = ctk.CTkLabel(self.toggle_frame, text="Include GPA & Class", font=ctk.CTkFont(size=12))
         self.lbl_toggle.pack(side="left", padx=(0, 10))
@@ -73,7 +109,7 @@ class StudentResultApp(ctk.CTk):
         
         # GPA Display in Sidebar
         self.gpa_frame = ctk.CTkFrame(self.sidebar_frame, fg_color="transparent")
-        self.gpa_frame.grid(row=5, column=0, padx=20, pady=(20, 10), sticky="ew")
+        self.gpa_frame.grid(row=6, column=0, padx=20, pady=(20, 10), sticky="ew")
         
         self.lbl_gpa_title = ctk.CTkLabel(self.gpa_frame, text="GPA", font=ctk.CTkFont(size=16, weight="bold"))
         self.lbl_gpa_title.pack()
@@ -83,7 +119,7 @@ class StudentResultApp(ctk.CTk):
 
         # Class Awarded Display
         self.class_frame = ctk.CTkFrame(self.sidebar_frame, fg_color="transparent")
-        self.class_frame.grid(row=6, column=0, padx=20, pady=(5, 10), sticky="ew")
+        self.class_frame.grid(row=7, column=0, padx=20, pady=(5, 10), sticky="ew")
         
         self.lbl_class_title = ctk.CTkLabel(self.class_frame, text="Class Awarded", font=ctk.CTkFont(size=16, weight="bold"))
         self.lbl_class_title.pack()
@@ -93,10 +129,10 @@ class StudentResultApp(ctk.CTk):
 
         # Appearance Mode Switch
         self.appearance_mode_label = ctk.CTkLabel(self.sidebar_frame, text="Appearance Mode:", anchor="w")
-        self.appearance_mode_label.grid(row=8, column=0, padx=20, pady=(10, 0))
+        self.appearance_mode_label.grid(row=9, column=0, padx=20, pady=(10, 0))
 
         self.appearance_mode_optionemenu = ctk.CTkOptionMenu(self.sidebar_frame, values=["Dark", "Light", "System"], command=self.change_appearance_mode_event)
-        self.appearance_mode_optionemenu.grid(row=9, column=0, padx=20, pady=(10, 20))
+        self.appearance_mode_optionemenu.grid(row=10, column=0, padx=20, pady=(10, 20))
 
 
         # --- MAIN CONTENT ---
@@ -110,7 +146,7 @@ class StudentResultApp(ctk.CTk):
         self.search_var = ctk.StringVar(value="")
         self.entry_search = ctk.CTkEntry(
             self.search_frame,
-            placeholder_text="Search Registration Number...",
+            placeholder_text="Search Registration Number or Name...",
             placeholder_text_color="#B0BEC5",
             width=300,
             textvariable=self.search_var
@@ -153,6 +189,9 @@ class StudentResultApp(ctk.CTk):
         self.lbl_reg = ctk.CTkLabel(self.info_frame, text="Reg No: -", font=ctk.CTkFont(size=14))
         self.lbl_reg.pack(anchor="w", padx=15, pady=(0, 10))
 
+        # Shown under the student only when their registration number has other entries
+        self.lbl_duplicate = ctk.CTkLabel(self.info_frame, text="", text_color="#FFAB91", anchor="w", justify="left")
+
         # Results Table (Treeview)
         self.table_frame = ctk.CTkFrame(self.main_frame)
         self.table_frame.pack(fill="both", expand=True, pady=(0, 15))
@@ -166,7 +205,7 @@ class StudentResultApp(ctk.CTk):
         self.tree_scroll.pack(side="right", fill="y")
         
         columns = ("SNo", "Subject", "Grade", "Points")
-        self.tree = ttk.Treeview(self.table_frame, columns=columns, show="headings", yscrollcommand=self.tree_scroll.set)
+        self.tree = ttk.Treeview(self.table_frame, columns=columns, show="headings")
         self.tree.heading("SNo", text="#")
         self.tree.heading("Subject", text="Subject Name")
         self.tree.heading("Grade", text="Grade")
@@ -178,7 +217,9 @@ class StudentResultApp(ctk.CTk):
         self.tree.column("Points", width=100, anchor="center")
         
         self.tree.pack(fill="both", expand=True, padx=2, pady=2)
-        self.tree_scroll.configure(command=self.tree.yview)
+        # Only the visible rows are real tree items; the view also drives the scrollbar
+        self.subject_view = virtual_tree.VirtualTreeview(self.tree, self.tree_scroll)
+        self.subject_view.enable_heading_sort()
 
         # Action Buttons
         self.action_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
@@ -200,6 +241,26 @@ class StudentResultApp(ctk.CTk):
         )
         self.btn_subject_results.pack(side="left", padx=10)
         
+        self.btn_analytics = ctk.CTkButton(
+            self.action_frame,
+            text="Batch Analytics",
+            command=self.open_analytics_window,
+            state="disabled",
+            fg_color="#5E35B1",
+            hover_color="#4527A0"
+        )
+        self.btn_analytics.pack(side="left", padx=10)
+        
+        self.btn_merit = ctk.CTkButton(
+            self.action_frame,
+            text="Merit List",
+            command=self.open_merit_list_window,
+            state="disabled",
+            fg_color="#6D4C41",
+            hover_color="#4E342E"
+        )
+        self.btn_merit.pack(side="left", padx=10)
+        
         self.btn_delete = ctk.CTkButton(self.action_frame, text="Delete Student", command=self.delete_student, state="disabled", fg_color="#D32F2F", hover_color="#B71C1C")
         self.btn_delete.pack(side="right")
 
@@ -240,118 +301,108 @@ class StudentResultApp(ctk.CTk):
         self.style.map("Treeview", background=[('selected', selected_bg)])
 
     def load_workbook(self):
+        if self.save_thread is not None:
+            messagebox.showinfo("Saving", "Please wait for the current save to finish.")
+            return
         file_path = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx;*.xls")])
         if not file_path: return
             
         try:
-            all_sheets_raw = pd.read_excel(file_path, sheet_name=None, header=None)
             self.all_sheets_data = {}
             self.subject_columns_per_sheet = {}
+            self.batch_analytics = {}
             all_reg_numbers = []
             
-            for sheet_name, raw_df in all_sheets_raw.items():
-                if len(raw_df) < 1: continue
-                
-                # Find Header Row
-                header_row_idx = -1
-                for i in range(min(10, len(raw_df))):
-                    row_vals = raw_df.iloc[i].astype(str).str.lower().tolist()
-                    if any("registration" in x for x in row_vals) and (any("no" in x for x in row_vals) or any("number" in x for x in row_vals)):
-                        header_row_idx = i
-                        break
-                
-                if header_row_idx == -1: continue
-                    
-                df = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row_idx)
-                
-                # Merge Subject Row (Row below header)
-                if len(df) > 0:
-                    subject_row = df.iloc[0]
-                    new_columns = list(df.columns)
-                    for i in range(len(new_columns)):
-                        if i >= 4: 
-                            val = subject_row.iloc[i]
-                            if pd.notna(val) and str(val).strip() != "":
-                                new_columns[i] = str(val).strip()
-                    df.columns = new_columns
-                    df = df.drop(0).reset_index(drop=True)
-
-                # Normalize Columns
-                df.columns = [str(c).strip() for c in df.columns]
-                reg_col_found = False
-                for col in df.columns:
-                    if "registration" in col.lower() or "reg no" in col.lower():
-                        df.rename(columns={col: 'Registration Number'}, inplace=True)
-                        reg_col_found = True
-                        break
-                
-                if not reg_col_found: continue
-                
-                # --- FILTERING LOGIC ---
-                exclude_keywords = [
-                    'serial', 'registration', 'name', 'general', 'special', 'drop', 'batch', 'transfer',
-                    'finance clearance', 'results confirmation', 'gpa', 'class', 'effective', 'total no', 
-                    'nq ese', 'ab ese', 'repeat ese', 'hold', 'results released', 'range of marks', 'grade points', 'letter grade',
-                    'pendings', 'pending'
-                ]
-                grade_cols = ['A+', 'A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'E', 'AB', 'B and Above', 'C and above', 'A+/A/A-', 'EX', '-', 'C-/D+']
-                
-                subject_cols = []
-                for col in df.columns:
-                    cl = col.lower()
-                    if cl == 's': continue
-                    if any(k in cl for k in exclude_keywords): continue
-                    if col in grade_cols: continue
-                    if "unnamed" in cl: continue
-                    subject_cols.append(col)
+            # Streaming also records each sheet's layout, which saves reuse
+            for sheet_name, df in grade_logic.iter_header_frames(file_path, streaming=True, workers=self.load_workers):
+                result = grade_logic.process_sheet(df, subject_rule="exclude")
+                if result is None: continue
                 
+                df, subject_cols, subject_credits = result
                 self.subject_columns_per_sheet[sheet_name] = subject_cols
-                
-                # Extract credit values from subject code (last digit of subject code)
-                # Example: "BSAA 11013" -> credit = 3
-                subject_credits = {}
-                for col_name in subject_cols:
-                    # Extract credit from subject code - last digit
-                    subject_code = str(col_name).strip()
-                    # Find all digits in the subject code
-                    digits = re.findall(r'\d', subject_code)
-                    if digits:
-                        # Get the last digit as credit value
-                        credit_val = int(digits[-1])
-                        if credit_val > 0:  # Valid credit should be > 0
-                            subject_credits[col_name] = float(credit_val)
-                
                 self.subject_credits_per_sheet[sheet_name] = subject_credits
                 self.all_sheets_data[sheet_name] = df
+                self.batch_analytics[sheet_name] = batch_analytics.BatchAnalytics(
+                    df, subject_cols, subject_credits, unweighted_fallback=True, grade_points=GPA_GRADE_POINTS
+                )
                 all_reg_numbers.extend(df['Registration Number'].dropna().astype(str).tolist())
 
+            # Edits left unsaved when the app last closed (or crashed) come back from the journal. The desktop
+            # app journals without a session id, so edits of web sessions sharing the journal stay out
+            self.journal = edit_journal.journal_for(file_path)
+            self.pending_changes, self.pending_deletes = self.journal.replay()
+            self.replay_pending()
+
+            self.reg_index = search_index.RegistrationIndex(self.all_sheets_data)
+            self.name_index = search_index.NameIndex(self.all_sheets_data)
+            self.duplicates = search_index.DuplicateMap(self.all_sheets_data)
             self.file_path = file_path
             unique_regs = sorted(list(set(all_reg_numbers)))
             
-            self.lbl_status.configure(text=f"Loaded {len(unique_regs)} students.")
-            self.pending_changes = {}
-            self.pending_deletes = {}
+            status = f"Loaded {len(unique_regs)} students."
+            if len(self.duplicates):
+                status += f" {len(self.duplicates)} duplicate Reg Nos."
+            self.lbl_status.configure(text=status)
             self.btn_save.configure(state="normal")
             self.btn_export_sheet.configure(state="normal")
             self.btn_subject_results.configure(state="normal")
+            self.btn_analytics.configure(state="normal")
+            self.btn_merit.configure(state="normal")
+            self.btn_duplicates.configure(state="normal")
             self.clear_ui()
             
-            messagebox.showinfo("Success", f"Loaded {len(self.all_sheets_data)} valid sheets.")
+            message = f"Loaded {len(self.all_sheets_data)} valid sheets."
+            if self.journal.count():
+                message += f"\n\nRestored {self.journal.count()} unsaved edit(s) from the journal. Click SAVE to commit."
+            if len(self.duplicates):
+                message += f"\n\n{len(self.duplicates)} registration number(s) appear more than once. See Duplicate Report."
+            messagebox.showinfo("Success", message)
             
         except Exception as e:
             messagebox.showerror("Error", f"Could not load workbook: {e}")
 
+    def replay_pending(self):
+        """Applies the pending edits and deletes to the loaded sheets, as when they were first made.
+        A registration number entered twice is edited in its last row, the one the save writes to."""
+        def last_row(df, reg_no):
+            rows = df.index[df['Registration Number'].astype(str).str.strip() == str(reg_no).strip()]
+            return rows[-1] if len(rows) else None
+
+        for sheet_name, students in self.pending_changes.items():
+            df = self.all_sheets_data.get(sheet_name)
+            if df is None: continue
+            for reg_no, changes in students.items():
+                idx = last_row(df, reg_no)
+                if idx is None: continue
+                for subject, grade in changes.items():
+                    grade_logic.set_grade(df, idx, subject, grade)
+                    self.batch_analytics[sheet_name].set_grade(df.index.get_loc(idx), subject, grade)
+
+        for sheet_name, regs in self.pending_deletes.items():
+            for reg_no in regs:
+                df = self.all_sheets_data.get(sheet_name)
+                idx = None if df is None else last_row(df, reg_no)
+                if idx is None: continue
+                self.batch_analytics[sheet_name].remove_row(df.index.get_loc(idx))
+                self.all_sheets_data[sheet_name] = df.drop(index=idx).reset_index(drop=True)
+
     def search_global(self):
         if not self.all_sheets_data: return
         search_term = self.search_var.get().strip()
         if not search_term: return
 
-        all_matches = []
-        for sheet_name, df in self.all_sheets_data.items():
-            mask = df['Registration Number'].astype(str).str.contains(search_term, case=False, na=False)
-            matches = df[mask]
-            for idx, row in matches.iterrows():
-                all_matches.append((sheet_name, idx, row))
+        # A duplicated registration number lists just its own entries, straight from the duplicate map
+        locations = self.duplicates.find(search_term) or self.reg_index.contains(search_term)
+        all_matches = [
+            (sheet_name, idx, self.all_sheets_data[sheet_name].loc[idx])
+            for sheet_name, idx in locations
+        ]
+        if not all_matches:
+            # Not a registration number; fall back to the closest student names
+            all_matches = [
+                (sheet_name, idx, self.all_sheets_data[sheet_name].loc[idx])
+                for sheet_name, idx, _ in self.name_index.search(search_term)
+            ]
 
         if not all_matches:
             messagebox.showerror("Not Found", "Student not found.")
@@ -370,7 +421,12 @@ class StudentResultApp(ctk.CTk):
         popup.transient(self)
         popup.grab_set()
         
-        lbl = ctk.CTkLabel(popup, text="Multiple matches found. Select one:", font=ctk.CTkFont(size=14, weight="bold"))
+        regs = {search_index.normalize_reg(row['Registration Number']) for _, _, row in matches}
+        if len(regs) == 1 and self.duplicates.find(matches[0][2]['Registration Number']):
+            title = f"Registration number {matches[0][2]['Registration Number']} has {len(matches)} entries. Select one:"
+        else:
+            title = "Multiple matches found. Select one:"
+        lbl = ctk.CTkLabel(popup, text=title, font=ctk.CTkFont(size=14, weight="bold"))
         lbl.pack(pady=10)
 
         scroll_frame = ctk.CTkScrollableFrame(popup)
@@ -386,71 +442,6 @@ class StudentResultApp(ctk.CTk):
                                 command=lambda s=sheet, i=idx: [self.load_student_into_ui(s, i), popup.destroy()])
             btn.pack(fill="x", pady=2)
 
-    def calculate_gpa(self, grades, credits=None):
-        # Standard 4.0 Scale
-        GRADE_POINTS = {
-            'A+': 4.00, 'A': 4.00, 'A-': 3.70,
-            'B+': 3.30, 'B': 3.00, 'B-': 2.70,
-            'C+': 2.30, 'C': 2.00, 'C-': 1.70,
-            'D+': 1.30, 'D': 1.00, 'E': 0.00,
-            'F': 0.0
-        }
-        
-        # If credits provided, calculate weighted GPA
-        if credits and len(credits) == len(grades):
-            total_quality_points = 0.0
-            total_credits = 0.0
-            
-            for i, g in enumerate(grades):
-                g_clean = str(g).strip().upper()
-                if g_clean in GRADE_POINTS and i < len(credits) and credits[i] is not None:
-                    credit_val = credits[i] if isinstance(credits[i], (int, float)) else float(credits[i])
-                    grade_points = GRADE_POINTS[g_clean]
-                    total_quality_points += grade_points * credit_val
-                    total_credits += credit_val
-            
-            if total_credits == 0: return 0.00
-            return total_quality_points / total_credits
-        else:
-            # Simple average (unweighted) if no credits
-            total_points = 0.00
-            count = 0
-            
-            for g in grades:
-                g_clean = str(g).strip().upper()
-                if g_clean in GRADE_POINTS:
-                    total_points += GRADE_POINTS[g_clean]
-                    count += 1
-            
-            if count == 0: return 0.00
-            return total_points / count
-
-
-    def calculate_class(self, gpa):
-        if gpa >= 3.70:
-            return "First Class"
-        elif gpa >= 3.30:
-            return "Second Class (Upper Division)"
-        elif gpa >= 3.00:
-            return "Second Class (Lower Division)"
-        elif gpa >= 2.00:
-            return "Pass"
-        else:
-            return "Fail"
-
-
-    def calculate_class(self, gpa):
-        if gpa >= 3.70:
-            return "First Class"
-        elif gpa >= 3.30:
-            return "Second Class (Upper Division)"
-        elif gpa >= 3.00:
-            return "Second Class (Lower Division)"
-        elif gpa >= 2.00:
-            return "Pass"
-        else:
-            return "Fail"
-
     def load_student_into_ui(self, sheet_name, idx):
         self.current_sheet_name = sheet_name
         self.current_student_idx = idx
@@ -465,38 +456,28 @@ class StudentResultApp(ctk.CTk):
         
         self.lbl_name.configure(text=f"Name: {name}")
         self.lbl_reg.configure(text=f"Reg No: {reg}")
+
+        others = [(s, i) for s, i in self.duplicates.find(reg) if (s, i) != (sheet_name, idx)]
+        if others:
+            where = ", ".join(f"[{s}] #{i + 1}" for s, i in others)
+            self.lbl_duplicate.configure(text=f"Duplicate Reg No: also entered at {where}")
+            self.lbl_duplicate.pack(anchor="w", padx=15, pady=(0, 10))
+        else:
+            self.lbl_duplicate.pack_forget()
         
         self.btn_delete.configure(state="normal")
         self.btn_edit.configure(state="normal")
         self.btn_print.configure(state="normal")
-        self.tree.delete(*self.tree.get_children())
         self.current_subject_rows = []
         
         valid_subjects = self.subject_columns_per_sheet.get(sheet_name, [])
-        subject_credits = self.subject_credits_per_sheet.get(sheet_name, {})
-        
-        student_grades = []
-        student_credits = []
         
         for i, col in enumerate(valid_subjects, start=1):
             val = data[col]
             display_val = val if pd.notna(val) and str(val).strip() != "" else "-"
             
-            # Get credit value for this subject
-            credit_val = subject_credits.get(col, None)
-            
-            # Calculate points for display
-            points = "-"
-            GRADE_POINTS = {
-                'A+': 4.00, 'A': 4.00, 'A-': 3.70,
-                'B+': 3.30, 'B': 3.00, 'B-': 2.70,
-                'C+': 2.30, 'C': 2.00, 'C-': 1.70,
-                'D+': 1.30, 'D': 1.00, 'E': 0.00
-            }
-            if str(display_val).strip().upper() in GRADE_POINTS:
-                points = GRADE_POINTS[str(display_val).strip().upper()]
-                student_grades.append(display_val)
-                student_credits.append(credit_val)
+            # Points for display
+            points = GPA_GRADE_POINTS.get(str(display_val).strip().upper(), "-")
             
             self.current_subject_rows.append({
                 "s_no": i,
@@ -510,20 +491,17 @@ class StudentResultApp(ctk.CTk):
         self.btn_subject_filter.configure(state="normal")
         self.subject_search_var.set("")
 
-        # Calculate and Show GPA (with credits if available)
-        gpa = self.calculate_gpa(student_grades, student_credits if any(c is not None for c in student_credits) else None)
+        self.show_gpa()
+
+    def show_gpa(self):
+        """Shows the current student's GPA (with credits if available) and class from the sheet's running totals."""
+        totals = self.batch_analytics[self.current_sheet_name].totals
+        pos = self.all_sheets_data[self.current_sheet_name].index.get_loc(self.current_student_idx)
+        gpa = totals.student_gpa(pos)
         # Truncate to 2 decimal places (no rounding)
         truncated_gpa = math.floor(gpa * 100) / 100
         self.lbl_gpa_value.configure(text=f"{truncated_gpa:.2f}")
-
-        # Calculate and Show Class Awarded
-        class_val = self.calculate_class(gpa)
-        self.lbl_class_value.configure(text=class_val)
-
-
-        # Calculate and Show Class Awarded
-        class_val = self.calculate_class(gpa)
-        self.lbl_class_value.configure(text=class_val)
+        self.lbl_class_value.configure(text=totals.student_class(pos))
 
 
     def print_student_transcript(self):
@@ -558,8 +536,7 @@ class StudentResultApp(ctk.CTk):
         if pd.isna(eff_date): eff_date = "-"
         
         table_rows = ""
-        for item in self.tree.get_children():
-            vals = self.tree.item(item)['values']
+        for vals in self.subject_view.rows():
             s_no = vals[0]
             subject = vals[1]
             grade = vals[2]
@@ -662,14 +639,30 @@ class StudentResultApp(ctk.CTk):
             filepath = f.name
         webbrowser.open('file://' + filepath)
 
+    def print_duplicate_report(self):
+        if self.duplicates is None: return
+        if not len(self.duplicates):
+            messagebox.showinfo("Duplicate Report", "Every registration number appears only once.")
+            return
+        report = self.duplicates.report()
+        html = report.to_html(index=False, classes='clean-table', border=1)
+        full_html = (f"<html><body><h2>Duplicate Registration Numbers: {os.path.basename(self.file_path)}</h2>"
+                     f"<p>{len(self.duplicates)} registration number(s), {len(report)} entries. "
+                     f"'In Batch' counts the entries in that batch; 'Batches' the batches holding the number.</p>"
+                     f"{html}</body></html>")
+        
+        with tempfile.NamedTemporaryFile('w', delete=False, suffix='.html', encoding='utf-8') as f:
+            f.write(full_html)
+            filepath = f.name
+        webbrowser.open('file://' + filepath)
+
     def edit_grade(self):
-        sel = self.tree.selection()
-        if not sel: 
+        sel = self.subject_view.selected_row()
+        if sel is None: 
             messagebox.showwarning("Select", "Please select a subject row to edit.")
             return
-        item = self.tree.item(sel)
         
-        vals = item['values']
+        vals = self.subject_view.row_values(sel)
         s_no = vals[0]
         subject = vals[1]
         old_grade = vals[2]
@@ -682,108 +675,157 @@ class StudentResultApp(ctk.CTk):
         
         if new_grade is not None:
             df = self.all_sheets_data[self.current_sheet_name]
-            df.at[self.current_student_idx, subject] = new_grade
+            grade_logic.set_grade(df, self.current_student_idx, subject, new_grade)
+            self.batch_analytics[self.current_sheet_name].set_grade(df.index.get_loc(self.current_student_idx), subject, new_grade)
+            self.show_gpa()
+            if self.refresh_analytics_window:
+                self.refresh_analytics_window()
             display_val = new_grade if new_grade.strip() != "" else "-"
             
-            GRADE_POINTS = {
-                'A+': 4.00, 'A': 4.00, 'A-': 3.70,
-                'B+': 3.30, 'B': 3.00, 'B-': 2.70,
-                'C+': 2.30, 'C': 2.00, 'C-': 1.70,
-                'D+': 1.30, 'D': 1.00, 'E': 0.00
-            }
             grade_clean = str(display_val).strip().upper()
-            points = GRADE_POINTS.get(grade_clean, "-")
+            points = GPA_GRADE_POINTS.get(grade_clean, "-")
             
-            self.tree.item(sel, values=(s_no, subject, display_val, points))
+            self.subject_view.update_row(sel, (s_no, subject, display_val, points))
 
             for row in self.current_subject_rows:
                 if row["subject"] == subject:
                     row["grade"] = display_val
                     row["points"] = points
                     break
-
-            self.filter_subjects()
             
             reg_no = df.at[self.current_student_idx, 'Registration Number']
             if self.current_sheet_name not in self.pending_changes: self.pending_changes[self.current_sheet_name] = {}
             if reg_no not in self.pending_changes[self.current_sheet_name]: self.pending_changes[self.current_sheet_name][reg_no] = {}
             self.pending_changes[self.current_sheet_name][reg_no][subject] = new_grade
-            messagebox.showinfo("Pending", "Grade updated in app. Click SAVE to commit.")
+            self.journal.record_grade(self.current_sheet_name, reg_no, subject, new_grade)
+            if self.journal.due() and not self.auto_save_paused:
+                self.smart_save(quiet=True)
+            else:
+                messagebox.showinfo("Pending", "Grade updated in app. Click SAVE to commit.")
 
     def delete_student(self):
         if self.current_student_idx is None: return
         if messagebox.askyesno("Confirm", f"Delete student from {self.current_sheet_name}?"):
             df = self.all_sheets_data[self.current_sheet_name]
             reg_no = df.at[self.current_student_idx, 'Registration Number']
+            self.batch_analytics[self.current_sheet_name].remove_row(df.index.get_loc(self.current_student_idx))
             self.all_sheets_data[self.current_sheet_name] = df.drop(index=self.current_student_idx).reset_index(drop=True)
+            self.reg_index.update_sheet(self.current_sheet_name, self.all_sheets_data[self.current_sheet_name])
+            self.name_index.update_sheet(self.current_sheet_name, self.all_sheets_data[self.current_sheet_name])
+            self.duplicates.update_sheet(self.current_sheet_name, self.all_sheets_data[self.current_sheet_name])
             
             if self.current_sheet_name not in self.pending_deletes: self.pending_deletes[self.current_sheet_name] = []
             self.pending_deletes[self.current_sheet_name].append(reg_no)
+            self.journal.record_delete(self.current_sheet_name, reg_no)
             self.clear_ui()
-            messagebox.showinfo("Pending", "Deleted from App. Click SAVE to commit.")
-
-    def smart_save(self):
+            if self.refresh_analytics_window:
+                self.refresh_analytics_window()
+            if self.journal.due() and not self.auto_save_paused:
+                self.smart_save(quiet=True)
+            else:
+                messagebox.showinfo("Pending", "Deleted from App. Click SAVE to commit.")
+
+    def smart_save(self, quiet=False):
+        """Saves the pending edits on a background thread and checkpoints the journal when it is done.
+        The window stays usable: edits made during the save collect for the next one. quiet is the
+        automatic checkpoint taken once enough edits are journaled: it reports in the status bar, and on
+        failure the edits stay journaled and auto-saving pauses until the next manual save."""
+        if self.save_thread is not None:
+            # One save at a time; run another as soon as this one is done
+            self.save_again = quiet if self.save_again is None else self.save_again and quiet
+            if not quiet:
+                self.lbl_status.configure(text="Saving... your latest edits will be saved right after.")
+            return
         if not self.pending_changes and not self.pending_deletes:
-            messagebox.showinfo("Info", "No changes to save.")
+            if not quiet: messagebox.showinfo("Info", "No changes to save.")
             return
+
+        # Hand the save a snapshot; edits made from now on go into fresh trackers
+        changes, deletes = self.pending_changes, self.pending_deletes
+        self.pending_changes, self.pending_deletes = {}, {}
+        # Rows and columns come from the layouts recorded on load; a sheet is rescanned only if the file changed since
+        layouts = grade_logic.frame_layouts(self.all_sheets_data)
+        journal, mark, file_path = self.journal, self.journal.mark(), self.file_path
+
+        def work():
+            try:
+                result = grade_logic.save_changes_to_excel(file_path, changes, deletes, layouts)
+            except Exception as e:
+                result = (False, f"Save failed: {str(e)}")
+            self.save_results.put(result)
+
+        # Not a daemon thread: closing the window lets a save that has started finish writing the file
+        self.save_thread = threading.Thread(target=work, name="save-workbook")
+        self.save_thread.start()
+        edits = sum(len(subjects) for students in changes.values() for subjects in students.values())
+        edits += sum(len(regs) for regs in deletes.values())
+        self.lbl_status.configure(text=f"Saving {edits} change(s)...")
+        self.btn_load.configure(state="disabled")
+        self.save_progress.pack(pady=(6, 0))
+        self.save_progress.start()
+        self.after(100, lambda: self.poll_save(changes, deletes, layouts, journal, mark, quiet))
+
+    def poll_save(self, changes, deletes, layouts, journal, mark, quiet):
+        """Runs on the Tk event loop until the save thread posts its result, then applies it."""
         try:
-            wb = openpyxl.load_workbook(self.file_path)
-            affected_sheets = set(self.pending_changes.keys()).union(set(self.pending_deletes.keys()))
-            for sheet_name in affected_sheets:
-                if sheet_name not in wb.sheetnames: continue
-                ws = wb[sheet_name]
-                
-                header_row = None
-                reg_col_idx = None
-                for r in range(1, 15):
-                    for c in range(1, ws.max_column + 1):
-                        val = str(ws.cell(row=r, column=c).value).lower()
-                        if "registration" in val and ("no" in val or "num" in val):
-                            header_row = r
-                            reg_col_idx = c
-                            break
-                    if header_row: break
-                if not header_row: continue
-
-                subject_col_map = {}
-                for col in range(1, ws.max_column + 1):
-                    val = ws.cell(row=header_row, column=col).value
-                    val_below = ws.cell(row=header_row + 1, column=col).value
-                    if val_below: subject_col_map[str(val_below).strip()] = col
-                    elif val: subject_col_map[str(val).strip()] = col
-
-                reg_row_map = {}
-                for row in range(header_row + 1, ws.max_row + 1):
-                    val = ws.cell(row=row, column=reg_col_idx).value 
-                    if val: reg_row_map[str(val).strip()] = row
-                
-                if sheet_name in self.pending_changes:
-                    for reg_no, changes in self.pending_changes[sheet_name].items():
-                        if reg_no in reg_row_map:
-                            row_idx = reg_row_map[reg_no]
-                            for subject, new_val in changes.items():
-                                if subject in subject_col_map:
-                                    ws.cell(row=row_idx, column=subject_col_map[subject]).value = new_val
-
-                if sheet_name in self.pending_deletes:
-                    rows_to_del = [reg_row_map[r] for r in self.pending_deletes[sheet_name] if r in reg_row_map]
-                    for r_idx in sorted(rows_to_del, reverse=True):
-                        ws.delete_rows(r_idx)
-
-            wb.save(self.file_path)
-            self.pending_changes = {}
-            self.pending_deletes = {}
-            messagebox.showinfo("Success", "Changes saved to Excel file!")
-        except PermissionError:
-            messagebox.showerror("Error", "Please close the Excel file and try again!")
-        except Exception as e:
-            messagebox.showerror("Error", f"Save failed: {e}")
+            ok, message = self.save_results.get_nowait()
+        except queue.Empty:
+            self.after(100, lambda: self.poll_save(changes, deletes, layouts, journal, mark, quiet))
+            return
+        self.save_thread.join()
+        self.save_thread = None
+        self.save_progress.stop()
+        self.save_progress.pack_forget()
+        self.btn_load.configure(state="normal")
+
+        if ok:
+            for sheet_name, layout in layouts.items():
+                if sheet_name in self.all_sheets_data:
+                    self.all_sheets_data[sheet_name].attrs['layout'] = layout
+            journal.checkpoint(mark)
+            self.auto_save_paused = False
+            if quiet:
+                self.lbl_status.configure(text="Journaled edits auto-saved to Excel.")
+            elif not self.closing:
+                self.lbl_status.configure(text="Changes saved.")
+                messagebox.showinfo("Success", "Changes saved to Excel file!")
+        else:
+            # The snapshot is pending again, under any edits made while it was saving
+            self.pending_changes, self.pending_deletes = grade_logic.merge_pending(
+                changes, deletes, self.pending_changes, self.pending_deletes
+            )
+            if quiet:
+                # Retrying on every edit would run a full failing save each time: say so once and wait
+                self.auto_save_paused = True
+                self.lbl_status.configure(text="Auto-save paused, edits kept in journal. Click SAVE to retry.")
+                if not self.closing:
+                    messagebox.showerror("Auto-save failed", f"{message}\n\nYour edits are kept in the journal. "
+                                         "Auto-save is paused until you save with SAVE.")
+            else:
+                self.lbl_status.configure(text="Save failed.")
+                messagebox.showerror("Error", message)
+
+        if self.closing:
+            self.destroy()
+            return
+        again, self.save_again = self.save_again, None
+        if again is not None and ok and (self.pending_changes or self.pending_deletes):
+            self.smart_save(quiet=again)
+
+    def on_close(self):
+        if self.save_thread is None:
+            self.destroy()
+            return
+        # Let the save finish and checkpoint the journal first
+        self.closing = True
+        self.lbl_status.configure(text="Finishing the save before closing...")
 
     def clear_ui(self):
         self.lbl_name.configure(text="Name: -")
         self.lbl_reg.configure(text="Reg No: -")
+        self.lbl_duplicate.pack_forget()
         self.lbl_current_sheet.configure(text="Sheet: -")
-        self.tree.delete(*self.tree.get_children())
+        self.subject_view.clear()
         self.current_subject_rows = []
         self.current_student_idx = None
         self.btn_edit.configure(state="disabled")
@@ -794,21 +836,22 @@ class StudentResultApp(ctk.CTk):
         self.subject_search_var.set("")
 
     def refresh_subject_tree(self, filter_term=None):
-        self.tree.delete(*self.tree.get_children())
-        if not self.current_subject_rows:
-            return
         rows = self.current_subject_rows
+        self.subject_view.set_rows([[row[key] for row in rows] for key in ("s_no", "subject", "grade", "points")])
+        self.apply_subject_filter(filter_term)
+
+    def apply_subject_filter(self, filter_term):
+        mask = None
         if filter_term:
-            ft = filter_term.lower()
-            rows = [row for row in rows if ft in str(row["subject"]).lower()]
-        for row in rows:
-            self.tree.insert("", "end", values=(row["s_no"], row["subject"], row["grade"], row["points"]))
+            subjects = pd.Series(self.subject_view.columns[1]).astype(str).str.lower()
+            mask = subjects.str.contains(filter_term.lower(), regex=False).to_numpy()
+        self.subject_view.filter(mask)
 
     def filter_subjects(self):
         if not self.current_subject_rows:
             return
         term = self.subject_search_var.get().strip()
-        self.refresh_subject_tree(term if term else None)
+        self.apply_subject_filter(term if term else None)
 
     def open_subject_results_window(self):
         if not self.all_sheets_data:
@@ -837,27 +880,53 @@ class StudentResultApp(ctk.CTk):
         batch_var = ctk.StringVar(value=initial_batch)
         subject_var = ctk.StringVar(value="")
         subject_menu = None
-        results_tree = None
+        results_view = None
         btn_show = None
         btn_print_results = None
         info_label = None
-        current_results = []
-
-        GRADE_POINTS = {
-            'A+': 4.00, 'A': 4.00, 'A-': 3.70,
-            'B+': 3.30, 'B': 3.00, 'B-': 2.70,
-            'C+': 2.30, 'C': 2.00, 'C-': 1.70,
-            'D+': 1.30, 'D': 1.00, 'E': 0.00
-        }
+        summary_label = None
+        filter_var = ctk.StringVar(value="")
+        # The window is modal, so a batch's results and grade distributions stay valid while it is open
+        results_cache = {}  # (batch, subject) -> subject results
+        distribution_cache = {}  # batch -> {subject: grade distribution}
 
         def update_info(text, color="gray"):
             if info_label:
                 info_label.configure(text=text, text_color=color)
 
+        def update_summary(batch, subject):
+            if not summary_label:
+                return
+            if batch not in distribution_cache:
+                distribution_cache[batch] = grade_logic.grade_distributions(
+                    self.all_sheets_data[batch], self.subject_columns_per_sheet.get(batch, []), GPA_GRADE_POINTS)
+            summary = distribution_cache[batch].get(subject)
+            if not summary:
+                summary_label.configure(text="")
+                return
+            parts = []
+            if summary['graded']:
+                parts.append(f"Pass rate: {summary['pass_rate']:.1%} ({summary['passed']}/{summary['graded']})")
+                parts.append(f"Mean points: {summary['mean_points']:.2f}")
+            parts.append("  ".join(f"{g}: {n}" for g, n in summary['counts'].items()))
+            if summary['blank']:
+                parts.append(f"Blank: {summary['blank']}")
+            summary_label.configure(text="   |   ".join(parts))
+
         def clear_results_tree():
-            if results_tree:
-                for item in results_tree.get_children():
-                    results_tree.delete(item)
+            if results_view:
+                results_view.clear()
+
+        def apply_results_filter(*_):
+            if not results_view or not len(results_view):
+                return
+            term = filter_var.get().strip().lower()
+            mask = None
+            if term:
+                regs = pd.Series(results_view.columns[1]).astype(str).str.lower()
+                names = pd.Series(results_view.columns[2]).astype(str).str.lower()
+                mask = (regs.str.contains(term, regex=False) | names.str.contains(term, regex=False)).to_numpy()
+            results_view.filter(mask)
 
         def update_show_button_state():
             if btn_show:
@@ -879,17 +948,19 @@ class StudentResultApp(ctk.CTk):
             batch_var.set(selected_batch)
             update_subject_menu(selected_batch)
             clear_results_tree()
+            if summary_label:
+                summary_label.configure(text="")
             update_info(f"Select a subject to view results for {selected_batch}.", "#FFC107")
 
         def handle_subject_change(selected_subject):
             subject_var.set(selected_subject)
             update_show_button_state()
+            populate_tree()
 
         def populate_tree():
             clear_results_tree()
             batch = batch_var.get()
             subject = subject_var.get()
-            current_results.clear()
             if not batch or not subject:
                 update_info("Select a batch and subject to view results.", "#FFC107")
                 if btn_print_results:
@@ -901,38 +972,15 @@ class StudentResultApp(ctk.CTk):
                 update_info("Selected subject not found in this batch.", "#EF5350")
                 return
 
-            name_col = next((c for c in df.columns if "name" in c.lower()), None)
-            rows_added = 0
-
-            for idx, row in df.iterrows():
-                reg_val = row.get('Registration Number', "-")
-                reg_display = "-" if pd.isna(reg_val) else str(reg_val).strip()
-
-                if name_col:
-                    name_val = row.get(name_col, "-")
-                    name_display = "-" if pd.isna(name_val) else str(name_val).strip()
-                else:
-                    name_display = "-"
-
-                grade_val = row.get(subject, "-")
-                grade_display = "-"
-                if pd.notna(grade_val) and str(grade_val).strip():
-                    grade_display = str(grade_val).strip()
-
-                grade_clean = grade_display.upper()
-                points = GRADE_POINTS.get(grade_clean, "-")
-
-                row_values = (idx + 1, reg_display, name_display, grade_display, points)
-                if results_tree:
-                    results_tree.insert("", "end", values=row_values)
-                current_results.append({
-                    "s_no": idx + 1,
-                    "reg_no": reg_display,
-                    "name": name_display,
-                    "grade": grade_display,
-                    "points": points
-                })
-                rows_added += 1
+            if (batch, subject) not in results_cache:
+                results_cache[(batch, subject)] = grade_logic.subject_results(df, subject, GPA_GRADE_POINTS)
+            results = results_cache[(batch, subject)]
+            points = results['Points'].astype(object).where(results['Points'].notna(), "-")
+            if results_view:
+                results_view.set_rows([results['S/No'], results['Registration Number'], results['Name'], results['Grade'], points])
+                apply_results_filter()
+            rows_added = len(results)
+            update_summary(batch, subject)
 
             if rows_added:
                 update_info(f"{rows_added} result(s) shown for {subject} in {batch}.", "#A5D6A7")
@@ -944,6 +992,7 @@ class StudentResultApp(ctk.CTk):
                     btn_print_results.configure(state="disabled")
 
         def print_results():
+            current_results = results_view.rows() if results_view else []
             if not current_results:
                 messagebox.showinfo("Info", "Load results before printing.")
                 return
@@ -951,14 +1000,14 @@ class StudentResultApp(ctk.CTk):
             subject = subject_var.get()
             date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             table_rows = ""
-            for row in current_results:
+            for s_no, reg_no, name, grade, points in current_results:
                 table_rows += (
                     f"<tr>"
-                    f"<td style='padding:8px;border-bottom:1px solid #ddd;text-align:center;color:#666;'>{row['s_no']}</td>"
-                    f"<td style='padding:8px;border-bottom:1px solid #ddd;text-align:center;'>{row['reg_no']}</td>"
-                    f"<td style='padding:8px;border-bottom:1px solid #ddd;'>{row['name']}</td>"
-                    f"<td style='padding:8px;border-bottom:1px solid #ddd;text-align:center;'><b>{row['grade']}</b></td>"
-                    f"<td style='padding:8px;border-bottom:1px solid #ddd;text-align:center;'>{row['points']}</td>"
+                    f"<td style='padding:8px;border-bottom:1px solid #ddd;text-align:center;color:#666;'>{s_no}</td>"
+                    f"<td style='padding:8px;border-bottom:1px solid #ddd;text-align:center;'>{reg_no}</td>"
+                    f"<td style='padding:8px;border-bottom:1px solid #ddd;'>{name}</td>"
+                    f"<td style='padding:8px;border-bottom:1px solid #ddd;text-align:center;'><b>{grade}</b></td>"
+                    f"<td style='padding:8px;border-bottom:1px solid #ddd;text-align:center;'>{points}</td>"
                     f"</tr>"
                 )
             html_content = f"""
@@ -1047,6 +1096,19 @@ class StudentResultApp(ctk.CTk):
         btn_print_results = ctk.CTkButton(control_frame, text="Print Results", command=print_results, state="disabled")
         btn_print_results.pack(side="left")
 
+        summary_label = ctk.CTkLabel(window, text="", anchor="w", justify="left", wraplength=1000)
+        summary_label.pack(fill="x", padx=20, pady=(0, 10))
+
+        filter_entry = ctk.CTkEntry(
+            window,
+            placeholder_text="Filter by Registration Number or Name...",
+            placeholder_text_color="#B0BEC5",
+            width=300,
+            textvariable=filter_var
+        )
+        filter_entry.pack(anchor="w", padx=20, pady=(0, 10))
+        filter_var.trace_add("write", apply_results_filter)
+
         results_frame = ctk.CTkFrame(window)
         results_frame.pack(fill="both", expand=True, padx=20, pady=(0, 10))
 
@@ -1054,7 +1116,7 @@ class StudentResultApp(ctk.CTk):
         tree_scroll.pack(side="right", fill="y")
 
         columns = ("SNo", "RegNo", "Name", "Grade", "Points")
-        results_tree = ttk.Treeview(results_frame, columns=columns, show="headings", yscrollcommand=tree_scroll.set)
+        results_tree = ttk.Treeview(results_frame, columns=columns, show="headings")
         results_tree.heading("SNo", text="#")
         results_tree.heading("RegNo", text="Registration No")
         results_tree.heading("Name", text="Name")
@@ -1068,7 +1130,8 @@ class StudentResultApp(ctk.CTk):
         results_tree.column("Points", width=120, anchor="center")
 
         results_tree.pack(fill="both", expand=True, padx=2, pady=2)
-        tree_scroll.configure(command=results_tree.yview)
+        results_view = virtual_tree.VirtualTreeview(results_tree, tree_scroll)
+        results_view.enable_heading_sort()
 
         info_label = ctk.CTkLabel(window, text="", text_color="gray")
         info_label.pack(fill="x", padx=20, pady=(0, 15))
@@ -1076,6 +1139,257 @@ class StudentResultApp(ctk.CTk):
         update_subject_menu(batch_var.get())
         populate_tree()
 
+    def open_analytics_window(self):
+        if not self.all_sheets_data:
+            messagebox.showinfo("Info", "Please load a workbook first.")
+            return
+
+        if self.analytics_window and self.analytics_window.winfo_exists():
+            self.analytics_window.focus()
+            return
+
+        # Not modal: the window stays open while grades are edited and redraws after each change
+        window = ctk.CTkToplevel(self)
+        window.title("Batch Analytics")
+        window.geometry("1100x720")
+        window.transient(self)
+        self.analytics_window = window
+
+        def on_close():
+            self.analytics_window = None
+            self.refresh_analytics_window = None
+            window.destroy()
+
+        window.protocol("WM_DELETE_WINDOW", on_close)
+
+        batches = list(self.all_sheets_data.keys())
+        initial_batch = self.current_sheet_name if self.current_sheet_name in batches else batches[0]
+        batch_var = ctk.StringVar(value=initial_batch)
+
+        control_frame = ctk.CTkFrame(window)
+        control_frame.pack(fill="x", padx=20, pady=20)
+
+        ctk.CTkLabel(control_frame, text="Batch:", font=ctk.CTkFont(weight="bold")).pack(side="left", padx=(0, 10))
+        batch_menu = ctk.CTkOptionMenu(control_frame, values=batches, variable=batch_var, command=lambda _: refresh(), width=220)
+        batch_menu.pack(side="left", padx=(0, 20))
+
+        overview_label = ctk.CTkLabel(control_frame, text="", font=ctk.CTkFont(size=14, weight="bold"))
+        overview_label.pack(side="left")
+
+        def make_tree(parent, columns, widths, height):
+            tree = ttk.Treeview(parent, columns=columns, show="headings", height=height)
+            for col, width in zip(columns, widths):
+                tree.heading(col, text=col)
+                tree.column(col, width=width, anchor="w" if col in ("Subject", "Distribution") else "center")
+            return tree
+
+        top_frame = ctk.CTkFrame(window, fg_color="transparent")
+        top_frame.pack(fill="x", padx=20, pady=(0, 10))
+
+        class_frame = ctk.CTkFrame(top_frame)
+        class_frame.pack(side="left", fill="both", expand=True, padx=(0, 10))
+        ctk.CTkLabel(class_frame, text="Class Awarded", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=10, pady=(5, 0))
+        class_tree = make_tree(class_frame, ("Class", "Students", "Share"), (230, 90, 90), 5)
+        class_tree.pack(fill="both", expand=True, padx=5, pady=5)
+
+        gpa_frame = ctk.CTkFrame(top_frame)
+        gpa_frame.pack(side="left", fill="both", expand=True)
+        ctk.CTkLabel(gpa_frame, text="GPA Distribution", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=10, pady=(5, 0))
+        gpa_tree = make_tree(gpa_frame, ("GPA", "Students", "Distribution"), (100, 80, 260), 8)
+        gpa_tree.pack(fill="both", expand=True, padx=5, pady=5)
+
+        ranking_label = ctk.CTkLabel(window, text="", anchor="w", justify="left", wraplength=1050)
+        ranking_label.pack(fill="x", padx=20, pady=(0, 10))
+
+        subject_frame = ctk.CTkFrame(window)
+        subject_frame.pack(fill="both", expand=True, padx=20, pady=(0, 20))
+        subject_scroll = ctk.CTkScrollbar(subject_frame)
+        subject_scroll.pack(side="right", fill="y")
+        subject_tree = make_tree(subject_frame, ("Subject", "Graded", "Passed", "Pass Rate (%)", "Mean Points", "Blank"),
+                                 (420, 90, 90, 100, 110, 80), 10)
+        subject_tree.pack(fill="both", expand=True, padx=2, pady=2)
+        subject_view = virtual_tree.VirtualTreeview(subject_tree, subject_scroll)
+        subject_view.enable_heading_sort()
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            stats = self.batch_analytics.get(batch_var.get())
+            if stats is None:
+                return
+            students = stats.student_count()
+            overview_label.configure(text=f"{students} students   |   Mean GPA: {stats.totals.mean_gpa():.2f}")
+
+            class_tree.delete(*class_tree.get_children())
+            for name, count in stats.class_breakdown().items():
+                share = f"{count / students:.1%}" if students else "-"
+                class_tree.insert("", "end", values=(name, count, share))
+
+            distribution = stats.gpa_distribution()
+            gpa_tree.delete(*gpa_tree.get_children())
+            peak = max(distribution.max(), 1)
+            for band, count in reversed(list(distribution.items())):
+                gpa_tree.insert("", "end", values=(band, count, "\u2588" * int(round(30 * count / peak))))
+
+            summary = stats.subject_summary()
+            subject_view.set_rows([
+                summary.index.to_numpy(),
+                summary['Graded'].to_numpy(),
+                summary['Passed'].to_numpy(),
+                (summary['Pass Rate'] * 100).round(1).astype(object).fillna("-").to_numpy(),
+                summary['Mean Points'].round(2).astype(object).fillna("-").to_numpy(),
+                summary['Blank'].to_numpy(),
+            ])
+
+            def describe(ranked):
+                return ", ".join(f"{subject} ({row['Mean Points']:.2f})" for subject, row in ranked.iterrows()) or "-"
+            ranking_label.configure(text=f"Strongest subjects: {describe(stats.ranked_subjects(3))}\n"
+                                         f"Weakest subjects: {describe(stats.ranked_subjects(3, best=False))}")
+
+        self.refresh_analytics_window = refresh
+        refresh()
+
+    def open_merit_list_window(self):
+        if not self.all_sheets_data:
+            messagebox.showinfo("Info", "Please load a workbook first.")
+            return
+
+        if self.merit_window and self.merit_window.winfo_exists():
+            self.merit_window.focus()
+            return
+
+        window = ctk.CTkToplevel(self)
+        window.title("Merit List")
+        window.geometry("1100x700")
+        window.transient(self)
+        self.merit_window = window
+
+        def on_close():
+            self.merit_window = None
+            window.destroy()
+
+        window.protocol("WM_DELETE_WINDOW", on_close)
+
+        all_batches = "All Batches"
+        scopes = [all_batches] + list(self.all_sheets_data.keys())
+        scope_var = ctk.StringVar(value=self.current_sheet_name if self.current_sheet_name in scopes else all_batches)
+        top_var = ctk.StringVar(value="10")
+        lookup_var = ctk.StringVar(value="")
+        intake = os.path.basename(self.file_path) if self.file_path else ""
+        state = {"merit": None, "ranked": None}
+
+        def truncated_gpa(gpa):
+            return f"{math.floor(gpa * 100) / 100:.2f}"
+
+        def build_merit():
+            # Read from the running GPA totals, so unsaved edits and deletions are ranked as they stand
+            sheets = list(self.all_sheets_data) if scope_var.get() == all_batches else [scope_var.get()]
+            frames = [
+                merit_list.batch_entries(self.all_sheets_data[s], self.batch_analytics[s].totals, s, intake)
+                for s in sheets if s in self.batch_analytics
+            ]
+            entries = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=merit_list.MERIT_COLUMNS)
+            return merit_list.MeritList(entries)
+
+        def show_merit():
+            try:
+                k = int(top_var.get())
+                if k <= 0: raise ValueError
+            except ValueError:
+                messagebox.showwarning("Top N", "Enter how many students to list (a whole number above 0).", parent=window)
+                return
+            merit = build_merit()
+            ranked = merit.top(k)
+            state["merit"], state["ranked"] = merit, ranked
+            merit_view.set_rows([
+                ranked['Rank'].to_numpy(),
+                ranked['Batch'].to_numpy(),
+                ranked['Registration Number'].to_numpy(),
+                ranked['Name'].to_numpy(),
+                [truncated_gpa(g) for g in ranked['GPA']],
+                ranked['Total Credits'].map("{:g}".format).to_numpy(),
+                ranked['Class'].to_numpy(),
+            ])
+            tied = len(ranked) - min(k, len(merit))
+            info_label.configure(text=f"Top {min(k, len(merit))} of {len(merit)} students in {scope_var.get()}"
+                                      + (f" (+{tied} tied at the last place)" if tied > 0 else "") + ".")
+            btn_print.configure(state="normal" if len(ranked) else "disabled")
+
+        def lookup_rank():
+            merit = state["merit"]
+            term = lookup_var.get().strip()
+            if merit is None or not term: return
+            positions = merit.find(term)
+            if not len(positions):
+                lookup_label.configure(text=f"{term} is not in {scope_var.get()}.", text_color="#FFAB91")
+                return
+            lines = []
+            for pos in positions:
+                rank, percentile = merit.rank_of(pos)
+                entry = merit.entries.iloc[pos]
+                lines.append(f"{entry['Registration Number']} ({entry['Batch']}): rank {rank} of {len(merit)}, "
+                             f"GPA {truncated_gpa(entry['GPA'])}, ahead of {percentile:.1f}% of students")
+            lookup_label.configure(text="\n".join(lines), text_color="#A5D6A7")
+
+        def print_merit():
+            ranked = state["ranked"]
+            if ranked is None or not len(ranked): return
+            html_content = merit_list.to_html(ranked, "Merit List", f"{intake} - {scope_var.get()}", gpa_text=truncated_gpa)
+            with tempfile.NamedTemporaryFile('w', delete=False, suffix='.html', encoding='utf-8') as f:
+                f.write(html_content)
+                filepath = f.name
+            webbrowser.open('file://' + filepath)
+
+        control_frame = ctk.CTkFrame(window)
+        control_frame.pack(fill="x", padx=20, pady=20)
+
+        ctk.CTkLabel(control_frame, text="Scope:", font=ctk.CTkFont(weight="bold")).pack(side="left", padx=(0, 10))
+        ctk.CTkOptionMenu(control_frame, values=scopes, variable=scope_var, command=lambda _: show_merit(), width=220).pack(side="left", padx=(0, 20))
+
+        ctk.CTkLabel(control_frame, text="Top:", font=ctk.CTkFont(weight="bold")).pack(side="left", padx=(0, 10))
+        top_entry = ctk.CTkEntry(control_frame, textvariable=top_var, width=70)
+        top_entry.pack(side="left", padx=(0, 10))
+        top_entry.bind('<Return>', lambda event: show_merit())
+
+        ctk.CTkButton(control_frame, text="Show", command=show_merit, width=90).pack(side="left", padx=(0, 10))
+        btn_print = ctk.CTkButton(control_frame, text="Print Merit List", command=print_merit, state="disabled")
+        btn_print.pack(side="left")
+
+        lookup_frame = ctk.CTkFrame(window, fg_color="transparent")
+        lookup_frame.pack(fill="x", padx=20, pady=(0, 10))
+        lookup_entry = ctk.CTkEntry(
+            lookup_frame,
+            placeholder_text="Rank of Registration Number...",
+            placeholder_text_color="#B0BEC5",
+            width=300,
+            textvariable=lookup_var
+        )
+        lookup_entry.pack(side="left", padx=(0, 10))
+        lookup_entry.bind('<Return>', lambda event: lookup_rank())
+        ctk.CTkButton(lookup_frame, text="Find Rank", command=lookup_rank, width=90).pack(side="left", padx=(0, 15))
+        lookup_label = ctk.CTkLabel(lookup_frame, text="", anchor="w", justify="left")
+        lookup_label.pack(side="left", fill="x")
+
+        merit_frame = ctk.CTkFrame(window)
+        merit_frame.pack(fill="both", expand=True, padx=20, pady=(0, 10))
+        merit_scroll = ctk.CTkScrollbar(merit_frame)
+        merit_scroll.pack(side="right", fill="y")
+
+        columns = ("Rank", "Batch", "RegNo", "Name", "GPA", "Credits", "Class")
+        merit_tree = ttk.Treeview(merit_frame, columns=columns, show="headings")
+        for col, text, width in zip(columns, ("Rank", "Batch", "Registration No", "Name", "GPA", "Credits", "Class"),
+                                    (70, 180, 160, 260, 80, 80, 230)):
+            merit_tree.heading(col, text=text)
+            merit_tree.column(col, width=width, anchor="w" if col in ("Name", "Class") else "center")
+        merit_tree.pack(fill="both", expand=True, padx=2, pady=2)
+        merit_view = virtual_tree.VirtualTreeview(merit_tree, merit_scroll)
+        merit_view.enable_heading_sort()
+
+        info_label = ctk.CTkLabel(window, text="", text_color="gray")
+        info_label.pack(fill="x", padx=20, pady=(0, 15))
+
+        show_merit()
+
 if __name__ == "__main__":
     app = StudentResultApp()
     app.mainloop()
\ No newline at end of file
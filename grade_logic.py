@@ -1,7 +1,17 @@
 import pandas as pd
+import numpy as np
+from pandas.io.parsers import TextParser
 import openpyxl
+from openpyxl.cell.cell import ERROR_CODES, Cell, MergedCell
+import os
 import re
+import shutil
 import math
+import bisect
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import xlsx_patch
 
 # Constants
 GRADE_POINTS = {
@@ -21,6 +31,12 @@ EXCLUDE_KEYWORDS = [
 
 GRADE_COLS = ['A+', 'A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'E', 'AB', 'B and Above', 'C and above', 'A+/A/A-', 'EX', '-', 'C-/D+']
 
+# Shared grade code table. Subject columns are stored as categoricals whose categories start with
+# GRADE_CODES, so a code means the same grade in every sheet; any other value found in a sheet is
+# appended after them. Blank cells have code -1.
+GRADE_CODES = ['A+', 'A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'E', 'F', 'AB', 'EX']
+GRADE_CODE_POINTS = np.array([GRADE_POINTS.get(g, np.nan) for g in GRADE_CODES])
+
 def calculate_gpa(grades, credits=None):
     """Calculates GPA based on grades and optional credits."""
     if credits and len(credits) == len(grades):
@@ -51,6 +67,87 @@ def calculate_gpa(grades, credits=None):
         if count == 0: return 0.00
         return total_points / count
 
+def normalize_grade(value):
+    """Returns the stripped, upper-cased grade, or None for a blank cell."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    grade = str(value).strip().upper()
+    return grade if grade else None
+
+def subject_positions(df, subject_cols):
+    """Column positions of the subject columns (handles repeated subject names)."""
+    subject_set = set(subject_cols)
+    return [i for i, col in enumerate(df.columns) if col in subject_set]
+
+def encode_grade_columns(df, subject_cols):
+    """Stores the subject columns in place as categoricals over the shared grade code table."""
+    positions = subject_positions(df, subject_cols)
+    normalized = {}
+    extras = set()
+    for i in positions:
+        col = df.iloc[:, i]
+        mapping = {v: normalize_grade(v) for v in pd.unique(col)}
+        normalized[i] = col.map(mapping)
+        extras.update(g for g in mapping.values() if g is not None)
+    extras -= set(GRADE_CODES)
+
+    dtype = pd.CategoricalDtype(GRADE_CODES + sorted(extras))
+    for i in positions:
+        df.isetitem(i, pd.Categorical(normalized[i], dtype=dtype))
+    return df
+
+def code_dtype(n_categories):
+    """Smallest signed integer type holding every code of a table of n_categories (and -1)."""
+    return np.min_scalar_type(-max(n_categories, 1))
+
+def grade_code_matrix(df, subject_cols):
+    """Returns (codes, categories): a students x subjects code matrix and its code table. The
+    matrix is int8 while the table has at most 128 entries and widens past that (free-text remarks
+    columns add one entry per distinct value)."""
+    positions = subject_positions(df, subject_cols)
+    if not positions:
+        return np.empty((len(df), 0), dtype=np.int8), list(GRADE_CODES)
+    columns = [df.iloc[:, i] for i in positions]
+    if not all(isinstance(c.dtype, pd.CategoricalDtype) for c in columns):
+        # Frames that were never encoded (e.g. built by hand) get encoded on a copy
+        df = encode_grade_columns(df.copy(), subject_cols)
+        columns = [df.iloc[:, i] for i in positions]
+    categories = list(columns[0].cat.categories)
+    column_codes = []
+    for col in columns:
+        if list(col.cat.categories) != categories:
+            # Earlier columns keep their codes: the table only grows at the end
+            col = col.cat.set_categories(categories + [c for c in col.cat.categories if c not in categories])
+            categories = list(col.cat.categories)
+        column_codes.append(col.cat.codes.to_numpy())
+    codes = np.empty((len(df), len(columns)), dtype=code_dtype(len(categories)))
+    for j, col_codes in enumerate(column_codes):
+        codes[:, j] = col_codes
+    return codes, categories
+
+def grade_points_table(categories, grade_points=GRADE_POINTS):
+    """Grade points per code of a code table (NaN for codes that carry no points, e.g. AB)."""
+    return np.array([grade_points.get(g, np.nan) for g in categories] + [np.nan])
+
+def decode_grades(codes, categories):
+    """Turns grade codes back into display strings ('' for blank cells)."""
+    table = np.array(list(categories) + [""], dtype=object)
+    return table[codes]
+
+def set_grade(df, idx, subject, value):
+    """Writes one grade into an encoded sheet, extending its code table for a value it has not seen."""
+    grade = normalize_grade(value)
+    col = df[subject]
+    if isinstance(col, pd.DataFrame):
+        col = col.iloc[:, 0]
+    dtype = col.dtype
+    if isinstance(dtype, pd.CategoricalDtype) and grade is not None and grade not in dtype.categories:
+        new_dtype = pd.CategoricalDtype(list(dtype.categories) + [grade])
+        for i in range(len(df.columns)):
+            if df.dtypes.iloc[i] == dtype:
+                df.isetitem(i, df.iloc[:, i].cat.set_categories(new_dtype.categories))
+    df.at[idx, subject] = grade if grade is not None else np.nan
+
 def calculate_class(gpa):
     """Determines class based on GPA."""
     if gpa >= 3.70:
@@ -64,78 +161,553 @@ def calculate_class(gpa):
     else:
         return "Fail"
 
-def load_workbook_data(file_path):
-    """Loads workbook and processes sheets."""
+def calculate_gpa_matrix(codes, categories, credits=None, unweighted_fallback=False, grade_points=GRADE_POINTS):
+    """calculate_gpa for every row of a grade code matrix at once. Returns (gpa, total_credits) arrays.
+
+    credits is one value per subject column (None for a subject without credits), as app.py passes
+    it to calculate_gpa; without it every row gets the unweighted average. With unweighted_fallback,
+    rows whose graded subjects carry no credits also get the unweighted average, which is how the
+    desktop app calls calculate_gpa. grade_points gives the grades that count towards the GPA (the
+    desktop app leaves F out)."""
+    codes = np.asarray(codes)
+    return _gpa_from_points(grade_points_table(categories, grade_points)[codes], credit_values(credits, codes.shape[1]), unweighted_fallback)
+
+def credit_values(credits, n_subjects):
+    """Credits per subject column as floats (NaN for a subject without credits), or None when the
+    credits do not apply (missing, or not one per subject), as calculate_gpa treats them."""
+    if not credits or len(credits) != n_subjects:
+        return None
+    return np.array([np.nan if c is None else float(c) for c in credits])
+
+def _gpa_from_points(points, credit_vals, unweighted_fallback):
+    # calculate_gpa_matrix on a students x subjects matrix of grade points (NaN = no points)
+    n_rows, n_subjects = points.shape
+    graded = ~np.isnan(points)
+    points = np.where(graded, points, 0.0)
+
+    # Accumulate subject by subject, in the same order (and float rounding) as calculate_gpa
+    total_points = np.zeros(n_rows)
+    count = np.zeros(n_rows, dtype=np.int64)
+    for j in range(n_subjects):
+        total_points += points[:, j]
+        count += graded[:, j]
+    unweighted = np.divide(total_points, count, out=np.zeros(n_rows), where=count > 0)
+
+    if credit_vals is None:
+        return unweighted, np.zeros(n_rows)
+
+    total_quality_points = np.zeros(n_rows)
+    total_credits = np.zeros(n_rows)
+    for j in range(n_subjects):
+        if np.isnan(credit_vals[j]): continue
+        total_quality_points += np.where(graded[:, j], points[:, j] * credit_vals[j], 0.0)
+        total_credits += np.where(graded[:, j], credit_vals[j], 0.0)
+    gpa = np.divide(total_quality_points, total_credits, out=np.zeros(n_rows), where=total_credits != 0)
+
+    if unweighted_fallback:
+        has_credit = (graded & ~np.isnan(credit_vals)).any(axis=1)
+        gpa = np.where(has_credit, gpa, unweighted)
+    return gpa, total_credits
+
+CLASS_NAMES = ["First Class", "Second Class (Upper Division)", "Second Class (Lower Division)", "Pass", "Fail"]
+
+def calculate_class_code(gpa):
+    """Position of calculate_class(gpa) in CLASS_NAMES."""
+    return CLASS_NAMES.index(calculate_class(gpa))
+
+class GpaAccumulator:
+    """Running GPA and class of every student in a sheet, kept current one grade change at a time.
+
+    A change recomputes only the edited student's GPA from that one row of grade codes (O(subjects),
+    through grade point and credit tables built once), summing in the same order as calculate_gpa, so
+    every GPA and class read after any number of edits is exactly what calculate_gpa and
+    calculate_class give for the student's current grades. The sheet-wide class counts and GPA total
+    are updated from the old and new values in O(1). Rows are addressed by position in the sheet;
+    flags and grade_points mean the same as in calculate_gpa_matrix."""
+
+    def __init__(self, df, subject_cols, subject_credits=None, unweighted_fallback=False, grade_points=GRADE_POINTS):
+        codes, categories = grade_code_matrix(df, subject_cols)
+        # One column per entry of subject_cols; a repeated subject name reads its first column
+        first = {}
+        for j, i in enumerate(subject_positions(df, subject_cols)):
+            first.setdefault(df.columns[i], j)
+        self.codes = codes[:, [first[s] for s in subject_cols]] if len(subject_cols) else codes.copy()
+        self.categories = list(categories)
+        self.unweighted_fallback = unweighted_fallback
+        self.grade_points = grade_points
+        self.subject_pos = {}
+        for j, subject in enumerate(subject_cols):
+            self.subject_pos.setdefault(subject, []).append(j)
+        self.credits = [subject_credits.get(s) for s in subject_cols] if subject_credits is not None else None
+        self.points_table = grade_points_table(self.categories, grade_points)
+        self.credit_vals = credit_values(self.credits, len(subject_cols))
+
+        self.gpa, self.total_credits = self._gpa(self.codes)
+        self.class_codes = self._class_codes(self.gpa)
+        self.class_counts = np.bincount(self.class_codes, minlength=len(CLASS_NAMES))
+        self.gpa_total = float(self.gpa.sum())
+
+    def _gpa(self, codes):
+        return _gpa_from_points(self.points_table[codes], self.credit_vals, self.unweighted_fallback)
+
+    @staticmethod
+    def _class_codes(gpa):
+        gpa = np.asarray(gpa)
+        return np.select([gpa >= 3.70, gpa >= 3.30, gpa >= 3.00, gpa >= 2.00], [0, 1, 2, 3], default=4)
+
+    def copy(self):
+        other = object.__new__(GpaAccumulator)
+        other.__dict__ = {k: (v.copy() if isinstance(v, (np.ndarray, list)) else v) for k, v in self.__dict__.items()}
+        return other
+
+    def set_grade(self, pos, subject, value):
+        """Applies one grade change to a student's GPA and class and the sheet statistics."""
+        grade = normalize_grade(value)
+        if grade is None:
+            new_code = -1
+        else:
+            if grade not in self.categories:
+                self.categories.append(grade)
+                # Codes index the table; its last slot (NaN) stays the one blank cells (-1) read
+                self.points_table = np.insert(self.points_table, -1, self.grade_points.get(grade, np.nan))
+                self.codes = self.codes.astype(np.promote_types(self.codes.dtype, code_dtype(len(self.categories))), copy=False)
+            new_code = self.categories.index(grade)
+        for j in self.subject_pos.get(subject, []):
+            self.codes[pos, j] = new_code
+
+        gpa, total_credits = self._gpa(self.codes[pos:pos + 1])
+        class_code = calculate_class_code(gpa[0])
+        self.class_counts[self.class_codes[pos]] -= 1
+        self.class_counts[class_code] += 1
+        self.gpa_total += gpa[0] - self.gpa[pos]
+        self.gpa[pos] = gpa[0]
+        self.total_credits[pos] = total_credits[0]
+        self.class_codes[pos] = class_code
+
+    def remove_row(self, pos):
+        """Drops a deleted student; later rows move up one position."""
+        self.class_counts[self.class_codes[pos]] -= 1
+        self.gpa_total -= self.gpa[pos]
+        for name in ("codes", "total_credits", "gpa", "class_codes"):
+            setattr(self, name, np.delete(getattr(self, name), pos, axis=0))
+
+    def student_gpa(self, pos):
+        return float(self.gpa[pos])
+
+    def student_class(self, pos):
+        return CLASS_NAMES[self.class_codes[pos]]
+
+    def mean_gpa(self):
+        """Mean GPA of the sheet, from the running total (the same as gpa.mean() up to float rounding)."""
+        return float(self.gpa_total / len(self.gpa)) if len(self.gpa) else 0.0
+
+    def class_breakdown(self):
+        """{class name: number of students}."""
+        return dict(zip(CLASS_NAMES, (int(n) for n in self.class_counts)))
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sum(v.nbytes for v in self.__dict__.values() if isinstance(v, np.ndarray))
+
+# Lowest grade points that count as passing a subject (D and above)
+SUBJECT_PASS_POINTS = 1.00
+
+def _display_text(col):
+    """Stripped strings of a column, '-' for blank cells."""
+    if isinstance(col, pd.DataFrame):
+        col = col.iloc[:, 0]
+    text = col.astype(object).astype(str).str.strip()
+    return text.where(col.notna(), "-")
+
+def subject_results(df, subject, grade_points=GRADE_POINTS):
+    """Every student's result for one subject in one vectorised pass.
+
+    Returns a DataFrame with 'S/No', 'Registration Number', 'Name', 'Grade' ('-' if blank) and
+    'Points' (NaN for grades that carry no points) columns, indexed like the sheet."""
+    codes, categories = grade_code_matrix(df, [subject])
+    codes = codes[:, 0]
+    name_col = next((c for c in df.columns if "name" in c.lower()), None)
+    return pd.DataFrame({
+        'S/No': df.index + 1,
+        'Registration Number': _display_text(df['Registration Number']),
+        'Name': _display_text(df[name_col]) if name_col else "-",
+        'Grade': np.array(list(categories) + ["-"], dtype=object)[codes],
+        'Points': grade_points_table(categories, grade_points)[codes],
+    }, index=df.index)
+
+def grade_distributions(df, subject_cols, grade_points=GRADE_POINTS):
+    """Grade distribution of every subject of a sheet: {subject: summary}.
+
+    A summary holds 'counts' (students per grade, in code table order, grades nobody got left out),
+    'blank', 'graded' (students whose grade carries points in grade_points), 'passed', 'pass_rate'
+    and 'mean_points' (both NaN when nobody is graded)."""
+    codes, categories = grade_code_matrix(df, subject_cols)
+    points = grade_points_table(categories, grade_points)[:-1]
+    graded_codes = ~np.isnan(points)
+    passing_codes = graded_codes & (np.nan_to_num(points) >= SUBJECT_PASS_POINTS)
+    summaries = {}
+    for j, i in enumerate(subject_positions(df, subject_cols)):
+        subject = df.columns[i]
+        if subject in summaries: continue  # a repeated subject name reads as its first column
+        # Blank cells have code -1; shift by one so slot 0 of the bincount counts them
+        counts = np.bincount(codes[:, j].astype(np.intp) + 1, minlength=len(categories) + 1)
+        per_code = counts[1:]
+        graded = int(per_code[graded_codes].sum())
+        passed = int(per_code[passing_codes].sum())
+        summaries[subject] = {
+            'counts': {g: int(n) for g, n in zip(categories, per_code) if n},
+            'blank': int(counts[0]),
+            'graded': graded,
+            'passed': passed,
+            'pass_rate': passed / graded if graded else np.nan,
+            'mean_points': float((per_code[graded_codes] * points[graded_codes]).sum() / graded) if graded else np.nan,
+        }
+    return summaries
+
+def is_header_row(row_vals):
+    """Checks whether a row of lower-cased cell strings is the 'Registration Number' header."""
+    return any("registration" in x for x in row_vals) and (any("no" in x for x in row_vals) or any("number" in x for x in row_vals))
+
+def find_header_row(raw_df):
+    """Returns the index of the 'Registration Number' header row within the first 10 rows, or -1."""
+    for i in range(min(10, len(raw_df))):
+        row_vals = raw_df.iloc[i].astype(str).str.lower().tolist()
+        if is_header_row(row_vals):
+            return i
+    return -1
+
+def frame_from_raw(raw_df, header_row_idx):
+    """Builds the frame pd.read_excel(header=header_row_idx) returns, from a sheet already read with header=None."""
+    # raw_df must be read with dtype=object so the cells still hold their original values;
+    # the parser then applies the same header naming and type inference as read_excel.
+    # read_excel hands the parser empty cells as "" (which names a blank header cell "Unnamed: n").
+    return TextParser(raw_df.where(raw_df.notna(), "").values.tolist(), header=header_row_idx).read()
+
+def _convert_cell_value(value):
+    """Converts a values-only openpyxl cell the same way pandas' openpyxl reader does."""
+    if value is None:
+        return ""
+    if isinstance(value, str) and value in ERROR_CODES:
+        return math.nan
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        int_val = int(value)
+        return int_val if int_val == value else float(value)
+    return value
+
+def _convert_row(row):
+    """Converts a row tuple, dropping trailing empty cells like pandas does."""
+    converted = [_convert_cell_value(v) for v in row]
+    while converted and converted[-1] == "":
+        converted.pop()
+    return converted
+
+def file_fingerprint(file_path):
+    """(size, mtime_ns) of a file, or None if it cannot be read."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+class SheetLayout:
+    """Where a sheet's header, columns and students sit in its Excel file, as the save path needs them.
+
+    Recorded by the streaming loader while it reads the rows (feed() takes every row from row 1,
+    as raw cell values), so a save looks cells up instead of rescanning the sheet. fingerprint is
+    the file's (size, mtime_ns) the layout describes; a save trusts the layout only while the
+    file still matches it. Frames carry their layout in df.attrs['layout'] and share it on copy."""
+
+    HEADER_SCAN_ROWS = 14
+
+    def __init__(self, fingerprint=None):
+        self.fingerprint = fingerprint
+        self.header_row = None  # 1-based Excel row of the 'Registration No' header
+        self.reg_col = None  # 1-based Excel column of the registration numbers
+        self.subject_cols = {}  # column title (subject row wins over header) -> 1-based column
+        self.reg_rows = {}  # stripped registration number -> Excel rows holding it, top to bottom
+        self._row = 0
+        self._header = None
+
+    @classmethod
+    def scan(cls, ws, fingerprint=None):
+        """Layout of an openpyxl worksheet, or None if it has no registration header in the first rows."""
+        layout = cls(fingerprint)
+        for row in ws.iter_rows(min_row=1, min_col=1, values_only=True):
+            if not layout.feed(row): break
+        return layout if layout.header_row else None
+
+    def feed(self, row):
+        """Takes the next raw row; returns False once the header search has given up."""
+        self._row += 1
+        if self.header_row is None:
+            if self._row > self.HEADER_SCAN_ROWS:
+                return False
+            for c, val in enumerate(row, start=1):
+                val = str(val).lower()
+                if "registration" in val and ("no" in val or "num" in val):
+                    self.header_row, self.reg_col, self._header = self._row, c, row
+                    break
+            return True
+
+        if self._row == self.header_row + 1:
+            # Titles come from the subject row where it has one, else from the header row
+            header = self._header
+            for c in range(max(len(header), len(row))):
+                val = header[c] if c < len(header) else None
+                val_below = row[c] if c < len(row) else None
+                if val_below: self.subject_cols[str(val_below).strip()] = c + 1
+                elif val: self.subject_cols[str(val).strip()] = c + 1
+            self._header = None
+
+        val = row[self.reg_col - 1] if self.reg_col <= len(row) else None
+        if val: self.reg_rows.setdefault(str(val).strip(), []).append(self._row)
+        return True
+
+    def matches(self, fingerprint):
+        return self.header_row is not None and fingerprint is not None and self.fingerprint == fingerprint
+
+    def row_of(self, reg):
+        """Excel row of a registration number (its last entry, as the save path has always used), or None."""
+        rows = self.reg_rows.get(str(reg).strip())
+        return rows[-1] if rows else None
+
+    def rows_deleted(self, deleted_rows, fingerprint):
+        """Brings the layout in step with a save that deleted these Excel rows and left the file at fingerprint."""
+        self.fingerprint = fingerprint
+        if not deleted_rows: return
+        deleted = sorted(set(deleted_rows))
+        gone = set(deleted)
+        for reg in list(self.reg_rows):
+            rows = [r - bisect.bisect_left(deleted, r) for r in self.reg_rows[reg] if r not in gone]
+            if rows:
+                self.reg_rows[reg] = rows
+            else:
+                del self.reg_rows[reg]
+
+    def __deepcopy__(self, memo):
+        # pandas deep-copies attrs on every frame operation; the layout describes the file, so copies share it
+        return self
+
+def _stream_sheet_frame(ws, fingerprint=None):
+    """Streams a read-only worksheet and returns its header frame, or None if it has no header in the first 10 rows.
+    The frame's attrs['layout'] is the SheetLayout recorded on the way, tagged with the file's fingerprint."""
+    ws.reset_dimensions()
+    rows = ws.iter_rows(values_only=True)
+    layout = SheetLayout(fingerprint)
+
+    # Look for the header while streaming; sheets without one are never read past row 10.
+    data = []
+    header_row_idx = -1
+    for row in rows:
+        layout.feed(row)
+        data.append(_convert_row(row))
+        if is_header_row([str(x).lower() for x in data[-1]]):
+            header_row_idx = len(data) - 1
+            break
+        if len(data) >= 10:
+            break
+    if header_row_idx == -1: return None
+
+    for row in rows:
+        layout.feed(row)
+        data.append(_convert_row(row))
+
+    # Trim trailing empty rows and pad to a rectangle, as pd.read_excel does
+    while data and not data[-1]:
+        data.pop()
+    max_width = max(len(r) for r in data)
+    data = [r + [""] * (max_width - len(r)) for r in data]
+
+    df = TextParser(data, header=header_row_idx).read()
+    if layout.header_row is not None:
+        df.attrs['layout'] = layout
+    return df
+
+def _can_stream(file_path):
+    """openpyxl only reads the xlsx family; other formats (e.g. .xls) go through pd.read_excel."""
+    return str(file_path).lower().endswith(('.xlsx', '.xlsm'))
+
+def _load_sheets_worker(file_path, sheet_names, process):
+    """Streams a chunk of sheets in one worker, returning [(sheet_name, frame or process_sheet result)]."""
+    fingerprint = file_fingerprint(file_path)
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        results = []
+        for sheet_name in sheet_names:
+            df = _stream_sheet_frame(wb[sheet_name], fingerprint)
+            if df is not None and process:
+                df = process_sheet(df)
+            results.append((sheet_name, df))
+        return results
+    finally:
+        wb.close()
+
+def _load_sheets_parallel(file_path, workers, process):
+    """Parses the sheets across a process pool and returns [(sheet_name, result)] in workbook order."""
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    sheet_names = [ws.title for ws in wb.worksheets]
+    wb.close()
+
+    # One chunk per worker, so each process opens the workbook (and its shared strings) only once
+    workers = max(1, min(workers, len(sheet_names)))
+    chunks = [sheet_names[i::workers] for i in range(workers)]
+    chunk_results = None
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunk_results = list(executor.map(_load_sheets_worker, [file_path] * workers, chunks, [process] * workers))
+        except (OSError, NotImplementedError, BrokenProcessPool):
+            pass
+    if chunk_results is None:
+        # Serial fallback when there is nothing to parallelise or no worker processes can be started
+        chunk_results = [_load_sheets_worker(file_path, sheet_names, process)]
+
+    results = dict(pair for chunk in chunk_results for pair in chunk)
+    return [(sheet_name, results[sheet_name]) for sheet_name in sheet_names]
+
+def iter_header_frames(file_path, streaming=False, workers=1):
+    """Yields (sheet_name, df) for every sheet with a 'Registration Number' header row.
+
+    With streaming=True the workbook is read row by row through openpyxl's read-only mode
+    instead of building a frame of every cell in every sheet first. workers > 1 streams
+    the sheets in that many worker processes."""
+    if not _can_stream(file_path):
+        streaming, workers = False, 1
+
+    if workers > 1:
+        for sheet_name, df in _load_sheets_parallel(file_path, workers, process=False):
+            if df is not None:
+                yield sheet_name, df
+        return
+
+    if streaming:
+        fingerprint = file_fingerprint(file_path)
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+        try:
+            for ws in wb.worksheets:
+                df = _stream_sheet_frame(ws, fingerprint)
+                if df is not None:
+                    yield ws.title, df
+        finally:
+            wb.close()
+        return
+
+    # Parse the workbook once; each sheet's frame is rebuilt from its raw rows.
+    all_sheets_raw = pd.read_excel(file_path, sheet_name=None, header=None, dtype=object)
+    for sheet_name, raw_df in all_sheets_raw.items():
+        if len(raw_df) < 1: continue
+
+        # Find Header Row
+        header_row_idx = find_header_row(raw_df)
+        if header_row_idx == -1: continue
+
+        yield sheet_name, frame_from_raw(raw_df, header_row_idx)
+
+def _is_subject_column(col, subject_rule):
+    if subject_rule == "exclude":
+        # Every column that is not a known non-subject column
+        cl = col.lower()
+        if cl == 's': return False
+        if any(k in cl for k in EXCLUDE_KEYWORDS): return False
+        if col in GRADE_COLS: return False
+        if "unnamed" in cl: return False
+        return True
+    
+    # Only include columns that match the subject code pattern
+    # Pattern: 2-6 uppercase letters + space + 5 digits + space + subject name
+    # Example: BSAA 11013 Financial Accounting
+    return bool(re.match(r'^[A-Z]{2,6}\s+\d{5}\s+', col))
+
+@functools.lru_cache(maxsize=256)
+def _infer_sheet_schema(header, subject_rule, fingerprint):
+    # Normalize Columns
+    columns = [str(c).strip() for c in header]
+    reg_col = next((c for c in columns if "registration" in c.lower() or "reg no" in c.lower()), None)
+    if reg_col is None: return None
+    columns = ['Registration Number' if c == reg_col else c for c in columns]
+    
+    reg_pos = columns.index('Registration Number')
+    name_pos = next((i for i, c in enumerate(columns) if "name" in c.lower()), None)
+    subject_cols = [c for c in columns if _is_subject_column(c, subject_rule)]
+    
+    # Extract credit values from subject code (last digit of subject code)
+    # Example: "BSAA 11013" -> credit = 3
+    subject_credits = {}
+    for col_name in subject_cols:
+        digits = re.findall(r'\d', col_name)
+        if digits:
+            credit_val = int(digits[-1])
+            if credit_val > 0:
+                subject_credits[col_name] = float(credit_val)
+    
+    return tuple(columns), reg_pos, name_pos, tuple(subject_cols), tuple(subject_credits.items())
+
+def infer_sheet_schema(header, subject_rule="pattern", fingerprint=None):
+    """Works out a sheet's layout from its merged header row.
+
+    subject_rule "pattern" keeps columns named like 'BSAA 11013 Financial Accounting'; "exclude"
+    keeps every column that is not a known non-subject column (the desktop app's rule).
+    Returns a dict with the normalised 'columns', 'reg_pos', 'name_pos', 'subject_cols' and
+    'subject_credits', or None if there is no registration column. Results are memoised by header
+    and the workbook's (size, mtime_ns) fingerprint, as SheetLayout is, so the sheets of a workbook
+    sharing a layout infer it only once and a workbook saved since starts afresh."""
+    schema = _infer_sheet_schema(tuple(header), subject_rule, fingerprint)
+    if schema is None: return None
+    columns, reg_pos, name_pos, subject_cols, subject_credits = schema
+    return {
+        'columns': list(columns),
+        'reg_pos': reg_pos,
+        'name_pos': name_pos,
+        'subject_cols': list(subject_cols),
+        'subject_credits': dict(subject_credits),
+    }
+
+def process_sheet(df, subject_rule="pattern"):
+    """Merges the subject row and extracts subject columns and credits.
+
+    Returns (df, subject_cols, subject_credits), or None if the sheet has no registration column."""
+    # Streamed frames carry the fingerprint of the file they were read from
+    layout = df.attrs.get('layout')
+    fingerprint = layout.fingerprint if layout is not None else None
+
+    # Merge Subject Row (Row below header)
+    if len(df) > 0:
+        subject_row = df.iloc[0]
+        new_columns = list(df.columns)
+        for i in range(len(new_columns)):
+            if i >= 4: 
+                val = subject_row.iloc[i]
+                if pd.notna(val) and str(val).strip() != "":
+                    new_columns[i] = str(val).strip()
+        df.columns = new_columns
+        df = df.drop(0).reset_index(drop=True)
+
+    schema = infer_sheet_schema(df.columns, subject_rule, fingerprint)
+    if schema is None: return None
+    df.columns = schema['columns']
+    
+    # Store grades as compact codes over the shared grade table
+    encode_grade_columns(df, schema['subject_cols'])
+    
+    return df, schema['subject_cols'], schema['subject_credits']
+
+def load_workbook_data(file_path, streaming=False, workers=1):
+    """Loads workbook and processes sheets. streaming=True reads it through openpyxl's read-only mode;
+    workers > 1 parses the sheets in a process pool (streaming), falling back to serial if unavailable."""
     try:
-        all_sheets_raw = pd.read_excel(file_path, sheet_name=None, header=None)
         all_sheets_data = {}
         subject_columns_per_sheet = {}
         subject_credits_per_sheet = {}
         
-        for sheet_name, raw_df in all_sheets_raw.items():
-            if len(raw_df) < 1: continue
-            
-            # Find Header Row
-            header_row_idx = -1
-            for i in range(min(10, len(raw_df))):
-                row_vals = raw_df.iloc[i].astype(str).str.lower().tolist()
-                if any("registration" in x for x in row_vals) and (any("no" in x for x in row_vals) or any("number" in x for x in row_vals)):
-                    header_row_idx = i
-                    break
-            
-            if header_row_idx == -1: continue
-                
-            df = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row_idx)
-            
-            # Merge Subject Row (Row below header)
-            if len(df) > 0:
-                subject_row = df.iloc[0]
-                new_columns = list(df.columns)
-                for i in range(len(new_columns)):
-                    if i >= 4: 
-                        val = subject_row.iloc[i]
-                        if pd.notna(val) and str(val).strip() != "":
-                            new_columns[i] = str(val).strip()
-                df.columns = new_columns
-                df = df.drop(0).reset_index(drop=True)
-
-            # Normalize Columns
-            df.columns = [str(c).strip() for c in df.columns]
-            reg_col_found = False
-            for col in df.columns:
-                if "registration" in col.lower() or "reg no" in col.lower():
-                    df.rename(columns={col: 'Registration Number'}, inplace=True)
-                    reg_col_found = True
-                    break
-            
-            if not reg_col_found: continue
-            
-            # Load ONLY subject columns matching the pattern (BSAA XXXXX Subject Name)
-            subject_cols = []
-            
-            for idx, col in enumerate(df.columns):
-                col_str = str(col).strip()
-                
-                # Only include columns that match the subject code pattern
-                # Pattern: 2-6 uppercase letters + space + 5 digits + space + subject name
-                # Example: BSAA 11013 Financial Accounting
-                is_subject = bool(re.match(r'^[A-Z]{2,6}\s+\d{5}\s+', col_str))
-                
-                if is_subject:
-                    subject_cols.append(col_str)
+        if workers > 1 and _can_stream(file_path):
+            sheet_results = _load_sheets_parallel(file_path, workers, process=True)
+        else:
+            sheet_results = ((sheet_name, process_sheet(df)) for sheet_name, df in iter_header_frames(file_path, streaming=streaming))
+        
+        for sheet_name, result in sheet_results:
+            if result is None: continue
             
+            df, subject_cols, subject_credits = result
             subject_columns_per_sheet[sheet_name] = subject_cols
-            
-            # Extract credit values
-            subject_credits = {}
-            for col_name in subject_cols:
-                subject_code = str(col_name).strip()
-                digits = re.findall(r'\d', subject_code)
-                if digits:
-                    credit_val = int(digits[-1])
-                    if credit_val > 0:
-                        subject_credits[col_name] = float(credit_val)
-            
             subject_credits_per_sheet[sheet_name] = subject_credits
             all_sheets_data[sheet_name] = df
 
@@ -144,54 +716,216 @@ def load_workbook_data(file_path):
     except Exception as e:
         return None, None, None
 
-def save_changes_to_excel(file_path, pending_changes, pending_deletes):
-    """Saves pending changes to the Excel file."""
+def list_result_sheets(file_path):
+    """Lists the sheets that have a 'Registration Number' header, reading at most 10 rows of each."""
     try:
-        wb = openpyxl.load_workbook(file_path)
-        affected_sheets = set(pending_changes.keys()).union(set(pending_deletes.keys()))
-        
-        for sheet_name in affected_sheets:
-            if sheet_name not in wb.sheetnames: continue
-            ws = wb[sheet_name]
-            
-            header_row = None
-            reg_col_idx = None
-            for r in range(1, 15):
-                for c in range(1, ws.max_column + 1):
-                    val = str(ws.cell(row=r, column=c).value).lower()
-                    if "registration" in val and ("no" in val or "num" in val):
-                        header_row = r
-                        reg_col_idx = c
+        if not _can_stream(file_path):
+            heads = pd.read_excel(file_path, sheet_name=None, header=None, dtype=object, nrows=10)
+            return [sheet_name for sheet_name, raw_df in heads.items() if find_header_row(raw_df) != -1]
+
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+        try:
+            sheet_names = []
+            for ws in wb.worksheets:
+                ws.reset_dimensions()
+                for row in ws.iter_rows(max_row=10, values_only=True):
+                    if is_header_row([str(x).lower() for x in _convert_row(row)]):
+                        sheet_names.append(ws.title)
                         break
-                if header_row: break
-            if not header_row: continue
-
-            subject_col_map = {}
-            for col in range(1, ws.max_column + 1):
-                val = ws.cell(row=header_row, column=col).value
-                val_below = ws.cell(row=header_row + 1, column=col).value
-                if val_below: subject_col_map[str(val_below).strip()] = col
-                elif val: subject_col_map[str(val).strip()] = col
-
-            reg_row_map = {}
-            for row in range(header_row + 1, ws.max_row + 1):
-                val = ws.cell(row=row, column=reg_col_idx).value 
-                if val: reg_row_map[str(val).strip()] = row
-            
-            if sheet_name in pending_changes:
-                for reg_no, changes in pending_changes[sheet_name].items():
-                    if reg_no in reg_row_map:
-                        row_idx = reg_row_map[reg_no]
-                        for subject, new_val in changes.items():
-                            if subject in subject_col_map:
-                                ws.cell(row=row_idx, column=subject_col_map[subject]).value = new_val
-
-            if sheet_name in pending_deletes:
-                rows_to_del = [reg_row_map[r] for r in pending_deletes[sheet_name] if r in reg_row_map]
-                for r_idx in sorted(rows_to_del, reverse=True):
-                    ws.delete_rows(r_idx)
-
-        wb.save(file_path)
+            return sheet_names
+        finally:
+            wb.close()
+    except Exception as e:
+        return None
+
+def load_sheet_data(file_path, sheet_name):
+    """Loads and processes one sheet. Returns (df, subject_cols, subject_credits), or None if it holds no results."""
+    try:
+        if _can_stream(file_path):
+            fingerprint = file_fingerprint(file_path)
+            wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+            try:
+                df = _stream_sheet_frame(wb[sheet_name], fingerprint)
+            finally:
+                wb.close()
+        else:
+            raw_df = pd.read_excel(file_path, sheet_name=sheet_name, header=None, dtype=object)
+            header_row_idx = find_header_row(raw_df)
+            df = frame_from_raw(raw_df, header_row_idx) if header_row_idx != -1 else None
+
+        if df is None: return None
+        return process_sheet(df)
+    except Exception as e:
+        return None
+
+def frame_layouts(all_sheets_data):
+    """{sheet: SheetLayout} of the frames that were loaded with one."""
+    return {sheet_name: df.attrs['layout'] for sheet_name, df in all_sheets_data.items() if 'layout' in df.attrs}
+
+def _can_compact(ws):
+    # delete_sheet_rows works on openpyxl internals (checked against openpyxl 3.1, as pinned in requirements)
+    return isinstance(getattr(ws, "_cells", None), dict) and hasattr(ws, "_current_row") and hasattr(Cell, "_value")
+
+def delete_sheet_rows(ws, rows):
+    """Deletes Excel rows from a worksheet in one pass.
+
+    ws.delete_rows moves every cell below the deleted row, so deleting rows one at a time costs
+    O(deletions x cells). This renumbers each surviving cell once, carrying its style along, and
+    brings the sheet's row heights, merged ranges and same-sheet formula references in step.
+    With an openpyxl whose internals differ it falls back to ws.delete_rows, bottom row first."""
+    deleted = sorted(set(rows))
+    if not deleted: return
+    if not _can_compact(ws):
+        for r in reversed(deleted):
+            ws.delete_rows(r)
+        return
+    gone = set(deleted)
+    first = deleted[0]
+
+    def new_row(r):
+        return r - bisect.bisect_left(deleted, r)
+
+    merged = [(rng.min_row, rng.min_col, rng.max_row, rng.max_col) for rng in ws.merged_cells.ranges]
+    for rng in list(ws.merged_cells.ranges):
+        ws.merged_cells.remove(rng)
+
+    cells = {}
+    for (r, c), cell in ws._cells.items():
+        if r in gone: continue
+        if r > first:
+            r = new_row(r)
+            cell.row = r
+            if cell.hyperlink is not None:
+                cell.hyperlink.ref = cell.coordinate
+        if cell.data_type == 'f' and isinstance(cell.value, str):
+            cell._value = xlsx_patch.shift_formula(cell.value, deleted, ws.title)
+        cells[r, c] = cell
+    ws._cells = cells
+
+    dimensions = {r: dim for r, dim in ws.row_dimensions.items() if r not in gone}
+    ws.row_dimensions.clear()
+    for r, dim in dimensions.items():
+        dim.index = new_row(r)
+        ws.row_dimensions[dim.index] = dim
+
+    for min_row, min_col, max_row, max_col in merged:
+        # Keep whatever is left of each merged range
+        top = new_row(min_row)
+        bottom = max_row - bisect.bisect_right(deleted, max_row)
+        if top > bottom: continue
+        if isinstance(ws._cells.get((top, min_col)), MergedCell):
+            # Its top-left cell was deleted; the cell that takes its place must hold a value
+            ws._cells[top, min_col] = Cell(ws, row=top, column=min_col)
+        if top < bottom or min_col < max_col:
+            ws.merge_cells(start_row=top, start_column=min_col, end_row=bottom, end_column=max_col)
+    ws._current_row = ws.max_row if ws._cells else 0
+
+def merge_pending(pending_changes, pending_deletes, newer_changes, newer_deletes):
+    """One change set from two, the newer one's grades winning where both set the same cell:
+    (pending_changes, pending_deletes) as save_changes_to_excel takes them. The inputs are left as they are."""
+    changes = {sheet: {reg: dict(subs) for reg, subs in students.items()} for sheet, students in pending_changes.items()}
+    for sheet_name, students in newer_changes.items():
+        for reg_no, subjects in students.items():
+            changes.setdefault(sheet_name, {}).setdefault(reg_no, {}).update(subjects)
+    deletes = {sheet: list(regs) for sheet, regs in pending_deletes.items()}
+    for sheet_name, regs in newer_deletes.items():
+        deletes.setdefault(sheet_name, []).extend(regs)
+    return changes, deletes
+
+def _cell_edits(layout, sheet_changes):
+    """{(row, col): value} for a sheet's pending changes, at the cells its layout places them in."""
+    edits = {}
+    for reg_no, changes in sheet_changes.items():
+        row_idx = layout.row_of(reg_no)
+        if row_idx is not None:
+            for subject, new_val in changes.items():
+                if subject in layout.subject_cols:
+                    edits[row_idx, layout.subject_cols[subject]] = new_val
+    return edits
+
+def _patch_save(file_path, fingerprint, affected_sheets, pending_changes, pending_deletes, layouts):
+    """Saves by patching only the affected sheets' XML inside the file (see xlsx_patch). Returns the
+    deleted Excel rows per sheet, or None if the file needs a full openpyxl save (nothing is written then)."""
+    stale = [s for s in affected_sheets if s not in layouts or not layouts[s].matches(fingerprint)]
+    if stale:
+        # Record afresh the layouts of sheets changed since they were loaded, reading just those sheets
+        wb = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            for sheet_name in stale:
+                if sheet_name not in wb.sheetnames: continue
+                ws = wb[sheet_name]
+                ws.reset_dimensions()
+                layout = SheetLayout.scan(ws, fingerprint)
+                if layout is not None:
+                    layouts[sheet_name] = layout
+        finally:
+            wb.close()
+
+    edits, deleted_rows = {}, {}
+    for sheet_name in affected_sheets:
+        layout = layouts.get(sheet_name)
+        if layout is None or not layout.matches(fingerprint): continue
+        edits[sheet_name] = _cell_edits(layout, pending_changes.get(sheet_name, {}))
+        if sheet_name in pending_deletes:
+            deleted_rows[sheet_name] = {layout.row_of(r) for r in pending_deletes[sheet_name]} - {None}
+    if not xlsx_patch.patch_workbook(file_path, edits, deleted_rows):
+        return None
+    return deleted_rows
+
+def save_changes_to_excel(file_path, pending_changes, pending_deletes, layouts=None, patch=True):
+    """Saves pending changes to the Excel file.
+
+    layouts ({sheet: SheetLayout}, e.g. from frame_layouts) lets the save look rows and columns up
+    instead of scanning each sheet; a sheet whose layout no longer matches the file is scanned.
+    After a successful save the given layouts are updated to describe the saved file.
+
+    With patch, only the edited sheets are rewritten and the rest of the file is copied as it is;
+    workbooks the patcher can't handle (and patch=False) go through a full openpyxl load and save.
+    Either way the new file replaces the old one in a single rename."""
+    layouts = layouts if layouts is not None else {}
+    try:
+        fingerprint = file_fingerprint(file_path)
+        affected_sheets = set(pending_changes.keys()).union(set(pending_deletes.keys()))
+        deleted_rows = None
+        if patch:
+            deleted_rows = _patch_save(file_path, fingerprint, affected_sheets, pending_changes, pending_deletes, layouts)
+
+        if deleted_rows is None:
+            deleted_rows = {}
+            wb = openpyxl.load_workbook(file_path)
+            for sheet_name in affected_sheets:
+                if sheet_name not in wb.sheetnames: continue
+                ws = wb[sheet_name]
+
+                layout = layouts.get(sheet_name)
+                if layout is None or not layout.matches(fingerprint):
+                    # Changed since it was loaded (or loaded without a layout): record the layout afresh
+                    layout = SheetLayout.scan(ws, fingerprint)
+                    if layout is None: continue
+                    layouts[sheet_name] = layout
+
+                if sheet_name in pending_changes:
+                    for (row_idx, col_idx), new_val in _cell_edits(layout, pending_changes[sheet_name]).items():
+                        ws.cell(row=row_idx, column=col_idx).value = new_val
+
+                if sheet_name in pending_deletes:
+                    rows_to_del = {layout.row_of(r) for r in pending_deletes[sheet_name]} - {None}
+                    delete_sheet_rows(ws, rows_to_del)
+                    deleted_rows[sheet_name] = rows_to_del
+
+            # Write beside the file and swap it in, so a failed or interrupted save leaves the workbook intact
+            temp_path = f"{file_path}.{os.getpid()}.saving"
+            try:
+                wb.save(temp_path)
+                shutil.copymode(file_path, temp_path)
+                os.replace(temp_path, file_path)
+            finally:
+                if os.path.exists(temp_path): os.remove(temp_path)
+        # Every sheet keeps its cells where they were except for the deleted rows
+        saved = file_fingerprint(file_path)
+        for sheet_name, layout in layouts.items():
+            if layout.matches(fingerprint):
+                layout.rows_deleted(deleted_rows.get(sheet_name), saved)
         return True, "Changes saved successfully!"
     except PermissionError:
         return False, "Please close the Excel file and try again!"
@@ -0,0 +1,186 @@
+import os
+import time
+import sqlite3
+import threading
+import pandas as pd
+import search_index
+import workbook_cache
+
+# SQLite directory of every student in the intake workbooks, so a student can be found without
+# knowing their intake and without parsing any Excel file at query time.
+DB_PATH = os.path.join(workbook_cache.user_cache_dir(), "students.sqlite3")
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xls')
+# Seconds between the background indexer's passes over the sheets directory
+REFRESH_INTERVAL = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS students (
+    file TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    reg TEXT,
+    reg_key TEXT,
+    name TEXT,
+    name_key TEXT
+);
+CREATE INDEX IF NOT EXISTS students_reg ON students (reg_key);
+CREATE INDEX IF NOT EXISTS students_name ON students (name_key);
+CREATE INDEX IF NOT EXISTS students_file ON students (file);
+"""
+
+_refresh_lock = threading.Lock()  # held by refresh() for a whole pass; never taken on a request
+_indexers = {}  # (sheets_dir, db_path) -> its BackgroundIndexer
+_indexers_lock = threading.Lock()
+_created = set()  # databases whose schema this process has set up
+_created_lock = threading.Lock()
+
+def _create(db_path):
+    # Run once per database and process, when it is first opened: the schema, and WAL (which is
+    # stored in the database file) so searches read while the indexer writes
+    os.makedirs(os.path.dirname(db_path) or ".", mode=0o700, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+    finally:
+        conn.close()
+
+def _connect(db_path):
+    if db_path not in _created:
+        with _created_lock:
+            if db_path not in _created:
+                _create(db_path)
+                _created.add(db_path)
+    return sqlite3.connect(db_path, timeout=30)
+
+def _workbook_rows(file_name, file_path):
+    """(file, sheet, row, reg, reg_key, name, name_key) for every student in a workbook."""
+    # Through the shared workbook cache, so the app and the indexer parse a workbook only once
+    data, _, _ = workbook_cache.load_workbook_data(file_path)
+    for sheet_name, df in (data or {}).items():
+        regs = df['Registration Number']
+        if isinstance(regs, pd.DataFrame):
+            regs = regs.iloc[:, 0]
+        name_col = search_index.find_name_column(df)
+        names = df[name_col] if name_col else pd.Series(None, index=df.index, dtype=object)
+        if isinstance(names, pd.DataFrame):
+            names = names.iloc[:, 0]
+
+        for idx, reg, name in zip(df.index, regs, names):
+            if pd.isna(reg): continue
+            name = str(name) if pd.notna(name) else None
+            yield (file_name, sheet_name, int(idx), str(reg), search_index.normalize_reg(reg),
+                   name, search_index.normalize_name(name) if name else None)
+
+def refresh(sheets_dir, db_path=None):
+    """Brings the index up to date with the workbooks in sheets_dir; only files whose size or
+    mtime changed are re-read. Returns the number of workbooks re-indexed."""
+    db_path = db_path or DB_PATH
+    with _refresh_lock:
+        conn = _connect(db_path)
+        try:
+            known = {path: (size, mtime) for path, size, mtime in conn.execute("SELECT path, size, mtime_ns FROM files")}
+            present = set()
+            reindexed = 0
+            for file_name in sorted(os.listdir(sheets_dir)):
+                if not file_name.endswith(WORKBOOK_EXTENSIONS): continue
+                file_path = os.path.join(sheets_dir, file_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                present.add(file_name)
+                if known.get(file_name) == (stat.st_size, stat.st_mtime_ns): continue
+
+                rows = list(_workbook_rows(file_name, file_path))
+                with conn:
+                    conn.execute("DELETE FROM students WHERE file = ?", (file_name,))
+                    conn.executemany("INSERT INTO students VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                    conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                                 (file_name, stat.st_size, stat.st_mtime_ns, time.time()))
+                reindexed += 1
+
+            with conn:
+                for file_name in set(known) - present:
+                    conn.execute("DELETE FROM students WHERE file = ?", (file_name,))
+                    conn.execute("DELETE FROM files WHERE path = ?", (file_name,))
+            return reindexed
+        finally:
+            conn.close()
+
+class BackgroundIndexer:
+    """Daemon thread that keeps the index in step with a sheets directory, running refresh() every
+    interval seconds. indexed is set once its first pass has finished."""
+
+    def __init__(self, sheets_dir, db_path=None, interval=REFRESH_INTERVAL):
+        self.sheets_dir = sheets_dir
+        self.db_path = db_path or DB_PATH
+        self.interval = interval
+        self.indexed = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                refresh(self.sheets_dir, self.db_path)
+            except Exception:
+                pass  # a failed pass is retried on the next one
+            self.indexed.set()
+            time.sleep(self.interval)
+
+def start_indexer(sheets_dir, db_path=None):
+    """The process-wide BackgroundIndexer of sheets_dir, started on first use. Cheap enough to
+    call on every rerun: it never waits for a pass in progress."""
+    db_path = db_path or DB_PATH
+    key = (os.path.abspath(sheets_dir), db_path)
+    with _indexers_lock:
+        indexer = _indexers.get(key)
+        if indexer is None:
+            indexer = _indexers[key] = BackgroundIndexer(sheets_dir, db_path)
+        return indexer
+
+def _key_range(key):
+    # Every string starting with key sorts in [key, key + U+FFFF), so prefix lookups use the index
+    return key, key + '\uffff'
+
+def search(term, limit=50, db_path=None):
+    """[(file, sheet, row, reg, name)] of students whose registration number or name matches term.
+    Exact registration numbers come first, then registration number and name prefixes; only when
+    none of those match are registration numbers and names searched for the term anywhere."""
+    db_path = db_path or DB_PATH
+    reg_key = search_index.normalize_reg(term)
+    name_key = search_index.normalize_name(term)
+    if not reg_key:
+        return []
+
+    prefix_queries = ["SELECT file, sheet, row, reg, name, CASE WHEN reg_key = ? THEN 0 ELSE 1 END AS rank "
+                      "FROM students WHERE reg_key >= ? AND reg_key < ?"]
+    params = [reg_key, *_key_range(reg_key)]
+    if name_key:
+        prefix_queries.append("SELECT file, sheet, row, reg, name, 2 AS rank FROM students WHERE name_key >= ? AND name_key < ?")
+        params.extend(_key_range(name_key))
+
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT file, sheet, row, reg, name FROM (" + " UNION ALL ".join(prefix_queries) + ") "
+            "GROUP BY file, sheet, row ORDER BY MIN(rank), file, sheet, row LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        if not rows:
+            rows = conn.execute(
+                "SELECT file, sheet, row, reg, name FROM students "
+                "WHERE instr(reg_key, ?) > 0 OR instr(name_key, ?) > 0 "
+                "ORDER BY file, sheet, row LIMIT ?",
+                (reg_key, name_key or reg_key, limit)
+            ).fetchall()
+        return rows
+    finally:
+        conn.close()
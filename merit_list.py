@@ -0,0 +1,185 @@
+import html
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import grade_logic
+import search_index
+
+MERIT_COLUMNS = ['Intake', 'Batch', 'Registration Number', 'Name', 'GPA', 'Total Credits', 'Class']
+
+def batch_entries(df, totals, batch, intake=""):
+    """One merit list row per student of a sheet, read from its GpaAccumulator (rows without a
+    registration number are left out)."""
+    regs = df['Registration Number']
+    if isinstance(regs, pd.DataFrame):
+        regs = regs.iloc[:, 0]
+    name_col = search_index.find_name_column(df)
+    names = df[name_col] if name_col else pd.Series("-", index=df.index)
+    if isinstance(names, pd.DataFrame):
+        names = names.iloc[:, 0]
+
+    keep = regs.notna().to_numpy()
+    return pd.DataFrame({
+        'Intake': intake,
+        'Batch': batch,
+        'Registration Number': regs.astype(str).to_numpy()[keep],
+        'Name': names.astype(object).where(names.notna(), "-").astype(str).to_numpy()[keep],
+        'GPA': totals.gpa[keep],
+        'Total Credits': totals.total_credits[keep],
+        'Class': np.array(grade_logic.CLASS_NAMES, dtype=object)[totals.class_codes[keep]],
+    }, columns=MERIT_COLUMNS)
+
+class MeritList:
+    """Students ranked by GPA, ties broken by total credits (more credits ranks higher).
+
+    top(k) selects with a partial partition, so a top-N list never sorts the whole cohort. The
+    GPA and credit keys are sorted once, on the first rank lookup; after that rank() and
+    percentile() are binary searches. Equal GPA and credits share a rank (1, 2, 2, 4)."""
+
+    def __init__(self, entries):
+        self.entries = entries.reset_index(drop=True)
+        self.gpa = self.entries['GPA'].to_numpy(dtype=float)
+        self.credits = self.entries['Total Credits'].to_numpy(dtype=float)
+        self._sorted = None  # (gpa, credits) ascending by GPA then credits, built on demand
+
+    def __len__(self):
+        return len(self.gpa)
+
+    def top(self, k, include_ties=True):
+        """The best k students as a DataFrame with a leading 'Rank' column, best first. With
+        include_ties, students tied with the k-th are listed too, so nobody is cut from a shared place."""
+        n = len(self.gpa)
+        k = min(k, n)
+        if k <= 0:
+            return self._ranked(np.arange(0))
+        if k < n:
+            # Every student level with the k-th best GPA is a candidate; credits then decide among them
+            threshold = np.partition(self.gpa, n - k)[n - k]
+            candidates = np.flatnonzero(self.gpa >= threshold)
+        else:
+            candidates = np.arange(n)
+        # np.lexsort sorts by its last key first; sheet order breaks remaining ties
+        order = candidates[np.lexsort((candidates, -self.credits[candidates], -self.gpa[candidates]))]
+        cut = k
+        if include_ties:
+            last = order[k - 1]
+            while cut < len(order) and self.gpa[order[cut]] == self.gpa[last] and self.credits[order[cut]] == self.credits[last]:
+                cut += 1
+        return self._ranked(order[:cut])
+
+    def _ranked(self, order):
+        ranked = self.entries.iloc[order].reset_index(drop=True)
+        gpa, credits = self.gpa[order], self.credits[order]
+        # Competition ranking within the list, which starts at the top of the cohort
+        new_place = np.ones(len(order), dtype=bool)
+        new_place[1:] = (gpa[1:] != gpa[:-1]) | (credits[1:] != credits[:-1])
+        places = np.arange(1, len(order) + 1)
+        ranked.insert(0, 'Rank', np.maximum.accumulate(np.where(new_place, places, 0)) if len(order) else places)
+        return ranked
+
+    def _keys(self):
+        if self._sorted is None:
+            order = np.lexsort((self.credits, self.gpa))
+            self._sorted = (self.gpa[order], self.credits[order])
+        return self._sorted
+
+    def _counts(self, gpa, credits):
+        # (students ranked below, students ranked level) for a GPA and credit total
+        gpas, credits_sorted = self._keys()
+        lo = np.searchsorted(gpas, gpa, side="left")
+        hi = np.searchsorted(gpas, gpa, side="right")
+        ties = credits_sorted[lo:hi]
+        below = lo + np.searchsorted(ties, credits, side="left")
+        level = np.searchsorted(ties, credits, side="right") - (below - lo)
+        return int(below), int(level)
+
+    def rank(self, gpa, credits):
+        """Rank a student with this GPA and credit total holds (1 = best)."""
+        below, level = self._counts(gpa, credits)
+        return len(self.gpa) - below - level + 1
+
+    def percentile(self, gpa, credits):
+        """Percentage of the cohort ranked below a student with this GPA and credit total."""
+        if not len(self.gpa):
+            return 0.0
+        below, _ = self._counts(gpa, credits)
+        return 100.0 * below / len(self.gpa)
+
+    def rank_of(self, pos):
+        """(rank, percentile) of the student in row pos of the entries."""
+        return self.rank(self.gpa[pos], self.credits[pos]), self.percentile(self.gpa[pos], self.credits[pos])
+
+    def find(self, reg):
+        """Row positions of a registration number in the entries."""
+        key = search_index.normalize_reg(reg)
+        return np.flatnonzero(self.entries['Registration Number'].str.strip().str.lower().to_numpy() == key)
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + int(self.entries.memory_usage(index=True, deep=True).sum()) + self.gpa.nbytes + self.credits.nbytes
+
+def format_gpa(gpa):
+    return f"{gpa:.2f}"
+
+def to_html(ranked, title, scope, gpa_text=format_gpa):
+    """Printable merit list page (same layout as the subject results print-out); opens the print dialog."""
+    date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    show_intake = ranked['Intake'].nunique() > 1
+    show_batch = show_intake or ranked['Batch'].nunique() > 1
+    table_rows = ""
+    cell = "<td style='padding:8px;border-bottom:1px solid #ddd;{}'>{}</td>"
+    for rank, intake, batch, reg, name, gpa, credits, cls in ranked[['Rank'] + MERIT_COLUMNS].itertuples(index=False, name=None):
+        table_rows += "<tr>" + cell.format("text-align:center;", f"<b>{rank}</b>")
+        if show_intake: table_rows += cell.format("", html.escape(str(intake)))
+        if show_batch: table_rows += cell.format("", html.escape(str(batch)))
+        table_rows += (
+            cell.format("text-align:center;", html.escape(reg))
+            + cell.format("", html.escape(name))
+            + cell.format("text-align:center;", f"<b>{gpa_text(gpa)}</b>")
+            + cell.format("text-align:center;", f"{credits:g}")
+            + cell.format("", cls)
+            + "</tr>"
+        )
+    headings = "<th width='7%'>Rank</th>"
+    if show_intake: headings += "<th>Intake</th>"
+    if show_batch: headings += "<th>Batch</th>"
+    headings += "<th>Registration No</th><th>Name</th><th>GPA</th><th>Credits</th><th>Class</th>"
+    return f"""
+    <html>
+    <head>
+        <title>{html.escape(title)}</title>
+        <style>
+            body {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 40px; color: #333; }}
+            h1,h2 {{ text-align: center; margin-bottom: 5px; }}
+            .meta {{ text-align: center; margin-bottom: 25px; color:#666; }}
+            table {{ width: 100%; border-collapse: collapse; }}
+            th {{ background-color: #f2f2f2; padding: 12px; border-bottom: 2px solid #aaa; }}
+            td {{ font-size: 14px; }}
+            .page-footer {{ text-align: center; font-size: 12px; color: #888; padding: 10px 0; border-top: 1px solid #eee; margin-top:30px; }}
+            @media print {{
+                thead {{ display: table-header-group; }}
+                tfoot {{ display: table-footer-group; }}
+                tr {{ page-break-inside: avoid; }}
+            }}
+        </style>
+    </head>
+    <body>
+        <h2>SAB Campus of Chartered Accountants Sri Lanka </h2>
+        <h1>{html.escape(title)}</h1>
+        <div class="meta">
+            <div><b>Scope:</b> {html.escape(scope)}</div>
+            <div><b>Ranked by:</b> GPA, then total credits</div>
+            <div><b>Generated:</b> {date_str}</div>
+        </div>
+        <table>
+            <thead>
+                <tr>{headings}</tr>
+            </thead>
+            <tbody>
+                {table_rows}
+            </tbody>
+        </table>
+        <div class="page-footer">Generated by Student Result System</div>
+        <script>window.print();</script>
+    </body>
+    </html>
+    """
@@ -0,0 +1,158 @@
+import os
+import threading
+import pandas as pd
+import grade_logic
+import edit_journal
+
+# One save coordinator per workbook for the whole process, shared by every Streamlit session.
+# Saves of a workbook run one write at a time. Sessions that ask to save while a write is in
+# progress queue up, and the next write saves all of them together: one load, one write of the
+# workbook and one journal checkpoint, however many sessions were waiting. Each session's save
+# covers only its own journaled edits, leaving other sessions' edits pending in the journal for
+# them to save. Before writing, every cell a session changes is compared with the workbook as it is
+# now (and with what sessions ahead of it in the same write are saving): a cell another session has
+# saved a different grade into since this session read it is a conflict, and that session's save
+# stops so the user can decide instead of silently overwriting it. The others still go ahead.
+
+class _SaveRequest:
+    def __init__(self, session, frames_for, overwrite):
+        self.session = session
+        self.frames_for = frames_for
+        self.overwrite = overwrite
+        self.result = None  # (ok, message) once a write has handled it
+
+class SaveCoordinator:
+    """Merges the saves of one workbook across sessions into as few writes as possible and catches
+    edits that would overwrite theirs."""
+
+    def __init__(self, file_path, journal_dir=edit_journal.JOURNAL_DIR):
+        self.file_path = file_path
+        self.journal = edit_journal.journal_for(file_path, journal_dir)
+        self.writes = 0  # Writes of the file (one per batch of queued saves)
+        self._lock = threading.Lock()  # Held for the whole of a write
+        self._queue = []  # _SaveRequests waiting for the next write
+        self._queue_lock = threading.Lock()
+        self._conflicts = {}  # session -> conflicts that stopped its last save
+        self._conflicts_lock = threading.Lock()
+
+    def save(self, session, frames_for, overwrite=False):
+        """Writes session's journaled edits to the workbook and checkpoints them out of the journal.
+
+        frames_for(sheet_names) gives the current frames ({sheet: df}, loaded with their SheetLayouts)
+        of the affected sheets. When an edit would overwrite a grade saved since the session read the
+        cell, nothing is written unless overwrite is set; the conflicts are handed to the session
+        through take_conflicts(). Returns (ok, message).
+
+        If another save is writing, this one waits and is written together with every other save
+        queued behind it."""
+        request = _SaveRequest(session, frames_for, overwrite)
+        with self._queue_lock:
+            self._queue.append(request)
+        with self._lock:
+            if request.result is None:
+                # Nobody has taken this save along yet: write it and everything queued with it
+                with self._queue_lock:
+                    batch, self._queue = self._queue, []
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    # Sessions riding along on this write must not wait for a result that never comes
+                    for queued in batch:
+                        if queued.result is None:
+                            queued.result = (False, f"Save failed: {str(e)}")
+        return request.result
+
+    def _write(self, batch):
+        # A session that queued more than once is saved once, overwriting if any of its requests said so
+        by_session = {}
+        for request in batch:
+            by_session.setdefault(request.session, []).append(request)
+        pending, mark = self.journal.snapshots(by_session)
+
+        frames = {}
+        for requests in by_session.values():
+            pending_changes, pending_deletes, _ = pending[requests[0].session]
+            affected = set(pending_changes) | set(pending_deletes)
+            if affected - set(frames):
+                frames.update(requests[0].frames_for(affected - set(frames)))
+
+        # Sessions are checked in the order they asked to save; each one's edits count as saved for
+        # the sessions after it, just as if they had been written one by one
+        changes, deletes, written, saving = {}, {}, {}, []
+        results = {}
+        for session, requests in by_session.items():
+            pending_changes, pending_deletes, base = pending[session]
+            if not pending_changes and not pending_deletes:
+                results[session] = (True, "No changes to save.")
+                continue
+            overwrite = any(request.overwrite for request in requests)
+            conflicts = [] if overwrite else find_conflicts(frames, pending_changes, base, written)
+            with self._conflicts_lock:
+                self._conflicts[session] = conflicts
+            if conflicts:
+                results[session] = (False, f"{len(conflicts)} edited result(s) were changed by another session since you opened them.")
+                continue
+            changes, deletes = grade_logic.merge_pending(changes, deletes, pending_changes, pending_deletes)
+            for sheet_name, students in pending_changes.items():
+                for reg_no, subjects in students.items():
+                    for subject, value in subjects.items():
+                        written[sheet_name, reg_no, subject] = value
+            saving.append(session)
+
+        if saving:
+            ok, message = grade_logic.save_changes_to_excel(
+                self.file_path, changes, deletes, grade_logic.frame_layouts(frames)
+            )
+            if ok:
+                self.journal.checkpoint_sessions(mark, saving)
+                self.writes += 1
+            for session in saving:
+                results[session] = (ok, message)
+        for session, requests in by_session.items():
+            for request in requests:
+                request.result = results[session]
+
+    def take_conflicts(self, session):
+        """Conflicts that stopped this session's last save (empty once it saved)."""
+        with self._conflicts_lock:
+            return self._conflicts.pop(session, [])
+
+def find_conflicts(frames, pending_changes, base, written=None):
+    """Edits whose cell now holds a grade other than the one it had when it was edited (base) and other
+    than the edit's own. Each is a dict with the sheet, reg, subject and the "was", "saved" (grade in
+    the workbook now) and "yours" values; cells whose sheet, row or subject is gone are left to the save.
+    written ({(sheet, reg, subject): value}) holds grades saved into the same write ahead of these edits;
+    they count as the workbook's."""
+    conflicts = []
+    for (sheet_name, reg_no, subject), was in base.items():
+        yours = pending_changes.get(sheet_name, {}).get(reg_no, {}).get(subject)
+        if written and (sheet_name, reg_no, subject) in written:
+            saved = grade_logic.normalize_grade(written[sheet_name, reg_no, subject])
+            if saved not in (grade_logic.normalize_grade(was), grade_logic.normalize_grade(yours)):
+                conflicts.append({"sheet": sheet_name, "reg": reg_no, "subject": subject,
+                                  "was": was, "saved": saved or "", "yours": yours})
+            continue
+        df = frames.get(sheet_name)
+        if df is None or subject not in df.columns: continue
+        rows = df.index[df['Registration Number'] == reg_no]
+        if not len(rows): continue
+        col = df[subject]
+        if isinstance(col, pd.DataFrame):
+            col = col.iloc[:, 0]
+        saved = grade_logic.normalize_grade(col.loc[rows[0]])
+        if saved not in (grade_logic.normalize_grade(was), grade_logic.normalize_grade(yours)):
+            conflicts.append({"sheet": sheet_name, "reg": reg_no, "subject": subject,
+                              "was": was, "saved": saved or "", "yours": yours})
+    return conflicts
+
+_coordinators = {}
+_coordinators_lock = threading.Lock()
+
+def coordinator_for(file_path, journal_dir=edit_journal.JOURNAL_DIR):
+    """The process-wide save coordinator of a workbook."""
+    key = (os.path.abspath(file_path), journal_dir)
+    with _coordinators_lock:
+        coordinator = _coordinators.get(key)
+        if coordinator is None:
+            coordinator = _coordinators[key] = SaveCoordinator(file_path, journal_dir)
+        return coordinator
@@ -0,0 +1,259 @@
+import re
+import sys
+import bisect
+import numpy as np
+import pandas as pd
+
+NGRAM = 3
+
+def normalize_reg(value):
+    """Key used for registration number lookups (case and surrounding spaces ignored)."""
+    return str(value).strip().lower()
+
+def _reg_column(df):
+    col = df['Registration Number']
+    # A sheet can end up with two 'Registration Number' columns; the first one is the real one
+    return col.iloc[:, 0] if isinstance(col, pd.DataFrame) else col
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+class RegistrationIndex:
+    """Registration number -> (sheet, row) lookups across the sheets of a workbook.
+
+    Built once per load; exact lookups are a dict hit, prefix lookups bisect a sorted key
+    array and substring lookups intersect trigram postings before checking candidates."""
+
+    def __init__(self, all_sheets_data):
+        self.sheet_order = {}
+        self.locations = {}
+        for sheet_name, df in all_sheets_data.items():
+            self._add_sheet(sheet_name, df)
+        self._build_keys()
+
+    def _add_sheet(self, sheet_name, df):
+        self.sheet_order.setdefault(sheet_name, len(self.sheet_order))
+        regs = _reg_column(df)
+        regs = regs[regs.notna()]
+        keys = regs.astype(str).str.strip().str.lower()
+        for idx, key in zip(keys.index, keys):
+            self.locations.setdefault(key, []).append((sheet_name, idx))
+
+    def _build_keys(self):
+        self.keys = sorted(self.locations)
+        self.ngrams = {}
+        for key in self.keys:
+            for gram in _ngrams(key):
+                self.ngrams.setdefault(gram, []).append(key)
+
+    def update_sheet(self, sheet_name, df):
+        """Re-indexes one sheet, e.g. after students were deleted from it."""
+        for key in list(self.locations):
+            locs = [loc for loc in self.locations[key] if loc[0] != sheet_name]
+            if locs:
+                self.locations[key] = locs
+            else:
+                del self.locations[key]
+        if df is not None:
+            self._add_sheet(sheet_name, df)
+        self._build_keys()
+
+    def _collect(self, keys):
+        results = [loc for key in keys for loc in self.locations[key]]
+        # Same order as scanning the sheets top to bottom
+        results.sort(key=lambda loc: (self.sheet_order[loc[0]], loc[1]))
+        return results
+
+    def exact(self, reg):
+        """[(sheet, row)] of every entry with this registration number."""
+        key = normalize_reg(reg)
+        return self._collect([key] if key in self.locations else [])
+
+    def prefix(self, term):
+        """[(sheet, row)] of every registration number starting with term."""
+        term = normalize_reg(term)
+        lo = bisect.bisect_left(self.keys, term)
+        hi = bisect.bisect_left(self.keys, term + '\uffff')
+        return self._collect(self.keys[lo:hi])
+
+    def contains(self, term):
+        """[(sheet, row)] of every registration number containing term."""
+        term = normalize_reg(term)
+        if len(term) < NGRAM:
+            candidates = self.keys
+        else:
+            postings = sorted((self.ngrams.get(gram, []) for gram in _ngrams(term)), key=len)
+            if not postings[0]:
+                return []
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates: return []
+        return self._collect([key for key in candidates if term in key])
+
+    def __sizeof__(self):
+        size = sys.getsizeof(self.locations) + sys.getsizeof(self.keys) + sys.getsizeof(self.ngrams)
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self.locations.items())
+        size += sum(sys.getsizeof(v) for v in self.ngrams.values())
+        return size
+
+def normalize_name(value):
+    """Lower-cased name with punctuation and repeated spaces removed."""
+    return " ".join(re.sub(r'[^0-9a-z]+', ' ', str(value).lower()).split())
+
+def name_trigrams(name):
+    """Trigrams of each word padded with two leading spaces and one trailing space (as pg_trgm does)."""
+    grams = set()
+    for word in normalize_name(name).split():
+        padded = "  " + word + " "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def find_name_column(df):
+    return next((c for c in df.columns if "name" in str(c).lower()), None)
+
+class NameIndex:
+    """Fuzzy student name search across the sheets of a workbook.
+
+    A trigram inverted index over each sheet's name column; matches are ranked by trigram
+    similarity (shared / total distinct trigrams), so misspelt names still score well."""
+
+    def __init__(self, all_sheets_data):
+        self.sheets = {}
+        for sheet_name, df in all_sheets_data.items():
+            self.update_sheet(sheet_name, df)
+
+    def update_sheet(self, sheet_name, df):
+        """(Re-)indexes one sheet's names, e.g. after students were deleted from it."""
+        self.sheets.pop(sheet_name, None)
+        name_col = find_name_column(df) if df is not None else None
+        if name_col is None: return
+        names = df[name_col]
+        if isinstance(names, pd.DataFrame):
+            names = names.iloc[:, 0]
+
+        rows = []
+        gram_count = []
+        postings = {}
+        for idx, name in names[names.notna()].items():
+            grams = name_trigrams(name)
+            if not grams: continue
+            for gram in grams:
+                postings.setdefault(gram, []).append(len(rows))
+            rows.append(idx)
+            gram_count.append(len(grams))
+        self.sheets[sheet_name] = (
+            rows,
+            np.array(gram_count, dtype=np.int32),
+            {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()},
+        )
+
+    def search(self, query, k=10, min_score=0.3):
+        """Top k [(sheet, row, score)] for a name query, best first."""
+        grams = name_trigrams(query)
+        if not grams:
+            return []
+        matches = []
+        for order, (sheet_name, (rows, gram_count, postings)) in enumerate(self.sheets.items()):
+            hits = [postings[g] for g in grams if g in postings]
+            if not hits: continue
+            shared = np.bincount(np.concatenate(hits), minlength=len(rows))
+            scores = shared / (len(grams) + gram_count - shared)
+            candidates = np.flatnonzero(scores >= min_score)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            matches.extend((-float(scores[i]), order, int(i), sheet_name, rows[i]) for i in candidates)
+
+        # Best score first; ties keep sheet and row order
+        matches.sort()
+        return [(sheet_name, row, -neg_score) for neg_score, _, _, sheet_name, row in matches[:k]]
+
+    def __sizeof__(self):
+        size = sys.getsizeof(self.sheets)
+        for rows, gram_count, postings in self.sheets.values():
+            size += sys.getsizeof(rows) + gram_count.nbytes
+            size += sum(sys.getsizeof(g) + a.nbytes for g, a in postings.items())
+        return size
+
+class DuplicateMap:
+    """Registration numbers found on more than one row, within a sheet or across the sheets of a workbook.
+
+    Found at load in one grouped pass over every sheet's registration numbers; lookups and the
+    data-quality report then read the groups without scanning the sheets again."""
+
+    def __init__(self, all_sheets_data):
+        self.rows = {}  # sheet -> frame of its rows that have a registration number
+        for sheet_name, df in all_sheets_data.items():
+            self._add_sheet(sheet_name, df)
+        self._group()
+
+    def _add_sheet(self, sheet_name, df):
+        regs = _reg_column(df)
+        regs = regs[regs.notna()]
+        name_col = find_name_column(df)
+        names = df[name_col] if name_col else pd.Series("-", index=df.index)
+        if isinstance(names, pd.DataFrame):
+            names = names.iloc[:, 0]
+        names = names.loc[regs.index]
+        text = regs.astype(str)
+        self.rows[sheet_name] = pd.DataFrame({
+            'Batch': sheet_name,
+            'Row': regs.index,
+            'Registration Number': text.str.strip().to_numpy(),
+            'Name': names.astype(object).where(names.notna(), "-").astype(str).to_numpy(),
+            'key': text.str.strip().str.lower().to_numpy(),
+        })
+
+    def _group(self):
+        frames = [f for f in self.rows.values() if len(f)]
+        if not frames:
+            self.duplicates = pd.DataFrame(columns=['Batch', 'Row', 'Registration Number', 'Name', 'key', 'In Batch', 'Batches'])
+            self.locations = {}
+            return
+        rows = pd.concat(frames, ignore_index=True)
+        # Occurrences per number in its own sheet and number of sheets holding it, in one grouped pass
+        rows['In Batch'] = rows.groupby(['key', 'Batch'], sort=False)['Row'].transform('size')
+        rows['Batches'] = rows.groupby('key', sort=False)['Batch'].transform('nunique')
+        self.duplicates = rows[(rows['In Batch'] > 1) | (rows['Batches'] > 1)].reset_index(drop=True)
+        self.locations = {}
+        for key, sheet_name, row in zip(self.duplicates['key'], self.duplicates['Batch'], self.duplicates['Row']):
+            self.locations.setdefault(key, []).append((sheet_name, row))
+
+    def update_sheet(self, sheet_name, df):
+        """Re-groups after one sheet changed, e.g. students were deleted from it (None drops the sheet)."""
+        self.rows.pop(sheet_name, None)
+        if df is not None:
+            self._add_sheet(sheet_name, df)
+        self._group()
+
+    def __len__(self):
+        """Number of duplicated registration numbers."""
+        return len(self.locations)
+
+    def find(self, reg):
+        """[(sheet, row)] of every entry of a duplicated registration number; [] if it is unique."""
+        return list(self.locations.get(normalize_reg(reg), []))
+
+    def in_sheet(self, sheet_name, reg):
+        """Rows of one sheet holding a registration number that sheet repeats; [] otherwise."""
+        rows = [row for sheet, row in self.locations.get(normalize_reg(reg), []) if sheet == sheet_name]
+        return rows if len(rows) > 1 else []
+
+    def sheet_count(self, sheet_name):
+        """Number of registration numbers repeated within one sheet."""
+        dup = self.duplicates
+        return int(dup.loc[(dup['Batch'] == sheet_name) & (dup['In Batch'] > 1), 'key'].nunique())
+
+    def report(self):
+        """Every duplicate entry, grouped by registration number: 'Registration Number', 'Batch',
+        'S/No', 'Name', 'In Batch' (entries in that batch) and 'Batches' (batches holding it)."""
+        report = self.duplicates.assign(**{'S/No': self.duplicates['Row'] + 1})
+        # Groups in first-seen order, entries in sheet order within a group
+        order = pd.factorize(report['key'])[0]
+        report = report.iloc[np.lexsort((np.arange(len(report)), order))]
+        return report[['Registration Number', 'Batch', 'S/No', 'Name', 'In Batch', 'Batches']].reset_index(drop=True)
+
+    def __sizeof__(self):
+        size = sys.getsizeof(self.locations) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self.locations.items())
+        size += sum(int(f.memory_usage(index=True, deep=True).sum()) for f in self.rows.values())
+        return size + int(self.duplicates.memory_usage(index=True, deep=True).sum())
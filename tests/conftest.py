@@ -0,0 +1,64 @@
+import os
+import sys
+import random
+import openpyxl
+import pytest
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+GRADES = ['A+', 'A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'E', 'F', 'AB', 'EX', None, 'a ', ' b+']
+SUBJECTS = ["BSAA 11013 Financial Accounting", "BSAA 11022 Business Mathematics",
+            "BSAA 12013 Cost Accounting", "BSAA 12024 Economics", "MGT 21010 Project Work",
+            "BSAA 12013 Cost Accounting"]
+
+def make_workbook(path, n_sheets=3, n_students=30, seed=0):
+    """Writes an intake workbook laid out like the campus result sheets: a title row, a header row
+    (at a different row per sheet) with semester headings over the subject row, a repeated subject,
+    text and numeric registration numbers, a blank row, a duplicate registration number and sheets
+    without results."""
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for s in range(n_sheets):
+        ws = wb.create_sheet(f"Batch {s + 1}")
+        offset = s % 3
+        ws.cell(row=1, column=1, value="SAB Campus Result Sheet")
+        header = ["S", "Registration No" if s % 2 else "Registration Number", "Name with Initials", "Batch",
+                  "Semester 1", None, "Semester 1", None, "Semester 2", None, "GPA", "Class", "A+", "AB", None]
+        for c, v in enumerate(header, 1):
+            ws.cell(row=2 + offset, column=c, value=v)
+        subject_row = [None, None, None, None] + SUBJECTS + ["", None, None, None, "Remarks"]
+        for c, v in enumerate(subject_row, 1):
+            if v is not None: ws.cell(row=3 + offset, column=c, value=v)
+        for r in range(n_students):
+            row = 4 + offset + r
+            if r == 5 and s == 1:
+                continue  # blank row between students
+            ws.cell(row=row, column=1, value=r + 1)
+            ws.cell(row=row, column=2, value=f"SAB/{2020 + s}/{r:04d}" if r % 7 else 2020000 + r)
+            ws.cell(row=row, column=3, value=f"Student {rng.choice(['Perera', 'Silva', 'Fernando'])} {r}" if r % 11 else None)
+            ws.cell(row=row, column=4, value=f"B{s}")
+            for c in range(5, 11):
+                ws.cell(row=row, column=c, value=rng.choice(GRADES))
+            ws.cell(row=row, column=11, value=round(rng.uniform(1, 4), 2))
+            ws.cell(row=row, column=12, value="Pass")
+        if s == 2:
+            ws.cell(row=4 + offset + 2, column=2, value="SAB/2022/0001")  # duplicate registration number
+    wb.create_sheet("Summary").cell(row=1, column=1, value="totals")
+    wb.create_sheet("Empty")
+    wb.save(path)
+    return path
+
+@pytest.fixture(autouse=True)
+def user_cache(tmp_path, monkeypatch):
+    """Keeps the on-disk workbook cache and student index of every test out of the real user cache."""
+    import intake_index
+    import workbook_cache
+    monkeypatch.setattr(workbook_cache, "CACHE_DIR", str(tmp_path / "user-cache" / "workbooks"))
+    monkeypatch.setattr(intake_index, "DB_PATH", str(tmp_path / "user-cache" / "students.sqlite3"))
+    return tmp_path / "user-cache"
+
+@pytest.fixture
+def intake(tmp_path):
+    return make_workbook(str(tmp_path / "intake.xlsx"))
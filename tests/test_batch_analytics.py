@@ -0,0 +1,62 @@
+import random
+import numpy as np
+import pandas as pd
+import pytest
+import batch_analytics
+import grade_logic
+
+SUBJECTS = ["BSAA 11013 Fin Acc", "BSAA 11022 Bus Math", "BSAA 11033 Econ", "BSAA 11042 Mgmt"]
+CREDITS = {"BSAA 11013 Fin Acc": 3, "BSAA 11022 Bus Math": 2, "BSAA 11033 Econ": 3, "BSAA 11042 Mgmt": 2}
+GRADES = list(grade_logic.GRADE_POINTS) + ["AB", "EX", ""]
+
+# The desktop app's grade table: F carries no points
+DESKTOP_POINTS = {g: p for g, p in grade_logic.GRADE_POINTS.items() if g != 'F'}
+
+def make_sheet(rows):
+    df = pd.DataFrame(rows, columns=SUBJECTS)
+    df.insert(0, 'Registration Number', [f"R{i:03d}" for i in range(len(df))])
+    return grade_logic.encode_grade_columns(df, SUBJECTS)
+
+def check_against_rebuild(stats, rows, grade_points, unweighted_fallback):
+    # Everything the dashboard shows, against statistics built from scratch on the current grades
+    fresh = batch_analytics.BatchAnalytics(make_sheet(rows), SUBJECTS, CREDITS, unweighted_fallback, grade_points)
+    assert stats.student_count() == len(rows)
+    pd.testing.assert_series_equal(stats.gpa_distribution(), fresh.gpa_distribution())
+    pd.testing.assert_series_equal(stats.class_breakdown(), fresh.class_breakdown())
+    summary = stats.subject_summary()
+    pd.testing.assert_frame_equal(summary, fresh.subject_summary())
+
+    distributions = grade_logic.grade_distributions(make_sheet(rows), SUBJECTS, grade_points)
+    for subject, row in summary.iterrows():
+        expected = distributions[subject]
+        assert (row['Graded'], row['Passed'], row['Blank']) == (expected['graded'], expected['passed'], expected['blank'])
+        assert row['Mean Points'] == pytest.approx(expected['mean_points'], nan_ok=True)
+        assert row['Pass Rate'] == pytest.approx(expected['pass_rate'], nan_ok=True)
+
+@pytest.mark.parametrize("grade_points, unweighted_fallback", [(grade_logic.GRADE_POINTS, False), (DESKTOP_POINTS, True)])
+def test_statistics_follow_edits_and_deletes(grade_points, unweighted_fallback):
+    rng = random.Random(17)
+    rows = [[rng.choice(GRADES) for _ in SUBJECTS] for _ in range(150)]
+    stats = batch_analytics.BatchAnalytics(make_sheet(rows), SUBJECTS, CREDITS, unweighted_fallback, grade_points)
+    check_against_rebuild(stats, rows, grade_points, unweighted_fallback)
+
+    for i in range(500):
+        pos, j = rng.randrange(len(rows)), rng.randrange(len(SUBJECTS))
+        rows[pos][j] = rng.choice(GRADES + [f"Remark {i % 7}"])
+        stats.set_grade(pos, SUBJECTS[j], rows[pos][j])
+        if i % 50 == 0:
+            pos = rng.randrange(len(rows))
+            stats.remove_row(pos)
+            del rows[pos]
+    check_against_rebuild(stats, rows, grade_points, unweighted_fallback)
+
+def test_summary_uses_the_gpa_grade_points():
+    rows = [["A", "F", "", ""], ["F", "F", "", ""]]
+    web = batch_analytics.BatchAnalytics(make_sheet(rows), SUBJECTS, CREDITS)
+    desktop = batch_analytics.BatchAnalytics(make_sheet(rows), SUBJECTS, CREDITS, True, DESKTOP_POINTS)
+    assert web.subject_summary().loc[SUBJECTS[0], ['Graded', 'Passed', 'Mean Points']].tolist() == [2, 1, 2.0]
+    assert desktop.subject_summary().loc[SUBJECTS[0], ['Graded', 'Passed', 'Mean Points']].tolist() == [1, 1, 4.0]
+    # A subject only F grades were given in has no mean on the desktop, so it is not ranked
+    assert SUBJECTS[1] not in desktop.ranked_subjects(k=5, best=False).index
+    assert web.ranked_subjects(k=1, best=False).index.tolist() == [SUBJECTS[1]]
+    assert np.isnan(desktop.subject_summary().loc[SUBJECTS[1], 'Mean Points'])
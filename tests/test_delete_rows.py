@@ -0,0 +1,71 @@
+import random
+import openpyxl
+from openpyxl.styles import Font
+import pytest
+import grade_logic
+
+def make_sheet(n_rows=40, n_cols=6, seed=21):
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Batch 1"
+    for r in range(1, n_rows + 1):
+        for c in range(1, n_cols + 1):
+            if rng.random() < 0.8:
+                cell = ws.cell(row=r, column=c, value=f"r{r}c{c}")
+                if rng.random() < 0.3:
+                    cell.font = Font(bold=True, italic=rng.random() < 0.5)
+        if r % 5 == 0:
+            ws.row_dimensions[r].height = 10 + r
+    return wb, ws
+
+def snapshot(ws):
+    cells = {(cell.row, cell.column): (cell.value, cell.font.b, cell.font.i)
+             for row in ws.iter_rows() for cell in row if cell.value is not None}
+    heights = {r: dim.height for r, dim in ws.row_dimensions.items() if dim.height}
+    return cells, heights
+
+@pytest.mark.parametrize("rows", [[3], [1, 2, 3], [40], [5, 12, 13, 27, 38], list(range(2, 41, 3)), [7, 7, 41]])
+def test_matches_deleting_rows_one_at_a_time(rows):
+    _, expected = make_sheet()
+    for r in sorted(set(rows), reverse=True):
+        expected.delete_rows(r)
+    _, ws = make_sheet()
+    grade_logic.delete_sheet_rows(ws, rows)
+    assert snapshot(ws)[0] == snapshot(expected)[0]
+    assert snapshot(ws)[1] == {r - sum(d < r for d in set(rows)): 10 + r for r in range(5, 41, 5) if r not in rows}
+    assert ws.max_row == expected.max_row
+
+def test_merged_ranges_formulas_and_hyperlinks_follow():
+    wb, ws = make_sheet()
+    ws.merge_cells("A10:B12")  # loses its top row
+    ws.merge_cells("C20:D20")  # moves up
+    ws.merge_cells("A35:F35")  # deleted outright
+    ws["F40"] = "=SUM(F10:F20)+F5"
+    ws["A38"].hyperlink = "https://example.org"
+
+    grade_logic.delete_sheet_rows(ws, [2, 10, 35])
+
+    assert sorted(str(r) for r in ws.merged_cells.ranges) == ["A9:B10", "C18:D18"]
+    assert ws["A9"].value is None and not isinstance(ws["A9"], openpyxl.cell.cell.MergedCell)
+    assert ws["F37"].value == "=SUM(F9:F18)+F4"
+    assert ws["A35"].hyperlink.ref == "A35"
+    assert ws["A35"].value == "r38c1"
+
+def test_falls_back_to_delete_rows_without_openpyxl_internals(monkeypatch):
+    rows = [5, 12, 13, 27, 38, 12]
+    _, expected = make_sheet()
+    for r in sorted(set(rows), reverse=True):
+        expected.delete_rows(r)
+    _, ws = make_sheet()
+    assert grade_logic._can_compact(ws)
+    monkeypatch.setattr(grade_logic, "_can_compact", lambda ws: False)
+    grade_logic.delete_sheet_rows(ws, rows)
+    assert snapshot(ws)[0] == snapshot(expected)[0]
+    assert ws.max_row == expected.max_row
+
+def test_no_rows_leaves_the_sheet_alone():
+    _, ws = make_sheet()
+    before = snapshot(ws)
+    grade_logic.delete_sheet_rows(ws, [])
+    assert snapshot(ws) == before
@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import pandas as pd
+import edit_journal
+
+def test_numpy_registration_numbers_round_trip(tmp_path):
+    journal = edit_journal.EditJournal(str(tmp_path / "intake.xlsx"), str(tmp_path / "journal"))
+    df = pd.DataFrame({'Registration Number': [20231001, 20231002]})
+    reg_no = df['Registration Number'].iloc[0]
+    assert isinstance(reg_no, np.int64)
+
+    journal.record_grade("Batch 1", reg_no, "BSAA 11013 Fin Acc", "A")
+    journal.record_delete("Batch 1", df['Registration Number'].iloc[1])
+    pending_changes, pending_deletes = journal.replay()
+
+    assert pending_changes == {"Batch 1": {20231001: {"BSAA 11013 Fin Acc": "A"}}}
+    assert pending_deletes == {"Batch 1": [20231002]}
+    # Replayed keys find the student's row again
+    assert df.index[df['Registration Number'] == next(iter(pending_changes["Batch 1"]))].tolist() == [0]
+
+def test_replay_is_scoped_to_the_session(tmp_path):
+    journal = edit_journal.EditJournal(str(tmp_path / "intake.xlsx"), str(tmp_path / "journal"))
+    journal.record_grade("Batch 1", "R001", "BSAA 11013 Fin Acc", "A", session="alice")
+    journal.record_grade("Batch 1", "R002", "BSAA 11013 Fin Acc", "B", session="bob")
+    journal.record_delete("Batch 1", "R003", session="bob")
+    journal.record_grade("Batch 1", "R004", "BSAA 11013 Fin Acc", "C")
+
+    assert journal.replay("alice") == ({"Batch 1": {"R001": {"BSAA 11013 Fin Acc": "A"}}}, {})
+    assert journal.replay("bob") == ({"Batch 1": {"R002": {"BSAA 11013 Fin Acc": "B"}}}, {"Batch 1": ["R003"]})
+    assert journal.replay() == ({"Batch 1": {"R004": {"BSAA 11013 Fin Acc": "C"}}}, {})
+    assert journal.replay("carol") == ({}, {})
+    assert (journal.count("alice"), journal.count("bob"), journal.count(), len(journal)) == (1, 2, 1, 4)
+
+def test_due_counts_only_the_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(edit_journal, "CHECKPOINT_EDITS", 3)
+    journal = edit_journal.EditJournal(str(tmp_path / "intake.xlsx"), str(tmp_path / "journal"))
+    for i in range(3):
+        journal.record_grade("Batch 1", f"R{i:03d}", "BSAA 11013 Fin Acc", "A", session="bob")
+    journal.record_grade("Batch 1", "R100", "BSAA 11013 Fin Acc", "A", session="alice")
+    assert journal.due("bob")
+    assert not journal.due("alice")
+
+def test_checkpoint_drops_only_the_sessions_saved_records(tmp_path):
+    journal = edit_journal.EditJournal(str(tmp_path / "intake.xlsx"), str(tmp_path / "journal"))
+    journal.record_grade("Batch 1", "R001", "BSAA 11013 Fin Acc", "A", session="alice", was="B")
+    journal.record_grade("Batch 1", "R002", "BSAA 11013 Fin Acc", "B", session="bob")
+    journal.record_grade("Batch 1", "R001", "BSAA 11013 Fin Acc", "A-", session="alice", was="A")
+    changes, deletes, mark, base = journal.snapshot("alice")
+    assert changes == {"Batch 1": {"R001": {"BSAA 11013 Fin Acc": "A-"}}}
+    # The value before the session's first edit of the cell
+    assert base == {("Batch 1", "R001", "BSAA 11013 Fin Acc"): "B"}
+
+    # Made while the save was running: not covered by it
+    journal.record_grade("Batch 1", "R003", "BSAA 11013 Fin Acc", "C", session="alice")
+    journal.checkpoint(mark, "alice")
+    assert journal.replay("alice") == ({"Batch 1": {"R003": {"BSAA 11013 Fin Acc": "C"}}}, {})
+    assert journal.replay("bob") == ({"Batch 1": {"R002": {"BSAA 11013 Fin Acc": "B"}}}, {})
+    assert (journal.count("alice"), journal.count("bob")) == (1, 1)
+
+    journal.checkpoint(journal.mark(), "alice")
+    journal.checkpoint(journal.mark(), "bob")
+    assert len(journal) == 0
+    assert not os.path.exists(journal.path)
+
+def test_torn_record_is_skipped(tmp_path):
+    journal = edit_journal.EditJournal(str(tmp_path / "intake.xlsx"), str(tmp_path / "journal"))
+    journal.record_grade("Batch 1", "R001", "BSAA 11013 Fin Acc", "A")
+    with open(journal.path, "ab") as f:
+        f.write(b'{"op": "grade", "sheet": "Batch 1", "reg": "R0')  # crash mid-append
+    journal.record_grade("Batch 1", "R002", "BSAA 11013 Fin Acc", "B")
+    assert journal.replay() == ({"Batch 1": {"R001": {"BSAA 11013 Fin Acc": "A"}, "R002": {"BSAA 11013 Fin Acc": "B"}}}, {})
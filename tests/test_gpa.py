@@ -0,0 +1,124 @@
+import random
+import pandas as pd
+import pytest
+import grade_logic
+
+SUBJECTS = ["BSAA 11013 Fin Acc", "BSAA 11022 Bus Math", "BSAA 11033 Econ", "BSAA 11042 Mgmt", "BSAA 11050 Lab"]
+CREDITS = {"BSAA 11013 Fin Acc": 3, "BSAA 11022 Bus Math": 2, "BSAA 11033 Econ": 3, "BSAA 11042 Mgmt": 2, "BSAA 11050 Lab": 0}
+GRADES = list(grade_logic.GRADE_POINTS) + ["AB", "EX", " b+ ", ""]
+
+# The desktop app's own grade table: F carries no points
+DESKTOP_POINTS = {g: p for g, p in grade_logic.GRADE_POINTS.items() if g != 'F'}
+
+def make_sheet(rows):
+    df = pd.DataFrame(rows, columns=SUBJECTS)
+    df.insert(0, 'Registration Number', [f"R{i:03d}" for i in range(len(df))])
+    return grade_logic.encode_grade_columns(df, SUBJECTS)
+
+def web_gpa(grades, credits):
+    # How app.py has always computed a student's GPA
+    return grade_logic.calculate_gpa(grades, credits)
+
+def desktop_gpa(grades, credits):
+    # How garde.py has always computed a student's GPA: only grades with points in its table count,
+    # and credits are passed only when one of them has any
+    kept = [(g, c) for g, c in zip(grades, credits) if str(g).strip().upper() in DESKTOP_POINTS]
+    kept_grades = [g for g, _ in kept]
+    kept_credits = [c for _, c in kept]
+    return grade_logic.calculate_gpa(kept_grades, kept_credits if any(c is not None for c in kept_credits) else None)
+
+MODES = {
+    "web": (web_gpa, {}),
+    "desktop": (desktop_gpa, {"unweighted_fallback": True, "grade_points": DESKTOP_POINTS}),
+}
+
+def check_parity(totals, rows, credits, baseline):
+    gpas = []
+    for pos, row in enumerate(rows):
+        expected = baseline(["" if g is None else g for g in row], credits)
+        assert totals.student_gpa(pos) == expected
+        assert totals.student_class(pos) == grade_logic.calculate_class(expected)
+        gpas.append(expected)
+    assert totals.mean_gpa() == pytest.approx(sum(gpas) / len(gpas), abs=1e-12)
+    counts = pd.Series([totals.student_class(pos) for pos in range(len(rows))]).value_counts()
+    assert {k: v for k, v in totals.class_breakdown().items() if v} == counts.to_dict()
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("subject_credits", [CREDITS, {"BSAA 11013 Fin Acc": 3}, {}])
+def test_accumulator_matches_calculate_gpa(mode, subject_credits):
+    baseline, options = MODES[mode]
+    rng = random.Random(16)
+    rows = [[rng.choice(GRADES) for _ in SUBJECTS] for _ in range(300)]
+    credits = [subject_credits.get(s) for s in SUBJECTS]
+    totals = grade_logic.GpaAccumulator(make_sheet(rows), SUBJECTS, subject_credits, **options)
+    check_parity(totals, rows, credits, baseline)
+
+    # Edits keep every GPA equal to a from-scratch calculation
+    for _ in range(2000):
+        pos, j = rng.randrange(len(rows)), rng.randrange(len(SUBJECTS))
+        rows[pos][j] = rng.choice(GRADES)
+        totals.set_grade(pos, SUBJECTS[j], rows[pos][j])
+    check_parity(totals, rows, credits, baseline)
+
+    totals.remove_row(5)
+    del rows[5]
+    check_parity(totals, rows, credits, baseline)
+
+@pytest.mark.parametrize("grades, credits, expected_class", [
+    # 3.6999999999999997 and 1.9999999999999998: just below the First Class and Pass thresholds
+    (["A+", "B+", "", "", ""], [4, 3, None, None, None], "Second Class (Upper Division)"),
+    (["B+", "C-", "D+", "", ""], [1, 2, 1, None, None], "Fail"),
+])
+def test_class_thresholds_use_the_unrounded_gpa(grades, credits, expected_class):
+    subject_credits = {s: c for s, c in zip(SUBJECTS, credits) if c is not None}
+    totals = grade_logic.GpaAccumulator(make_sheet([grades]), SUBJECTS, subject_credits)
+    assert totals.student_gpa(0) == grade_logic.calculate_gpa(grades, credits)
+    assert totals.student_class(0) == expected_class
+
+    # Reached through edits as well as on load
+    totals = grade_logic.GpaAccumulator(make_sheet([[""] * len(SUBJECTS)]), SUBJECTS, subject_credits)
+    for subject, grade in zip(SUBJECTS, grades):
+        totals.set_grade(0, subject, grade)
+    assert totals.student_class(0) == expected_class
+
+def test_desktop_gpa_leaves_fail_grades_out():
+    grades = ["A", "F", "", "", ""]
+    subject_credits = {"BSAA 11013 Fin Acc": 3, "BSAA 11022 Bus Math": 2}
+    web = grade_logic.GpaAccumulator(make_sheet([grades]), SUBJECTS, subject_credits)
+    desktop = grade_logic.GpaAccumulator(make_sheet([grades]), SUBJECTS, subject_credits, **MODES["desktop"][1])
+    assert web.student_gpa(0) == pytest.approx(2.4)
+    assert desktop.student_gpa(0) == 4.0
+
+def test_gpa_matrix_matches_calculate_gpa():
+    rng = random.Random(9)
+    rows = [[rng.choice(GRADES) for _ in SUBJECTS] for _ in range(200)]
+    codes, categories = grade_logic.grade_code_matrix(make_sheet(rows), SUBJECTS)
+    credits = [CREDITS.get(s) for s in SUBJECTS]
+    gpa, total_credits = grade_logic.calculate_gpa_matrix(codes, categories, credits)
+    assert gpa.tolist() == [grade_logic.calculate_gpa(row, credits) for row in rows]
+
+@pytest.mark.parametrize("n_remarks", [120, 300])
+def test_codes_survive_a_large_code_table(n_remarks):
+    # Free-text remarks columns put one entry per distinct value into the shared code table
+    rng = random.Random(7)
+    rows = [[rng.choice(GRADES), rng.choice(GRADES), rng.choice(GRADES), rng.choice(GRADES), f"Note {i}"] for i in range(n_remarks)]
+    df = make_sheet(rows)
+    codes, categories = grade_logic.grade_code_matrix(df, SUBJECTS)
+    assert len(categories) > 127
+    decoded = grade_logic.decode_grades(codes, categories)
+    assert decoded[:, 4].tolist() == [f"NOTE {i}" for i in range(n_remarks)]
+    credits = [CREDITS.get(s) for s in SUBJECTS]
+    gpa, _ = grade_logic.calculate_gpa_matrix(codes, categories, credits)
+    assert gpa.tolist() == [grade_logic.calculate_gpa(row, credits) for row in rows]
+
+    totals = grade_logic.GpaAccumulator(df, SUBJECTS, CREDITS)
+    check_parity(totals, rows, credits, web_gpa)
+    # Edits that grow the table further keep working
+    for i in range(200):
+        pos = rng.randrange(len(rows))
+        rows[pos][4] = f"Late note {i}"
+        totals.set_grade(pos, SUBJECTS[4], rows[pos][4])
+    rows[0][0] = "A"
+    totals.set_grade(0, SUBJECTS[0], "A")
+    check_parity(totals, rows, credits, web_gpa)
+    assert grade_logic.decode_grades(totals.codes, totals.categories)[0, 0] == "A"
@@ -0,0 +1,48 @@
+import os
+import time
+import intake_index
+from conftest import make_workbook
+
+def test_refresh_and_search(tmp_path):
+    sheets_dir = tmp_path / "sheets"
+    sheets_dir.mkdir()
+    make_workbook(str(sheets_dir / "2020.xlsx"), n_sheets=2)
+    make_workbook(str(sheets_dir / "2021.xlsx"), n_sheets=1, seed=1)
+    db_path = str(tmp_path / "students.sqlite3")
+
+    assert intake_index.refresh(str(sheets_dir), db_path) == 2
+    # Unchanged workbooks are not read again
+    assert intake_index.refresh(str(sheets_dir), db_path) == 0
+
+    hits = intake_index.search("sab/2021/0003", db_path=db_path)
+    assert [(f, s, reg) for f, s, _, reg, _ in hits] == [("2020.xlsx", "Batch 2", "SAB/2021/0003")]
+    assert all(name.startswith("Student") for *_, name in intake_index.search("student", db_path=db_path) if name)
+
+    os.remove(sheets_dir / "2021.xlsx")
+    assert intake_index.refresh(str(sheets_dir), db_path) == 0
+    assert {f for f, *_ in intake_index.search("SAB/2020/0001", db_path=db_path)} == {"2020.xlsx"}
+    assert intake_index.search("2020000", db_path=db_path) == [
+        ("2020.xlsx", "Batch 1", 0, "2020000", None), ("2020.xlsx", "Batch 2", 0, "2020000", None)
+    ]
+
+def test_one_indexer_per_directory(tmp_path):
+    sheets_dir = tmp_path / "sheets"
+    sheets_dir.mkdir()
+    make_workbook(str(sheets_dir / "2020.xlsx"), n_sheets=1)
+    db_path = str(tmp_path / "students.sqlite3")
+
+    indexer = intake_index.start_indexer(str(sheets_dir), db_path)
+    assert intake_index.start_indexer(str(sheets_dir), db_path) is indexer
+    assert indexer.indexed.wait(30)
+    assert intake_index.search("SAB/2020/0001", db_path=db_path)
+
+def test_start_indexer_does_not_wait_for_a_refresh(tmp_path):
+    sheets_dir = tmp_path / "sheets"
+    sheets_dir.mkdir()
+    db_path = str(tmp_path / "students.sqlite3")
+    indexer = intake_index.start_indexer(str(sheets_dir), db_path)
+    # A pass in progress holds the refresh lock; looking the indexer up again must not block on it
+    with intake_index._refresh_lock:
+        started = time.monotonic()
+        assert intake_index.start_indexer(str(sheets_dir), db_path) is indexer
+        assert time.monotonic() - started < 1
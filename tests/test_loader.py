@@ -0,0 +1,95 @@
+import datetime
+import openpyxl
+import pandas as pd
+import pytest
+import grade_logic
+from conftest import make_workbook
+
+def old_header_frames(file_path):
+    # The loader as it was: find the header row in a header=None read, then read the sheet again with header=
+    frames = {}
+    for sheet_name, raw_df in pd.read_excel(file_path, sheet_name=None, header=None).items():
+        if len(raw_df) < 1: continue
+        header_row_idx = -1
+        for i in range(min(10, len(raw_df))):
+            row_vals = raw_df.iloc[i].astype(str).str.lower().tolist()
+            if any("registration" in x for x in row_vals) and (any("no" in x for x in row_vals) or any("number" in x for x in row_vals)):
+                header_row_idx = i
+                break
+        if header_row_idx == -1: continue
+        frames[sheet_name] = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row_idx)
+    return frames
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = make_workbook(str(tmp_path / "intake.xlsx"), n_sheets=4)
+    wb = openpyxl.load_workbook(path)
+    # Cell types the generated batches lack: dates, numeric-looking text, booleans and errors
+    ws = wb.create_sheet("Batch Misc")
+    ws.append(["Registration Number", "Name", "Sat On", "Batch", "BSAA 11013 Financial Accounting", "Flag"])
+    ws.append([None, None, None, None, None, None])
+    ws.append(["00123", "Student One", datetime.datetime(2024, 3, 1), 1, "A", True])
+    ws.append([456, "Student Two", datetime.datetime(2024, 3, 2, 9, 30), 2.5, "b+", False])
+    ws.append(["SAB/2024/0003", None, None, None, "#N/A", None])
+    wb.save(path)
+    return path
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_header_frames_match_the_old_loader(workbook, streaming):
+    expected = old_header_frames(workbook)
+    frames = dict(grade_logic.iter_header_frames(workbook, streaming=streaming))
+    assert list(frames) == list(expected)
+    for sheet_name, df in expected.items():
+        pd.testing.assert_frame_equal(frames[sheet_name], df, obj=sheet_name)
+
+def test_frame_from_raw_matches_read_excel(workbook):
+    raw_sheets = pd.read_excel(workbook, sheet_name=None, header=None, dtype=object)
+    for sheet_name, raw_df in raw_sheets.items():
+        header_row_idx = grade_logic.find_header_row(raw_df)
+        if header_row_idx == -1: continue
+        pd.testing.assert_frame_equal(
+            grade_logic.frame_from_raw(raw_df, header_row_idx),
+            pd.read_excel(workbook, sheet_name=sheet_name, header=header_row_idx),
+            obj=sheet_name
+        )
+
+def assert_same_load(loaded, expected):
+    data, cols, credits = loaded
+    assert list(data) == list(expected[0])
+    for sheet_name, df in expected[0].items():
+        pd.testing.assert_frame_equal(data[sheet_name], df, obj=sheet_name)
+    assert cols == expected[1] and credits == expected[2]
+    assert list(cols) == list(expected[1])
+
+@pytest.mark.parametrize("workers", [2, 3, 16])
+def test_parallel_load_matches_serial(workbook, workers):
+    serial = grade_logic.load_workbook_data(workbook, streaming=True, workers=1)
+    assert list(serial[0]) == ["Batch 1", "Batch 2", "Batch 3", "Batch 4", "Batch Misc"]
+    assert_same_load(grade_logic.load_workbook_data(workbook, workers=workers), serial)
+
+def test_parallel_load_falls_back_to_serial(workbook, monkeypatch):
+    def no_processes(*args, **kwargs):
+        raise OSError("no worker processes here")
+    monkeypatch.setattr(grade_logic, "ProcessPoolExecutor", no_processes)
+    serial = grade_logic.load_workbook_data(workbook, streaming=True, workers=1)
+    assert_same_load(grade_logic.load_workbook_data(workbook, workers=4), serial)
+
+def test_schema_cache_follows_the_workbook_version(workbook):
+    grade_logic._infer_sheet_schema.cache_clear()
+    first = grade_logic.load_workbook_data(workbook, streaming=True)
+    inferred = grade_logic._infer_sheet_schema.cache_info().misses
+    # The batches share a header, so fewer schemas are inferred than sheets are loaded
+    assert inferred < len(first[0])
+    grade_logic.load_workbook_data(workbook, streaming=True)
+    assert grade_logic._infer_sheet_schema.cache_info().misses == inferred
+
+    # Saved under the same path with a renamed subject: inferred afresh, never served from the old entry
+    wb = openpyxl.load_workbook(workbook)
+    ws = wb["Batch Misc"]
+    ws["E1"] = "BSAA 11022 Business Mathematics"
+    wb.save(workbook)
+    second = grade_logic.load_workbook_data(workbook, streaming=True)
+    assert grade_logic._infer_sheet_schema.cache_info().misses > inferred
+    assert second[1]["Batch Misc"] == ["BSAA 11022 Business Mathematics"]
+    assert first[1]["Batch Misc"] == ["BSAA 11013 Financial Accounting"]
+    assert second[1]["Batch 1"] == first[1]["Batch 1"]
@@ -0,0 +1,85 @@
+import random
+import pandas as pd
+import pytest
+import grade_logic
+import merit_list
+
+def make_entries(n=200, seed=18):
+    # Few distinct GPAs and credit totals, so plenty of students share a place
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        'Intake': "2020.xlsx",
+        'Batch': [f"Batch {rng.randrange(1, 4)}" for _ in range(n)],
+        'Registration Number': [f"SAB/2020/{i:04d}" for i in range(n)],
+        'Name': [f"Student {i}" for i in range(n)],
+        'GPA': [rng.choice([0.0, 1.7, 2.35, 3.0, 3.3, 3.7, 4.0]) for _ in range(n)],
+        'Total Credits': [rng.choice([0, 12, 15, 18]) for _ in range(n)],
+        'Class': "-",
+    }, columns=merit_list.MERIT_COLUMNS)
+
+def full_ranking(entries):
+    # Sort the whole cohort and hand out competition ranks (1, 2, 2, 4)
+    keys = list(zip(entries['GPA'], entries['Total Credits']))
+    order = sorted(range(len(keys)), key=lambda i: (-keys[i][0], -keys[i][1], i))
+    ranks = {}
+    for place, i in enumerate(order, start=1):
+        ranks[i] = ranks[order[place - 2]] if place > 1 and keys[order[place - 2]] == keys[i] else place
+    return order, ranks
+
+@pytest.mark.parametrize("k", [0, 1, 5, 37, 199, 200, 500])
+def test_top_matches_a_full_sort(k):
+    entries = make_entries()
+    order, ranks = full_ranking(entries)
+    merit = merit_list.MeritList(entries)
+
+    ranked = merit.top(k, include_ties=False)
+    assert ranked['Registration Number'].tolist() == entries['Registration Number'][order[:k]].tolist()
+    assert ranked['Rank'].tolist() == [ranks[i] for i in order[:k]]
+
+    # With ties, everyone level with the k-th student is listed too
+    with_ties = merit.top(k)
+    cut = len(order) if k >= len(order) else k + sum(1 for i in order[k:] if k and ranks[i] == ranks[order[k - 1]])
+    assert with_ties['Registration Number'].tolist() == entries['Registration Number'][order[:cut]].tolist()
+    assert with_ties['Rank'].tolist() == [ranks[i] for i in order[:cut]]
+
+def test_rank_and_percentile_match_a_full_sort():
+    entries = make_entries()
+    _, ranks = full_ranking(entries)
+    merit = merit_list.MeritList(entries)
+    keys = list(zip(entries['GPA'], entries['Total Credits']))
+    for pos, (gpa, credits) in enumerate(keys):
+        below = sum(1 for other in keys if other < (gpa, credits))
+        assert merit.rank_of(pos) == (ranks[pos], pytest.approx(100.0 * below / len(keys)))
+    # A GPA and credit total nobody holds slots in between
+    assert merit.rank(4.5, 0) == 1
+    assert merit.rank(-1.0, 0) == len(keys) + 1
+    assert merit.percentile(-1.0, 0) == 0.0
+
+def test_find_and_empty_list():
+    entries = make_entries(n=10)
+    merit = merit_list.MeritList(entries)
+    assert merit.find(" sab/2020/0003 ").tolist() == [3]
+    assert merit.find("SAB/2020/9999").tolist() == []
+
+    empty = merit_list.MeritList(entries.iloc[:0])
+    assert len(empty) == 0
+    assert empty.top(10).empty and list(empty.top(10).columns) == ['Rank'] + merit_list.MERIT_COLUMNS
+    assert empty.percentile(3.0, 12) == 0.0
+
+def test_batch_entries_reads_the_accumulator():
+    subjects = ["BSAA 11013 Fin Acc", "BSAA 11022 Bus Math"]
+    df = pd.DataFrame({'Registration Number': ["R1", None, "R3"], 'Name with Initials': ["Perera A.B.", "Silva K", None],
+                       subjects[0]: ["A", "B", "C"], subjects[1]: ["B+", "", "F"]})
+    df = grade_logic.encode_grade_columns(df, subjects)
+    credits = {subjects[0]: 3, subjects[1]: 2}
+    totals = grade_logic.GpaAccumulator(df, subjects, credits)
+
+    entries = merit_list.batch_entries(df, totals, "Batch 1", "2020.xlsx")
+    assert list(entries.columns) == merit_list.MERIT_COLUMNS
+    assert entries['Registration Number'].tolist() == ["R1", "R3"]
+    assert entries['Name'].tolist() == ["Perera A.B.", "-"]
+    for (_, row), grades in zip(entries.iterrows(), [["A", "B+"], ["C", "F"]]):
+        gpa = grade_logic.calculate_gpa(grades, [3, 2])
+        assert row['GPA'] == gpa
+        assert row['Class'] == grade_logic.calculate_class(gpa)
+        assert row['Total Credits'] == 5
@@ -0,0 +1,110 @@
+import time
+import threading
+import grade_logic
+import save_coordinator
+
+SUBJECT = "BSAA 12024 Economics"
+
+def frames_loader(path):
+    def frames_for(sheet_names):
+        data = grade_logic.load_workbook_data(path, streaming=True)[0]
+        return {s: data[s] for s in sheet_names if s in data}
+    return frames_for
+
+def grade_in(path, sheet_name, reg_no, subject=SUBJECT):
+    df = grade_logic.load_workbook_data(path, streaming=True)[0][sheet_name]
+    return grade_logic.normalize_grade(df.loc[df['Registration Number'] == reg_no, subject].iloc[0])
+
+def current(path, reg_no):
+    return grade_in(path, "Batch 1", reg_no) or ""
+
+def test_save_writes_only_the_sessions_edits(intake, tmp_path):
+    coordinator = save_coordinator.SaveCoordinator(intake, str(tmp_path / "journal"))
+    journal = coordinator.journal
+    journal.record_grade("Batch 1", "SAB/2020/0001", SUBJECT, "A+", session="alice", was=current(intake, "SAB/2020/0001"))
+    journal.record_grade("Batch 1", "SAB/2020/0002", SUBJECT, "E", session="bob", was=current(intake, "SAB/2020/0002"))
+    bob_before = current(intake, "SAB/2020/0002")
+
+    assert coordinator.save("alice", frames_loader(intake)) == (True, "Changes saved successfully!")
+    assert grade_in(intake, "Batch 1", "SAB/2020/0001") == "A+"
+    assert current(intake, "SAB/2020/0002") == bob_before
+    # Bob's edit is still pending, for Bob alone
+    assert journal.replay("alice") == ({}, {})
+    assert journal.replay("bob") == ({"Batch 1": {"SAB/2020/0002": {SUBJECT: "E"}}}, {})
+
+    assert coordinator.save("bob", frames_loader(intake))[0]
+    assert grade_in(intake, "Batch 1", "SAB/2020/0002") == "E"
+    assert len(journal) == 0
+    assert coordinator.writes == 2
+
+def test_conflicting_save_waits_for_overwrite(intake, tmp_path):
+    coordinator = save_coordinator.SaveCoordinator(intake, str(tmp_path / "journal"))
+    journal = coordinator.journal
+    reg_no = "SAB/2020/0003"
+    was = current(intake, reg_no)
+    journal.record_grade("Batch 1", reg_no, SUBJECT, "A", session="alice", was=was)
+    journal.record_grade("Batch 1", reg_no, SUBJECT, "C", session="bob", was=was)
+    assert coordinator.save("alice", frames_loader(intake))[0]
+
+    ok, message = coordinator.save("bob", frames_loader(intake))
+    assert not ok
+    assert coordinator.take_conflicts("bob") == [
+        {"sheet": "Batch 1", "reg": reg_no, "subject": SUBJECT, "was": was, "saved": "A", "yours": "C"}
+    ]
+    # Nothing was written and Bob's edit stays journaled
+    assert grade_in(intake, "Batch 1", reg_no) == "A"
+    assert journal.replay("bob") == ({"Batch 1": {reg_no: {SUBJECT: "C"}}}, {})
+
+    assert coordinator.save("bob", frames_loader(intake), overwrite=True)[0]
+    assert grade_in(intake, "Batch 1", reg_no) == "C"
+    assert coordinator.take_conflicts("bob") == []
+
+def test_matching_edit_is_no_conflict(intake, tmp_path):
+    coordinator = save_coordinator.SaveCoordinator(intake, str(tmp_path / "journal"))
+    reg_no = "SAB/2020/0004"
+    was = current(intake, reg_no)
+    coordinator.journal.record_grade("Batch 1", reg_no, SUBJECT, "B", session="alice", was=was)
+    coordinator.journal.record_grade("Batch 1", reg_no, SUBJECT, "B", session="bob", was=was)
+    assert coordinator.save("alice", frames_loader(intake))[0]
+    assert coordinator.save("bob", frames_loader(intake))[0]
+
+def test_queued_saves_share_one_write(intake, tmp_path, monkeypatch):
+    coordinator = save_coordinator.SaveCoordinator(intake, str(tmp_path / "journal"))
+    journal = coordinator.journal
+    was = {reg: current(intake, reg) for reg in ("SAB/2020/0001", "SAB/2020/0002")}
+    journal.record_grade("Batch 1", "SAB/2020/0001", SUBJECT, "A+", session="alice", was=was["SAB/2020/0001"])
+    journal.record_grade("Batch 1", "SAB/2020/0002", SUBJECT, "B", session="bob", was=was["SAB/2020/0002"])
+    journal.record_delete("Batch 2", "SAB/2021/0005", session="bob")
+    # Carol edited the cell Alice is saving from the same starting grade: hers conflicts
+    journal.record_grade("Batch 1", "SAB/2020/0001", SUBJECT, "C", session="carol", was=was["SAB/2020/0001"])
+    journal.record_grade("Batch 1", "SAB/2020/0003", SUBJECT, "D", session="dave")
+
+    writes = []
+    save = grade_logic.save_changes_to_excel
+    monkeypatch.setattr(grade_logic, "save_changes_to_excel", lambda *args: writes.append(args[1:3]) or save(*args))
+
+    results = {}
+    def run(session):
+        results[session] = coordinator.save(session, frames_loader(intake))
+    # A write is in progress while Alice, Bob and Carol ask to save
+    with coordinator._lock:
+        threads = [threading.Thread(target=run, args=(s,)) for s in ("alice", "bob", "carol")]
+        for thread in threads:
+            thread.start()
+            while len(coordinator._queue) < threads.index(thread) + 1:
+                time.sleep(0.01)
+    for thread in threads:
+        thread.join(30)
+
+    assert len(writes) == 1 and coordinator.writes == 1
+    assert writes[0] == ({"Batch 1": {"SAB/2020/0001": {SUBJECT: "A+"}, "SAB/2020/0002": {SUBJECT: "B"}}},
+                         {"Batch 2": ["SAB/2021/0005"]})
+    assert results["alice"][0] and results["bob"][0] and not results["carol"][0]
+    assert coordinator.take_conflicts("carol") == [
+        {"sheet": "Batch 1", "reg": "SAB/2020/0001", "subject": SUBJECT, "was": was["SAB/2020/0001"], "saved": "A+", "yours": "C"}
+    ]
+    assert grade_in(intake, "Batch 1", "SAB/2020/0001") == "A+"
+    assert grade_in(intake, "Batch 1", "SAB/2020/0002") == "B"
+    # Only the sessions that were written are checkpointed
+    assert journal.count("alice") == journal.count("bob") == 0
+    assert journal.count("carol") == journal.count("dave") == 1
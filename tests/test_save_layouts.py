@@ -0,0 +1,69 @@
+import openpyxl
+import pytest
+import grade_logic
+
+SUBJECT = "BSAA 12024 Economics"
+ECONOMICS_COL = 8
+
+def loaded_layouts(path):
+    data = grade_logic.load_workbook_data(path, streaming=True)[0]
+    return grade_logic.frame_layouts(data)
+
+def row_of_reg(ws, reg):
+    return next(r for r in range(1, ws.max_row + 1) if ws.cell(row=r, column=2).value == reg)
+
+@pytest.mark.parametrize("patch", [True, False])
+def test_stale_layout_is_rescanned(intake, patch):
+    layouts = loaded_layouts(intake)
+    old = layouts["Batch 1"]
+    old_row = old.row_of("SAB/2020/0003")
+
+    # Someone else saves the workbook with two rows inserted above the students
+    wb = openpyxl.load_workbook(intake)
+    wb["Batch 1"].insert_rows(4, amount=2)
+    wb.save(intake)
+    assert not old.matches(grade_logic.file_fingerprint(intake))
+
+    ok, _ = grade_logic.save_changes_to_excel(
+        intake, {"Batch 1": {"SAB/2020/0003": {SUBJECT: "A+"}}}, {"Batch 1": ["SAB/2020/0004"]}, layouts, patch=patch)
+    assert ok
+    ws = openpyxl.load_workbook(intake)["Batch 1"]
+    # The edit lands on the student, not on the row the stale layout remembered
+    assert ws.cell(row=row_of_reg(ws, "SAB/2020/0003"), column=ECONOMICS_COL).value == "A+"
+    assert row_of_reg(ws, "SAB/2020/0003") == old_row + 2
+    assert all(ws.cell(row=r, column=2).value != "SAB/2020/0004" for r in range(1, ws.max_row + 1))
+
+    # The rescanned layout replaced the stale one and describes the saved file
+    assert layouts["Batch 1"] is not old
+    assert layouts["Batch 1"].matches(grade_logic.file_fingerprint(intake))
+    assert layouts["Batch 1"].reg_rows == grade_logic.SheetLayout.scan(ws).reg_rows
+
+def test_rows_deleted_shifts_the_row_map():
+    layout = grade_logic.SheetLayout((1, 1))
+    layout.header_row, layout.reg_col = 2, 2
+    layout.reg_rows = {"A": [4], "B": [5, 9], "C": [6], "D": [10], "E": [12]}
+    layout.rows_deleted([6, 5, 11, 6], (2, 2))
+    assert layout.reg_rows == {"A": [4], "B": [7], "D": [8], "E": [9]}
+    assert layout.matches((2, 2)) and not layout.matches((1, 1))
+    assert layout.row_of("B") == 7 and layout.row_of("C") is None
+
+@pytest.mark.parametrize("patch", [True, False])
+def test_layouts_stay_valid_across_saves_with_deletes(intake, patch, monkeypatch):
+    layouts = loaded_layouts(intake)
+    deletes = {"Batch 1": ["SAB/2020/0002", "SAB/2020/0005"], "Batch 3": ["SAB/2022/0003"]}
+    assert grade_logic.save_changes_to_excel(intake, {}, deletes, layouts, patch=patch)[0]
+
+    wb = openpyxl.load_workbook(intake)
+    for sheet_name in ("Batch 1", "Batch 2", "Batch 3"):
+        assert layouts[sheet_name].reg_rows == grade_logic.SheetLayout.scan(wb[sheet_name]).reg_rows, sheet_name
+
+    # The next save trusts the shifted layouts: no sheet is scanned again
+    scans = []
+    scan = grade_logic.SheetLayout.scan
+    monkeypatch.setattr(grade_logic.SheetLayout, "scan", classmethod(lambda cls, *args: scans.append(args) or scan(*args)))
+    changes = {"Batch 1": {"SAB/2020/0006": {SUBJECT: "B-"}}, "Batch 3": {"SAB/2022/0009": {SUBJECT: "C+"}}}
+    assert grade_logic.save_changes_to_excel(intake, changes, {}, layouts, patch=patch)[0]
+    assert scans == []
+    wb = openpyxl.load_workbook(intake)
+    assert wb["Batch 1"].cell(row=row_of_reg(wb["Batch 1"], "SAB/2020/0006"), column=ECONOMICS_COL).value == "B-"
+    assert wb["Batch 3"].cell(row=row_of_reg(wb["Batch 3"], "SAB/2022/0009"), column=ECONOMICS_COL).value == "C+"
@@ -0,0 +1,86 @@
+import random
+import pandas as pd
+import pytest
+import search_index
+
+def make_sheets(seed=10):
+    rng = random.Random(seed)
+    sheets = {}
+    for s in range(3):
+        regs = [rng.choice([f"SAB/{2020 + s}/{rng.randrange(60):04d}", f" sab/2021/{rng.randrange(60):04d} ",
+                            2020000 + rng.randrange(40), None]) for _ in range(80)]
+        names = [rng.choice(["Perera A.B.", "Silva K", "Fernando R. M.", "Jayasuriya S", None]) for _ in regs]
+        sheets[f"Batch {s + 1}"] = pd.DataFrame({'Registration Number': regs, 'Name with Initials': names})
+    return sheets
+
+def scan(sheets, match):
+    # What the apps did before the index: every sheet top to bottom
+    return [(sheet_name, idx) for sheet_name, df in sheets.items()
+            for idx, reg in df['Registration Number'].items() if pd.notna(reg) and match(search_index.normalize_reg(reg))]
+
+@pytest.mark.parametrize("term", ["SAB/2021/0007", "sab/2021/00", "2020003", "2020", "21/00", "/0", "x", "ab"])
+def test_registration_lookups_match_a_scan(term):
+    sheets = make_sheets()
+    index = search_index.RegistrationIndex(sheets)
+    key = search_index.normalize_reg(term)
+    assert index.exact(term) == scan(sheets, lambda reg: reg == key)
+    assert index.prefix(term) == scan(sheets, lambda reg: reg.startswith(key))
+    assert index.contains(term) == scan(sheets, lambda reg: key in reg)
+
+def test_registration_index_follows_deletes():
+    sheets = make_sheets()
+    index = search_index.RegistrationIndex(sheets)
+    sheets["Batch 2"] = sheets["Batch 2"].drop(index=range(0, 80, 2)).reset_index(drop=True)
+    index.update_sheet("Batch 2", sheets["Batch 2"])
+    assert index.prefix("sab") == scan(sheets, lambda reg: reg.startswith("sab"))
+    del sheets["Batch 3"]
+    index.update_sheet("Batch 3", None)
+    assert index.contains("20") == scan(sheets, lambda reg: "20" in reg)
+
+def test_name_search_tolerates_misspellings():
+    sheets = {"Batch 1": pd.DataFrame({'Registration Number': ["R1", "R2", "R3", "R4"],
+                                       'Name with Initials': ["Perera A.B.", "Silva K", "Fernando R. M.", None]})}
+    index = search_index.NameIndex(sheets)
+    hits = index.search("fernado")
+    assert [(s, row) for s, row, _ in hits] == [("Batch 1", 2)]
+    # Scores are trigram similarity: shared / distinct trigrams of both names
+    query, name = search_index.name_trigrams("fernado"), search_index.name_trigrams("Fernando R. M.")
+    assert hits[0][2] == pytest.approx(len(query & name) / len(query | name))
+    assert index.search("perera")[0][:2] == ("Batch 1", 0)
+    assert index.search("zzz") == []
+
+def test_name_search_ranks_best_first_across_sheets():
+    sheets = make_sheets()
+    index = search_index.NameIndex(sheets)
+    hits = index.search("silva k", k=5)
+    assert len(hits) == 5
+    assert all(sheets[s].loc[row, 'Name with Initials'] == "Silva K" for s, row, _ in hits)
+    assert [score for *_, score in hits] == sorted((score for *_, score in hits), reverse=True)
+
+def test_duplicate_map_matches_a_scan():
+    sheets = make_sheets()
+    dups = search_index.DuplicateMap(sheets)
+    entries = {}
+    for sheet_name, idx in scan(sheets, lambda reg: True):
+        entries.setdefault(search_index.normalize_reg(sheets[sheet_name].loc[idx, 'Registration Number']), []).append((sheet_name, idx))
+    repeated = {key: locs for key, locs in entries.items() if len(locs) > 1}
+    assert len(dups) == len(repeated)
+    for key, locs in entries.items():
+        assert dups.find(key) == (locs if len(locs) > 1 else [])
+    for sheet_name in sheets:
+        in_sheet = {key for key, locs in entries.items() if sum(s == sheet_name for s, _ in locs) > 1}
+        assert dups.sheet_count(sheet_name) == len(in_sheet)
+    report = dups.report()
+    assert len(report) == sum(len(locs) for locs in repeated.values())
+    assert (report['S/No'] >= 1).all()
+
+def test_duplicate_map_follows_deletes():
+    sheets = {"Batch 1": pd.DataFrame({'Registration Number': ["R1", "R1", "R2"], 'Name': ["A", "B", "C"]}),
+              "Batch 2": pd.DataFrame({'Registration Number': ["r2 "], 'Name': ["C"]})}
+    dups = search_index.DuplicateMap(sheets)
+    assert dups.find("R1") == [("Batch 1", 0), ("Batch 1", 1)]
+    assert dups.in_sheet("Batch 1", "R1") == [0, 1]
+    assert dups.find("R2") == [("Batch 1", 2), ("Batch 2", 0)]
+    assert dups.in_sheet("Batch 1", "R2") == []
+    dups.update_sheet("Batch 1", sheets["Batch 1"].drop(index=[1, 2]).reset_index(drop=True))
+    assert len(dups) == 0
@@ -0,0 +1,63 @@
+import random
+import numpy as np
+import pandas as pd
+import pytest
+import grade_logic
+
+SUBJECTS = ["BSAA 11013 Fin Acc", "BSAA 11022 Bus Math", "BSAA 11033 Econ"]
+GRADES = list(grade_logic.GRADE_POINTS) + ["AB", "EX", " b+ ", "", None, "Absent"]
+
+# The desktop app's grade table: F carries no points
+DESKTOP_POINTS = {g: p for g, p in grade_logic.GRADE_POINTS.items() if g != 'F'}
+
+def make_sheet(n=120, seed=14):
+    rng = random.Random(seed)
+    df = pd.DataFrame({s: [rng.choice(GRADES) for _ in range(n)] for s in SUBJECTS})
+    df.insert(0, 'Registration Number', [f"SAB/2020/{i:04d}" if i % 9 else None for i in range(n)])
+    df.insert(1, 'Name with Initials', [f"Student {i}" if i % 5 else None for i in range(n)])
+    raw = df.copy()
+    return grade_logic.encode_grade_columns(df, SUBJECTS), raw
+
+def points_of(value, grade_points):
+    grade = grade_logic.normalize_grade(value)
+    return grade_points.get(grade, np.nan) if grade else np.nan
+
+@pytest.mark.parametrize("grade_points", [grade_logic.GRADE_POINTS, DESKTOP_POINTS])
+def test_subject_results_match_a_row_scan(grade_points):
+    df, raw = make_sheet()
+    subject = SUBJECTS[1]
+    results = grade_logic.subject_results(df, subject, grade_points)
+    assert list(results.columns) == ['S/No', 'Registration Number', 'Name', 'Grade', 'Points']
+    assert results['S/No'].tolist() == list(range(1, len(raw) + 1))
+    for idx, row in raw.iterrows():
+        assert results.at[idx, 'Registration Number'] == (row['Registration Number'] or "-")
+        assert results.at[idx, 'Name'] == (row['Name with Initials'] or "-")
+        assert results.at[idx, 'Grade'] == (grade_logic.normalize_grade(row[subject]) or "-")
+        expected = points_of(row[subject], grade_points)
+        assert results.at[idx, 'Points'] == expected or (np.isnan(expected) and np.isnan(results.at[idx, 'Points']))
+
+@pytest.mark.parametrize("grade_points", [grade_logic.GRADE_POINTS, DESKTOP_POINTS])
+def test_grade_distributions_match_a_row_scan(grade_points):
+    df, raw = make_sheet()
+    summaries = grade_logic.grade_distributions(df, SUBJECTS, grade_points)
+    assert list(summaries) == SUBJECTS
+    for subject in SUBJECTS:
+        grades = [grade_logic.normalize_grade(v) for v in raw[subject]]
+        points = [points_of(g, grade_points) for g in grades]
+        graded = [p for p in points if not np.isnan(p)]
+        summary = summaries[subject]
+        assert summary['counts'] == pd.Series([g for g in grades if g]).value_counts().to_dict()
+        assert summary['blank'] == grades.count(None)
+        assert summary['graded'] == len(graded)
+        assert summary['passed'] == sum(p >= grade_logic.SUBJECT_PASS_POINTS for p in graded)
+        assert summary['pass_rate'] == pytest.approx(summary['passed'] / len(graded))
+        assert summary['mean_points'] == pytest.approx(sum(graded) / len(graded))
+
+def test_desktop_table_leaves_fail_grades_ungraded():
+    df = grade_logic.encode_grade_columns(pd.DataFrame({
+        'Registration Number': ["R1", "R2", "R3"], SUBJECTS[0]: ["A", "F", ""]}), SUBJECTS[:1])
+    web = grade_logic.grade_distributions(df, SUBJECTS[:1])[SUBJECTS[0]]
+    desktop = grade_logic.grade_distributions(df, SUBJECTS[:1], DESKTOP_POINTS)[SUBJECTS[0]]
+    assert (web['graded'], web['passed'], web['mean_points']) == (2, 1, 2.0)
+    assert (desktop['graded'], desktop['passed'], desktop['mean_points']) == (1, 1, 4.0)
+    assert np.isnan(grade_logic.subject_results(df, SUBJECTS[0], DESKTOP_POINTS)['Points'][1])
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from virtual_tree import VirtualTreeview
+
+tk = pytest.importorskip("tkinter")
+from tkinter import ttk
+
+VISIBLE = 10
+
+@pytest.fixture
+def view():
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display")
+    root.withdraw()  # unmapped, so the tree shows its configured height of rows
+    tree = ttk.Treeview(root, columns=("reg", "points"), show="headings", height=VISIBLE)
+    scrollbar = ttk.Scrollbar(root, orient="vertical")
+    yield VirtualTreeview(tree, scrollbar)
+    root.destroy()
+
+def rows(n, prefix="R"):
+    return [[f"{prefix}{i:04d}" for i in range(n)], [str(i % 7) for i in range(n)]]
+
+def shown(view):
+    return [view.tree.item(item, "values")[0] for item in view.tree.get_children()]
+
+def selected_text(view):
+    return [view.tree.item(item, "values")[0] for item in view.tree.selection()]
+
+def test_scrolling_maps_a_window_of_rows_onto_the_items(view):
+    view.set_rows(rows(1000))
+    items = view.tree.get_children()
+    assert len(items) == VISIBLE
+    assert shown(view) == [f"R{i:04d}" for i in range(VISIBLE)]
+
+    view.yview("moveto", 0.5)
+    assert shown(view) == [f"R{i:04d}" for i in range(500, 500 + VISIBLE)]
+    assert view.tree.get_children() == items  # the same items, rewritten
+    assert view.scrollbar.get() == pytest.approx((0.5, 0.51))
+
+    view.yview("scroll", 2, "pages")
+    assert view.first == 520
+    view.yview("scroll", -5, "units")
+    assert view.first == 515
+    view._scroll_rows(-10_000)
+    assert view.first == 0
+    view.yview("moveto", 1.0)
+    assert shown(view)[-1] == "R0999" and view.first == 1000 - VISIBLE
+
+    # Sorting and filtering change the order the window reads, not the items
+    view.filter(np.arange(1000) % 2 == 1)
+    assert shown(view) == [f"R{i:04d}" for i in range(1, 2 * VISIBLE, 2)]
+    view.sort_by(0, descending=True)
+    assert shown(view)[:2] == ["R0999", "R0997"]
+    assert len(view.rows()) == 500
+
+def test_selection_follows_the_row_not_the_item(view):
+    view.set_rows(rows(200))
+    items = view.tree.get_children()
+    view.tree.selection_set(items[3])
+    view._on_select()
+    assert view.selected_row() == 3
+
+    # Scrolled away: the recycled item shows another row and is not selected
+    view.yview("moveto", 0.5)
+    assert view.tree.selection() == ()
+    assert view.selected_row() == 3
+    # Scrolled back: the row is selected again, on whichever item shows it
+    view.yview("moveto", 0.0)
+    assert selected_text(view) == ["R0003"]
+
+    # Keyboard moves go through the row order and scroll the selection into view
+    view._move_selection(VISIBLE)
+    assert view.selected_row() == 3 + VISIBLE
+    assert selected_text(view) == [f"R{3 + VISIBLE:04d}"]
+    assert view.first == 3 + 1
+    view._move_selection(-len(view.order))
+    assert view.selected_row() == 0 and view.first == 0
+
+    # Sorted, the selected row keeps its selection at its new place
+    view._move_selection(5)
+    view.sort_by(0, descending=True)
+    assert view.selected_row() == 5
+    view.yview("moveto", 1.0)
+    assert selected_text(view) == ["R0005"]
+
+def test_set_rows_starts_afresh(view):
+    view.set_rows(rows(300))
+    view.filter(np.arange(300) < 100)
+    view.yview("moveto", 0.5)
+    view.tree.selection_set(view.tree.get_children()[0])
+    view._on_select()
+    assert view.selected_row() is not None
+
+    view.set_rows(rows(4, prefix="N"))
+    assert len(view) == 4
+    assert view.first == 0 and view.selected_row() is None
+    assert shown(view) == ["N0000", "N0001", "N0002", "N0003"]  # no filter left over, no spare items
+    assert view.tree.selection() == ()
+    assert view.scrollbar.get() == pytest.approx((0.0, 1.0))
+
+    view.clear()
+    assert len(view) == 0 and view.tree.get_children() == ()
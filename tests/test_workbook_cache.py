@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import threading
+import openpyxl
+import pandas as pd
+import pytest
+import grade_logic
+import workbook_cache
+from conftest import make_workbook
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Counts the workbook parses that get past the caches."""
+    calls = []
+    load = grade_logic.load_workbook_data
+    def counting_load(path, *args, **kwargs):
+        calls.append(path)
+        return load(path, *args, **kwargs)
+    monkeypatch.setattr(grade_logic, "load_workbook_data", counting_load)
+    workbook_cache.memory_cache.clear()
+    yield calls
+    workbook_cache.memory_cache.clear()
+
+def test_memory_cache_drops_least_recently_used():
+    cache = workbook_cache.MemoryCache(budget_bytes=1000)
+    cache.put("a", b"x" * 300)
+    cache.put("b", b"x" * 300)
+    cache.put("c", b"x" * 300)
+    cache.get("a")  # now the most recently used
+    cache.put("d", b"x" * 300)
+    assert cache.get("b") is None
+    assert all(cache.get(k) is not None for k in "acd")
+    assert cache.total_bytes <= 1000
+
+    cache.put("huge", b"x" * 2000)  # over the whole budget: not kept
+    assert cache.get("huge") is None
+    cache.set_budget(400)
+    assert cache.get("d") is not None and cache.get("a") is None
+
+def test_workbook_is_parsed_once_per_version(intake, tmp_path, parses):
+    cache_dir = str(tmp_path / "cache")
+    data, cols, credits = workbook_cache.load_workbook_data(intake, cache_dir=cache_dir)
+    assert list(data) == ["Batch 1", "Batch 2", "Batch 3"]
+    # Second call: the very same frames from memory
+    assert workbook_cache.load_workbook_data(intake, cache_dir=cache_dir)[0] is data
+    assert len(parses) == 1
+
+    # A new process (empty memory cache) reads the pickled parse back from disk
+    workbook_cache.memory_cache.clear()
+    from_disk, disk_cols, disk_credits = workbook_cache.load_workbook_data(intake, cache_dir=cache_dir)
+    assert len(parses) == 1
+    assert (disk_cols, disk_credits) == (cols, credits)
+    for sheet_name, df in data.items():
+        pd.testing.assert_frame_equal(from_disk[sheet_name], df)
+    with open(os.path.join(cache_dir, workbook_cache.INDEX_FILE)) as f:
+        assert json.load(f)['version'] == workbook_cache.CACHE_VERSION
+
+    # Saving the workbook makes the next call parse it again, and drops the stale disk entry
+    wb = openpyxl.load_workbook(intake)
+    wb["Batch 1"]["B5"] = "SAB/2020/9999"
+    wb.save(intake)
+    changed = workbook_cache.load_workbook_data(intake, cache_dir=cache_dir)[0]
+    assert len(parses) == 2
+    assert "SAB/2020/9999" in changed["Batch 1"]['Registration Number'].tolist()
+    assert len([f for f in os.listdir(cache_dir) if f.endswith(".pkl")]) == 1
+
+def test_derived_values_are_built_once_per_version(intake, parses):
+    built = []
+    build = lambda: built.append(1) or len(built)
+    assert workbook_cache.cached_in_memory(intake, "index", build) == 1
+    assert workbook_cache.cached_in_memory(intake, "index", build) == 1
+    os.utime(intake, ns=(0, os.stat(intake).st_mtime_ns + 10 ** 9))
+    assert workbook_cache.cached_in_memory(intake, "index", build) == 2
+
+def test_cache_trouble_falls_back_to_parsing(intake, tmp_path, parses):
+    cache_dir = tmp_path / "cache"
+    cache_dir.write_text("not a directory")
+    data = workbook_cache.load_workbook_data(intake, cache_dir=str(cache_dir))[0]
+    assert list(data) == ["Batch 1", "Batch 2", "Batch 3"]
+
+def test_sessions_share_one_parse(intake, tmp_path, parses):
+    # Streamlit sessions run on their own threads; all of them get the one parse
+    cache_dir = str(tmp_path / "cache")
+    built = []
+    results, indexes = [], []
+    def session():
+        results.append(workbook_cache.load_workbook_data(intake, cache_dir=cache_dir)[0])
+        indexes.append(workbook_cache.cached_in_memory(intake, "index", lambda: built.append(1) or object()))
+    threads = [threading.Thread(target=session) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert len(parses) == 1 and len(built) == 1
+    assert all(data is results[0] for data in results) and all(index is indexes[0] for index in indexes)
+
+def test_memory_budget_evicts_least_recently_used_workbook(intake, tmp_path, parses):
+    other = make_workbook(str(tmp_path / "other.xlsx"), seed=1)
+    cache_dir = str(tmp_path / "cache")
+    data = workbook_cache.load_workbook_data(intake, cache_dir=cache_dir)[0]
+    size = workbook_cache.memory_cache.total_bytes
+    budget = workbook_cache.memory_cache.budget_bytes
+    # Room for one parsed workbook only
+    workbook_cache.memory_cache.set_budget(int(size * 1.5))
+    try:
+        workbook_cache.load_workbook_data(other, cache_dir=cache_dir)
+        assert workbook_cache.memory_cache.total_bytes <= size * 1.5
+        # intake was dropped from memory: it comes back from disk, as an equal but new object
+        again = workbook_cache.load_workbook_data(intake, cache_dir=cache_dir)[0]
+        assert again is not data
+        pd.testing.assert_frame_equal(again["Batch 1"], data["Batch 1"])
+        assert len(parses) == 2
+        assert workbook_cache.load_workbook_data(intake, cache_dir=cache_dir)[0] is again
+    finally:
+        workbook_cache.memory_cache.set_budget(budget)
+
+def test_new_version_replaces_the_old_one_in_memory(intake, tmp_path, parses):
+    cache_dir = str(tmp_path / "cache")
+    workbook_cache.load_workbook_data(intake, cache_dir=cache_dir)
+    size = workbook_cache.memory_cache.total_bytes
+    wb = openpyxl.load_workbook(intake)
+    wb["Batch 1"]["B5"] = "SAB/2020/9999"
+    wb.save(intake)
+    workbook_cache.load_workbook_data(intake, cache_dir=cache_dir)
+    assert len(parses) == 2
+    # Only the newest version is held
+    assert workbook_cache.memory_cache.total_bytes < size * 1.5
+
+def test_disk_cache_lives_in_the_user_cache(intake, tmp_path, parses, user_cache, monkeypatch):
+    # Nothing is read from or written to the working directory, where anyone could plant a pickle
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    workbook_cache.load_workbook_data(intake)
+    assert list(workdir.iterdir()) == []
+    entries = os.listdir(workbook_cache.CACHE_DIR)
+    assert workbook_cache.INDEX_FILE in entries and any(f.endswith(".pkl") for f in entries)
+    if os.name == "posix":
+        assert os.stat(workbook_cache.CACHE_DIR).st_mode & 0o077 == 0
+
+@pytest.mark.skipif(os.name == "nt" or sys.platform == "darwin", reason="XDG cache location")
+def test_user_cache_dir_follows_xdg(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    assert workbook_cache.user_cache_dir() == os.path.join(str(tmp_path / "xdg"), "student-result-system")
+    monkeypatch.delenv("XDG_CACHE_HOME")
+    assert workbook_cache.user_cache_dir() == os.path.join(os.path.expanduser("~"), ".cache", "student-result-system")
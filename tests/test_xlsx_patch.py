@@ -0,0 +1,106 @@
+import re
+import shutil
+import zipfile
+import openpyxl
+from openpyxl.styles import Font, PatternFill
+import pytest
+import grade_logic
+import xlsx_patch
+from conftest import make_workbook
+
+def to_shared_strings(path):
+    """Moves a workbook's inline strings (as openpyxl writes them) into a shared strings part (as Excel does)."""
+    strings = {}
+    def shared(m):
+        return f'<c{m.group(1)} t="s"><v>{strings.setdefault(m.group(2), len(strings))}</v></c>'
+    with zipfile.ZipFile(path) as zin:
+        parts = [(info, zin.read(info)) for info in zin.infolist()]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zout:
+        for info, data in parts:
+            if info.filename.startswith("xl/worksheets/sheet"):
+                data = re.sub(r'<c([^>]*?) t="inlineStr"><is><t[^>]*>(.*?)</t></is></c>', shared, data.decode("utf-8")).encode("utf-8")
+            elif info.filename == "[Content_Types].xml":
+                data = data.replace(b"</Types>", b'<Override PartName="/xl/sharedStrings.xml" ContentType="application/'
+                                    b'vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/></Types>')
+            elif info.filename == "xl/_rels/workbook.xml.rels":
+                data = data.replace(b"</Relationships>", b'<Relationship Type="http://schemas.openxmlformats.org/officeDocument/'
+                                    b'2006/relationships/sharedStrings" Target="sharedStrings.xml" Id="rIdStrings"/></Relationships>')
+            zout.writestr(info.filename, data)
+        items = "".join(f'<si><t xml:space="preserve">{text}</t></si>' for text in strings)
+        zout.writestr("xl/sharedStrings.xml", '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                                              f'count="{len(strings)}" uniqueCount="{len(strings)}">{items}</sst>')
+
+@pytest.fixture
+def styled_intake(tmp_path):
+    path = make_workbook(str(tmp_path / "intake.xlsx"))
+    wb = openpyxl.load_workbook(path)
+    ws = wb["Batch 1"]
+    for row in ws.iter_rows(min_row=4, max_row=12):
+        for cell in row[4:8]:
+            cell.font = Font(bold=cell.row % 2 == 0, color="FF0000" if cell.column == 5 else None)
+            cell.fill = PatternFill("solid", fgColor="FFFF00" if cell.row % 3 else "00FFFF")
+        row[10].number_format = "0.00"
+    ws["N20"] = "=K20*2"
+    wb.save(path)
+    to_shared_strings(path)
+    return path
+
+def workbook_cells(path):
+    wb = openpyxl.load_workbook(path)
+    return {
+        (ws.title, cell.coordinate): (cell.value, cell.font.b, cell.font.color.rgb if cell.font.color else None,
+                                      cell.fill.fgColor.rgb, cell.number_format)
+        for ws in wb.worksheets for row in ws.iter_rows() for cell in row
+    }
+
+def test_patch_save_matches_full_save(styled_intake, tmp_path, monkeypatch):
+    full = str(tmp_path / "full.xlsx")
+    shutil.copy2(styled_intake, full)
+    with zipfile.ZipFile(styled_intake) as z:
+        assert "xl/sharedStrings.xml" in z.namelist()
+
+    pending_changes = {
+        "Batch 1": {"SAB/2020/0001": {"BSAA 11013 Financial Accounting": "A+", "BSAA 12024 Economics": "New grade"},
+                    "SAB/2020/0004": {"BSAA 11022 Business Mathematics": ""}},
+        "Batch 2": {"SAB/2021/0003": {"MGT 21010 Project Work": "C-"}},
+    }
+    pending_deletes = {"Batch 1": ["SAB/2020/0002", "SAB/2020/0009"], "Batch 3": ["SAB/2022/0004"]}
+
+    patched = []
+    patch_workbook = xlsx_patch.patch_workbook
+    monkeypatch.setattr(xlsx_patch, "patch_workbook", lambda *args: patched.append(patch_workbook(*args)) or patched[-1])
+    assert grade_logic.save_changes_to_excel(styled_intake, pending_changes, pending_deletes)[0]
+    assert patched == [True]
+    assert grade_logic.save_changes_to_excel(full, pending_changes, pending_deletes, patch=False)[0]
+
+    patched_cells, full_cells = workbook_cells(styled_intake), workbook_cells(full)
+    assert patched_cells == full_cells
+    with zipfile.ZipFile(styled_intake) as z:
+        assert b"New grade" in z.read("xl/sharedStrings.xml")
+    ws = openpyxl.load_workbook(styled_intake)["Batch 1"]
+    regs = [ws.cell(row=r, column=2).value for r in range(4, ws.max_row + 1)]
+    assert "SAB/2020/0002" not in regs and "SAB/2020/0009" not in regs
+    # The formula below the deleted row follows its row up
+    assert ws["N18"].value == "=K18*2"
+
+def raw_members(path):
+    with zipfile.ZipFile(path) as z, open(path, "rb") as fh:
+        return {info.filename: (info.compress_type, info.CRC, xlsx_patch._raw_member(fh, info)) for info in z.infolist()}
+
+def test_unchanged_parts_are_copied(styled_intake, tmp_path):
+    # Compressed at a level a fresh deflate would not reproduce, so recompressing would show
+    with zipfile.ZipFile(styled_intake) as z:
+        parts = [(info, z.read(info)) for info in z.infolist()]
+    with zipfile.ZipFile(styled_intake, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        for info, data in parts:
+            z.writestr(info.filename, data, compress_type=zipfile.ZIP_STORED if info.filename.endswith(".rels") else None)
+    before = raw_members(styled_intake)
+
+    assert xlsx_patch.patch_workbook(styled_intake, {"Batch 2": {(5, 5): "B"}}, {})
+    after = raw_members(styled_intake)
+    assert list(after) == list(before)
+    changed = {name for name in before if after[name] != before[name]}
+    assert changed == {"xl/worksheets/sheet2.xml"}
+    with zipfile.ZipFile(styled_intake) as z:
+        assert z.testzip() is None
+    assert openpyxl.load_workbook(styled_intake)["Batch 2"]["E5"].value == "B"
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+class VirtualTreeview:
+    """Shows a large table in a ttk.Treeview while keeping only the rows in view as real items.
+
+    The rows live in one array per column. The tree holds a fixed pool of items, one per visible
+    line, whose values are rewritten as the list scrolls; sorting and filtering reorder an array
+    of row positions, so neither touches Tk until the next render."""
+
+    WHEEL_ROWS = 3
+
+    def __init__(self, tree, scrollbar):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.columns = [np.empty(0, dtype=object) for _ in tree["columns"]]
+        self.order = np.arange(0)  # positions of the shown rows, in display order
+        self.first = 0  # index into order of the top visible row
+        self.selected = None  # position of the selected row
+        self._mask = None
+        self._sort = None  # (column, descending)
+
+        # The scrollbar follows the whole list, not the items in the tree
+        tree.configure(yscrollcommand="")
+        scrollbar.configure(command=self.yview)
+        tree.bind("<Configure>", lambda e: self.render(), add="+")
+        tree.bind("<<TreeviewSelect>>", self._on_select, add="+")
+        tree.bind("<MouseWheel>", lambda e: self._scroll_rows(-self.WHEEL_ROWS if e.delta > 0 else self.WHEEL_ROWS))
+        tree.bind("<Button-4>", lambda e: self._scroll_rows(-self.WHEEL_ROWS))
+        tree.bind("<Button-5>", lambda e: self._scroll_rows(self.WHEEL_ROWS))
+        tree.bind("<Up>", lambda e: self._move_selection(-1))
+        tree.bind("<Down>", lambda e: self._move_selection(1))
+        tree.bind("<Prior>", lambda e: self._move_selection(-self._visible_rows()))
+        tree.bind("<Next>", lambda e: self._move_selection(self._visible_rows()))
+        tree.bind("<Home>", lambda e: self._move_selection(-len(self.order)))
+        tree.bind("<End>", lambda e: self._move_selection(len(self.order)))
+
+    def set_rows(self, columns):
+        """Replaces the rows with new column arrays (one per tree column, all the same length)."""
+        self.columns = [np.asarray(col, dtype=object) for col in columns]
+        self.selected = None
+        self._mask = None
+        self.first = 0
+        self._apply()
+
+    def clear(self):
+        self.set_rows([[] for _ in self.columns])
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def filter(self, mask):
+        """Shows only the rows where mask (a boolean array over all rows) is True; None shows all."""
+        self._mask = None if mask is None else np.asarray(mask, dtype=bool)
+        self.first = 0
+        self._apply()
+
+    def sort_by(self, column, descending=False):
+        """Orders the rows by one column: numerically if it holds numbers ('-' and blanks last), else as text."""
+        self._sort = (column, descending)
+        self._apply()
+
+    def enable_heading_sort(self):
+        """Clicking a column heading sorts by it; clicking it again reverses the order."""
+        for i, col in enumerate(self.tree["columns"]):
+            self.tree.heading(col, command=lambda i=i: self.sort_by(
+                i, descending=not self._sort[1] if self._sort and self._sort[0] == i else False))
+
+    def rows(self):
+        """The shown rows as value tuples, in display order (e.g. for printing)."""
+        return list(zip(*(col[self.order] for col in self.columns)))
+
+    def row_values(self, position):
+        return tuple(col[position] for col in self.columns)
+
+    def update_row(self, position, values):
+        for col, value in zip(self.columns, values):
+            col[position] = value
+        self.render()
+
+    def selected_row(self):
+        """Position of the selected row, or None."""
+        return self.selected
+
+    def _apply(self):
+        positions = np.arange(len(self)) if self._mask is None else np.flatnonzero(self._mask)
+        if self._sort is not None and len(positions):
+            column, descending = self._sort
+            values = pd.Series(self.columns[column][positions])
+            keys = pd.to_numeric(values, errors="coerce")
+            if keys.isna().all():
+                keys = values.astype(str).str.lower()
+            keys.index = positions
+            positions = keys.sort_values(ascending=not descending, kind="stable", na_position="last").index.to_numpy()
+        self.order = positions
+        self.render()
+
+    def _visible_rows(self):
+        items = self.tree.get_children()
+        bbox = self.tree.bbox(items[0]) if items else None
+        if not bbox or not self.tree.winfo_ismapped():
+            return max(1, int(self.tree.cget("height")))
+        heading, row_height = bbox[1], bbox[3]
+        return max(1, (self.tree.winfo_height() - heading) // row_height)
+
+    def render(self):
+        n = len(self.order)
+        visible = self._visible_rows()
+        self.first = max(0, min(self.first, n - visible))
+        count = min(visible, n - self.first)
+
+        items = list(self.tree.get_children())
+        if len(items) > count:
+            self.tree.delete(*items[count:])
+            items = items[:count]
+        while len(items) < count:
+            items.append(self.tree.insert("", "end"))
+
+        window = self.order[self.first:self.first + count]
+        for item, position in zip(items, window):
+            self.tree.item(item, values=self.row_values(position))
+
+        hits = np.flatnonzero(window == self.selected) if self.selected is not None else []
+        if len(hits):
+            self.tree.selection_set(items[hits[0]])
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+        if n:
+            self.scrollbar.set(self.first / n, (self.first + count) / n)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def yview(self, *args):
+        """Scrollbar command ('moveto', fraction) or ('scroll', amount, 'units'/'pages')."""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * len(self.order))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self.first += step * self._visible_rows() if args[2] == "pages" else step
+        self.render()
+
+    def _scroll_rows(self, rows):
+        self.first += rows
+        self.render()
+        return "break"
+
+    def _on_select(self, event=None):
+        selection = self.tree.selection()
+        if not selection:
+            return  # rows scrolled out of view keep their selection
+        index = self.tree.index(selection[0])
+        if self.first + index < len(self.order):
+            self.selected = self.order[self.first + index]
+
+    def _move_selection(self, delta):
+        if not len(self.order):
+            return "break"
+        hits = np.flatnonzero(self.order == self.selected) if self.selected is not None else []
+        current = hits[0] if len(hits) else self.first - (1 if delta > 0 else 0)
+        target = max(0, min(len(self.order) - 1, current + delta))
+        self.selected = self.order[target]
+
+        visible = self._visible_rows()
+        if target < self.first:
+            self.first = target
+        elif target >= self.first + visible:
+            self.first = target - visible + 1
+        self.render()
+        return "break"
@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+import grade_logic
+
+def user_cache_dir():
+    """This app's cache directory in the user's own cache location. Cached parses are unpickled,
+    so they must never be read from a directory others can write to, such as the working directory."""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(os.path.join("~", "AppData", "Local"))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser(os.path.join("~", "Library", "Caches"))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache"))
+    return os.path.join(base, "student-result-system")
+
+# On-disk cache of parsed workbooks, so re-selecting an intake skips the Excel parse.
+CACHE_DIR = os.path.join(user_cache_dir(), "workbooks")
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+CACHE_VERSION = 5
+
+INDEX_FILE = "index.json"
+
+# Parsed parts are also kept in memory once per process and shared by every caller (e.g. all
+# Streamlit sessions), so treat returned frames as read-only.
+MEMORY_BUDGET_BYTES = 1024 * 1024 * 1024
+
+_lock = threading.Lock()
+
+def _value_size(value):
+    """Rough in-memory size of a cached value in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, dict):
+        return sum(_value_size(k) + _value_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_value_size(v) for v in value)
+    return sys.getsizeof(value)  # objects such as search indexes report their own size via __sizeof__
+
+class MemoryCache:
+    """Thread-safe LRU of values bounded by a total byte budget. put_version() keeps one version of a
+    slot (e.g. one workbook part) at a time."""
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._items = OrderedDict()
+        self._total = 0
+        self._versions = {}  # slot -> key of its newest version
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None: return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value):
+        size = _value_size(value)
+        with self._lock:
+            self._add(key, value, size)
+
+    def put_version(self, slot, key, value):
+        """put(key, value), dropping the value stored for an older version of slot."""
+        size = _value_size(value)
+        with self._lock:
+            old_key = self._versions.get(slot)
+            if old_key is not None and old_key != key:
+                self._pop(old_key)
+            self._versions[slot] = key
+            self._add(key, value, size)
+
+    def pop(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def set_budget(self, budget_bytes):
+        with self._lock:
+            self.budget_bytes = budget_bytes
+            self._shrink()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._versions.clear()
+            self._total = 0
+
+    @property
+    def total_bytes(self):
+        return self._total
+
+    def _add(self, key, value, size):
+        self._pop(key)
+        if size > self.budget_bytes: return
+        self._items[key] = (value, size)
+        self._total += size
+        self._shrink()
+
+    def _pop(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._total -= item[1]
+
+    def _shrink(self):
+        while self._total > self.budget_bytes and self._items:
+            _, (_, size) = self._items.popitem(last=False)
+            self._total -= size
+
+memory_cache = MemoryCache(MEMORY_BUDGET_BYTES)
+_build_locks = {}  # (path, part) -> lock, so concurrent callers parse a part only once
+
+def file_hash(file_path):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') == CACHE_VERSION:
+            return index
+    except (OSError, ValueError):
+        pass
+    return {'version': CACHE_VERSION, 'paths': {}, 'entries': {}}
+
+def _write_index(cache_dir, index):
+    tmp_path = os.path.join(cache_dir, INDEX_FILE + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(cache_dir, INDEX_FILE))
+
+def _remove_entry(cache_dir, index, key):
+    index['entries'].pop(key, None)
+    try:
+        os.remove(os.path.join(cache_dir, key + ".pkl"))
+    except OSError:
+        pass
+
+def _evict(cache_dir, index, max_bytes):
+    """Drops entries of workbooks that changed or disappeared, then least recently used ones until under max_bytes."""
+    for path in [p for p in index['paths'] if not os.path.exists(p)]:
+        del index['paths'][path]
+    live = {p['hash'] for p in index['paths'].values()}
+    for key in [k for k, e in index['entries'].items() if e['hash'] not in live]:
+        _remove_entry(cache_dir, index, key)
+
+    total = sum(e['size'] for e in index['entries'].values())
+    for key, entry in sorted(index['entries'].items(), key=lambda kv: kv[1]['last_used']):
+        if total <= max_bytes: break
+        total -= entry['size']
+        _remove_entry(cache_dir, index, key)
+
+def _lookup(cache_dir, abs_path, stat, part, max_bytes):
+    """Returns (content_hash, cached value or None) for one part of a workbook."""
+    with _lock:
+        index = _read_index(cache_dir)
+        known = index['paths'].get(abs_path)
+        # Size and mtime unchanged: trust the recorded hash instead of re-reading the file.
+        if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime_ns:
+            content_hash = known['hash']
+        else:
+            content_hash = file_hash(abs_path)
+            index['paths'][abs_path] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': content_hash}
+            _evict(cache_dir, index, max_bytes)
+            _write_index(cache_dir, index)
+
+        key = f"{content_hash}-{part}"
+        if key not in index['entries']:
+            return content_hash, None
+        try:
+            with open(os.path.join(cache_dir, key + ".pkl"), 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            _remove_entry(cache_dir, index, key)
+            _write_index(cache_dir, index)
+            return content_hash, None
+
+        index['entries'][key]['last_used'] = time.time()
+        _write_index(cache_dir, index)
+        return content_hash, value
+
+def _store(cache_dir, abs_path, stat, content_hash, part, value, max_bytes):
+    with _lock:
+        index = _read_index(cache_dir)
+        key = f"{content_hash}-{part}"
+        entry_path = os.path.join(cache_dir, key + ".pkl")
+        with open(entry_path + ".tmp", 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(entry_path + ".tmp", entry_path)
+        index['entries'][key] = {'hash': content_hash, 'size': os.path.getsize(entry_path), 'last_used': time.time()}
+        index['paths'][abs_path] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': content_hash}
+        _evict(cache_dir, index, max_bytes)
+        _write_index(cache_dir, index)
+
+def _cached_on_disk(abs_path, stat, part, build, cache_dir, max_bytes):
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        content_hash, value = _lookup(cache_dir, abs_path, stat, part, max_bytes)
+    except Exception:
+        # Cache trouble must never stop a workbook from loading
+        return build(abs_path)
+    if value is not None:
+        return value
+
+    value = build(abs_path)
+    if value is None:
+        return None
+    try:
+        _store(cache_dir, abs_path, stat, content_hash, part, value, max_bytes)
+    except Exception:
+        pass
+    return value
+
+def _remember(memory_key, value):
+    """Puts a value in the memory cache, dropping the previous version of the same path and part."""
+    abs_path, _, _, part = memory_key
+    memory_cache.put_version((abs_path, part), memory_key, value)
+
+def _cached(file_path, part, build, cache_dir, max_bytes):
+    """Returns the cached `part` of a workbook, or builds it with build(path) and caches it unless it is None."""
+    cache_dir = cache_dir or CACHE_DIR
+    abs_path = os.path.abspath(file_path)
+    try:
+        stat = os.stat(abs_path)
+    except OSError:
+        return build(file_path)
+
+    # In-memory entries are keyed by size and mtime, so a saved workbook is picked up on the next call
+    memory_key = (abs_path, stat.st_size, stat.st_mtime_ns, part)
+    value = memory_cache.get(memory_key)
+    if value is not None:
+        return value
+
+    with _lock:
+        build_lock = _build_locks.setdefault((abs_path, part), threading.Lock())
+    with build_lock:
+        value = memory_cache.get(memory_key)
+        if value is not None:
+            return value
+        value = _cached_on_disk(abs_path, stat, part, build, cache_dir, max_bytes)
+        if value is not None:
+            _remember(memory_key, value)
+        return value
+
+def cached_in_memory(file_path, part, build):
+    """Returns a value derived from a workbook (e.g. a search index), building it with build() once
+    per version of the file. Kept only in the shared memory cache, never on disk."""
+    abs_path = os.path.abspath(file_path)
+    try:
+        stat = os.stat(abs_path)
+    except OSError:
+        return build()
+    memory_key = (abs_path, stat.st_size, stat.st_mtime_ns, part)
+    value = memory_cache.get(memory_key)
+    if value is not None:
+        return value
+
+    with _lock:
+        build_lock = _build_locks.setdefault((abs_path, part), threading.Lock())
+    with build_lock:
+        value = memory_cache.get(memory_key)
+        if value is None:
+            value = build()
+            _remember(memory_key, value)
+        return value
+
+def load_workbook_data(file_path, cache_dir=None, max_bytes=MAX_CACHE_BYTES, streaming=True, workers=1):
+    """Cached grade_logic.load_workbook_data; re-parses only when the workbook has changed."""
+    def build(path):
+        result = grade_logic.load_workbook_data(path, streaming=streaming, workers=workers)
+        return result if result[0] is not None else None
+
+    result = _cached(file_path, "workbook", build, cache_dir, max_bytes)
+    return result if result is not None else (None, None, None)
+
+def list_result_sheets(file_path, cache_dir=None, max_bytes=MAX_CACHE_BYTES):
+    """Cached grade_logic.list_result_sheets."""
+    return _cached(file_path, "sheets", grade_logic.list_result_sheets, cache_dir, max_bytes)
+
+def load_sheet_data(file_path, sheet_name, cache_dir=None, max_bytes=MAX_CACHE_BYTES):
+    """Cached grade_logic.load_sheet_data; each sheet is cached on its own."""
+    part = "sheet-" + hashlib.sha1(sheet_name.encode('utf-8')).hexdigest()[:16]
+    return _cached(file_path, part, lambda path: grade_logic.load_sheet_data(path, sheet_name), cache_dir, max_bytes)
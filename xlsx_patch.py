@@ -0,0 +1,377 @@
+import os
+import re
+import zlib
+import shutil
+import struct
+import zipfile
+import tempfile
+import bisect
+import posixpath
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, unescape
+from openpyxl.formula.tokenizer import Tokenizer, Token
+from openpyxl.utils.cell import column_index_from_string, get_column_letter
+
+# Patch-save: edits an .xlsx in place by rewriting only the worksheet XML of the edited sheets
+# (plus the shared strings they add to); every other part of the zip is copied byte for byte,
+# still compressed, so a save costs the same however many sheets the workbook has.
+# Sheets using features whose cell references this cannot keep consistent are left to openpyxl.
+
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+# Sheet parts that anchor to rows outside the sheet XML (or share formulas across rows); rows can't
+# be deleted from such a sheet without rewriting them too
+ROW_ANCHORED = ('t="shared"', 't="array"', '<tableParts', '<drawing', '<legacyDrawing', '<rowBreaks', '<x14:')
+
+_ROW = re.compile(r'<row\b([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+_CELL = re.compile(r'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_R_ATTR = re.compile(r'(?<![\w:])r="([A-Z]*)(\d+)"')
+_S_ATTR = re.compile(r'(?<![\w:])s="(\d+)"')
+_FORMULA = re.compile(r'(<(f|formula|formula1|formula2)\b[^>]*>)(.*?)(</\2>)', re.S)
+_RANGE_ATTR = re.compile(r'(?<![\w:])(ref|sqref)="([^"]*)"')
+_MERGE = re.compile(r'<mergeCell\b[^>]*?ref="([^"]*)"[^>]*/>')
+_SHARED_STRING = re.compile(r'<si>(.*?)</si>|<si\s*/>', re.S)
+_PLAIN_TEXT = re.compile(r'<t(?:\s[^>]*)?>([^<]*)</t>|<t\s*/>')
+
+# A cell or row part of a range reference: optional column letters, then the row number
+_REF_ROW = re.compile(r"^(\$?[A-Za-z]{0,3})(\$?)(\d+)$")
+
+class _Unsupported(Exception):
+    pass
+
+def shift_reference(ref, deleted, sheet_title):
+    """A range reference as it reads once the sorted Excel rows in deleted are gone; #REF! if nothing is left of it."""
+    if '!' in ref:
+        sheet, cells = ref.rsplit('!', 1)
+        if sheet.strip("'").replace("''", "'") != sheet_title:
+            return ref
+        prefix = sheet + '!'
+    else:
+        prefix, cells = '', ref
+    parts = cells.split(':')
+    matches = [_REF_ROW.match(part) for part in parts]
+    if len(parts) > 2 or not all(matches):
+        return ref  # whole columns, names and anything unusual keep their text
+    rows = [int(m.group(3)) for m in matches]
+    # A range shrinks to its surviving rows: the start moves to the next one, the end back to the previous one
+    start = rows[0] - bisect.bisect_left(deleted, rows[0])
+    end = rows[-1] - bisect.bisect_right(deleted, rows[-1])
+    if start > end:
+        return "#REF!"
+    new_rows = [start, end] if len(parts) == 2 else [start]
+    return prefix + ':'.join(f"{m.group(1)}{m.group(2)}{r}" for m, r in zip(matches, new_rows))
+
+def shift_formula(formula, deleted, sheet_title):
+    """A formula ('=...') with its references to sheet_title moved past the deleted rows, as Excel would."""
+    tokens = Tokenizer(formula)
+    changed = False
+    for token in tokens.items:
+        if token.type == Token.OPERAND and token.subtype == Token.RANGE:
+            shifted = shift_reference(token.value, deleted, sheet_title)
+            if shifted != token.value:
+                token.value, changed = shifted, True
+    return tokens.render() if changed else formula
+
+def _shift_xml_formula(text, deleted, sheet_title):
+    # Formulas are stored without the leading '=' and XML-escaped
+    return escape(shift_formula("=" + unescape(text), deleted, sheet_title)[1:])
+
+class _SharedStrings:
+    """The shared string table, parsed on first use; new strings are appended at the end."""
+
+    def __init__(self, xml):
+        self.xml = xml
+        self.index = None
+        self.count = 0
+        self.added = []
+
+    def _parse(self):
+        self.index = {}
+        if '<sst' not in self.xml:
+            raise _Unsupported("prefixed shared strings")
+        for i, m in enumerate(_SHARED_STRING.finditer(self.xml)):
+            text = _PLAIN_TEXT.fullmatch(m.group(1) or "<t/>")
+            if text:
+                self.index.setdefault(unescape(text.group(1) or ""), i)
+            self.count = i + 1
+
+    def lookup(self, text):
+        if self.index is None:
+            self._parse()
+        if text not in self.index:
+            self.index[text] = self.count + len(self.added)
+            self.added.append(text)
+        return self.index[text]
+
+    def render(self):
+        space = ' xml:space="preserve"'
+        items = "".join(f'<si><t{space if t != t.strip() else ""}>{escape(t)}</t></si>' for t in self.added)
+        total = self.count + len(self.added)
+        xml = re.sub(r'(<sst\b[^>]*?)\s+uniqueCount="\d+"', r'\1', self.xml, count=1)
+        xml = re.sub(r'(<sst\b[^>]*?)\s+count="\d+"', r'\1', xml, count=1)
+        xml = re.sub(r'<sst\b', f'<sst uniqueCount="{total}"', xml, count=1)
+        return xml.replace('</sst>', items + '</sst>', 1)
+
+def _cell_xml(ref, style, value, strings):
+    s = f' s="{style}"' if style else ''
+    if value is None or (isinstance(value, float) and value != value) or value == "":
+        return f'<c r="{ref}"{s}/>'
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{s} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"{s}><v>{value!r}</v></c>'
+    value = str(value)
+    if strings is not None:
+        return f'<c r="{ref}"{s} t="s"><v>{strings.lookup(value)}</v></c>'
+    space = ' xml:space="preserve"' if value != value.strip() else ''
+    return f'<c r="{ref}"{s} t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>'
+
+def _patch_row(attrs, content, row, new_row, row_edits, deleted, title, strings):
+    """One <row> element with its edits applied, renumbered to new_row."""
+    content = content or ""
+    if row_edits:
+        edits = dict(row_edits)
+        pieces, last = [], 0
+        for m in _CELL.finditer(content):
+            ref = _R_ATTR.search(m.group(1))
+            if ref is None:
+                raise _Unsupported("cell without a reference")
+            col = column_index_from_string(ref.group(1))
+            # New cells go before the first cell to their right
+            pieces.append(content[last:m.start()])
+            for new_col in sorted(c for c in edits if c < col):
+                pieces.append(_cell_xml(f"{get_column_letter(new_col)}{row}", None, edits.pop(new_col), strings))
+            if col in edits:
+                style = _S_ATTR.search(m.group(1))
+                pieces.append(_cell_xml(f"{ref.group(1)}{row}", style and style.group(1), edits.pop(col), strings))
+            else:
+                pieces.append(m.group(0))
+            last = m.end()
+        tail = content[last:]
+        for new_col in sorted(edits):
+            pieces.append(_cell_xml(f"{get_column_letter(new_col)}{row}", None, edits[new_col], strings))
+        content = "".join(pieces) + tail
+        attrs = re.sub(r'\s+spans="[^"]*"', '', attrs)  # spans is only a hint; it may no longer cover the cells
+
+    if deleted:
+        content = _FORMULA.sub(lambda m: m.group(1) + _shift_xml_formula(m.group(3), deleted, title) + m.group(4), content)
+        if new_row != row:
+            content = re.sub(rf'(<c\b[^>]*?(?<![\w:])r="[A-Z]+){row}"', rf'\g<1>{new_row}"', content)
+            attrs = _R_ATTR.sub(f'r="{new_row}"', attrs, count=1)
+    return f'<row{attrs}>{content}</row>' if content else f'<row{attrs}/>'
+
+def _shift_ranges(text, deleted, title):
+    """Space-separated ranges (a sqref) past the deleted rows, without the ones that were deleted whole."""
+    kept = [r for r in (shift_reference(part, deleted, title) for part in text.split()) if r != "#REF!"]
+    if not kept:
+        raise _Unsupported("range deleted whole")
+    return " ".join(kept)
+
+def _patch_sheet(xml, title, edits, deleted, strings):
+    """The worksheet XML with the cell edits ({(row, col): value}) made and the deleted rows removed."""
+    data = re.search(r'<sheetData\b[^>]*?(?:/>|>(.*?)</sheetData>)', xml, re.S)
+    if data is None:
+        raise _Unsupported("no sheetData")
+    if deleted and any(tag in xml for tag in ROW_ANCHORED):
+        raise _Unsupported("rows anchored outside the sheet data")
+    gone = set(deleted)
+    by_row = {}
+    for (row, col), value in edits.items():
+        if row not in gone:
+            by_row.setdefault(row, {})[col] = value
+
+    def patch(m):
+        ref = _R_ATTR.search(m.group(1))
+        if ref is None:
+            raise _Unsupported("row without a number")
+        row = int(ref.group(2))
+        if row in gone:
+            return ""
+        row_edits = by_row.pop(row, None)
+        if not row_edits and not deleted:
+            return m.group(0)
+        return _patch_row(m.group(1), m.group(2), row, row - bisect.bisect_left(deleted, row), row_edits, deleted, title, strings)
+
+    body = _ROW.sub(patch, data.group(1) or "")
+    if by_row:
+        raise _Unsupported("edited rows missing from the sheet")
+    head, tail = xml[:data.start()], xml[data.end():]
+    if deleted:
+        head = re.sub(r'(<dimension\b[^>]*?ref=")([^"]*)"',
+                      lambda m: m.group(1) + shift_reference(m.group(2), deleted, title).replace("#REF!", "A1") + '"', head)
+
+        block = re.search(r'<mergeCells\b[^>]*>.*?</mergeCells>', tail, re.S)
+        parts = [tail[:block.start()], tail[block.end():]] if block else [tail]
+        for i, part in enumerate(parts):
+            part = _RANGE_ATTR.sub(lambda m: f'{m.group(1)}="{_shift_ranges(m.group(2), deleted, title)}"', part)
+            parts[i] = _FORMULA.sub(lambda m: m.group(1) + _shift_xml_formula(m.group(3), deleted, title) + m.group(4), part)
+        if block:
+            # Merged ranges are trimmed to their surviving rows; one left with a single cell is dropped
+            merges = []
+            for m in _MERGE.finditer(block.group(0)):
+                ref = shift_reference(m.group(1), deleted, title)
+                if ref != "#REF!" and ':' in ref and ref.split(':')[0] != ref.split(':')[1]:
+                    merges.append(f'<mergeCell ref="{ref}"/>')
+            merged = f'<mergeCells count="{len(merges)}">{"".join(merges)}</mergeCells>' if merges else ''
+            parts.insert(1, merged)
+        tail = "".join(parts)
+    return head + f'<sheetData>{body}</sheetData>' + tail
+
+def _part_path(base, target):
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+def _rels_path(part):
+    return posixpath.join(posixpath.dirname(part), "_rels", posixpath.basename(part) + ".rels")
+
+def _workbook_parts(zin):
+    """(workbook part, {sheet name: worksheet part}, shared strings part or None, calcChain part or None)."""
+    workbook = None
+    for rel in ET.fromstring(zin.read("_rels/.rels")).iter(f"{{{PKG_REL_NS}}}Relationship"):
+        if rel.get("Type", "").endswith("/officeDocument"):
+            workbook = _part_path("", rel.get("Target"))
+    if workbook is None:
+        raise _Unsupported("no workbook part")
+    targets, shared, calc_chain = {}, None, None
+    for rel in ET.fromstring(zin.read(_rels_path(workbook))).iter(f"{{{PKG_REL_NS}}}Relationship"):
+        path = _part_path(workbook, rel.get("Target"))
+        kind = rel.get("Type", "")
+        targets[rel.get("Id")] = path
+        if kind.endswith("/sharedStrings"): shared = path
+        elif kind.endswith("/calcChain"): calc_chain = path
+    sheets = {}
+    for sheet in ET.fromstring(zin.read(workbook)).iter(f"{{{MAIN_NS}}}sheet"):
+        sheets[sheet.get("name")] = targets.get(sheet.get(f"{{{REL_NS}}}id"))
+    return workbook, sheets, shared, calc_chain
+
+def _shift_defined_names(xml, deleted_rows):
+    # Defined names (print areas, filters) refer to rows by number as well
+    for sheet_name, deleted in deleted_rows.items():
+        xml = re.sub(r'(<definedName\b[^>]*>)(.*?)(</definedName>)',
+                     lambda m: m.group(1) + _shift_xml_formula(m.group(2), deleted, sheet_name) + m.group(3), xml, flags=re.S)
+    return xml
+
+def _full_calc_on_load(xml):
+    # Cached formula results in the edited sheets are stale; have Excel recalculate when it opens the file
+    if re.search(r'<calcPr\b', xml):
+        xml = re.sub(r'(<calcPr\b[^>]*?)\s+fullCalcOnLoad="[^"]*"', r'\1', xml, count=1)
+        return re.sub(r'<calcPr\b', '<calcPr fullCalcOnLoad="1"', xml, count=1)
+    after = re.search(r'<(oleSize|customWorkbookViews|pivotCaches|smartTagPr|smartTagTypes|webPublishing|'
+                      r'fileRecoveryPr|webPublishObjects|extLst)\b|</workbook>', xml)
+    return xml[:after.start()] + '<calcPr fullCalcOnLoad="1"/>' + xml[after.start():]
+
+def _raw_member(fh, info):
+    """A zip member's compressed bytes as stored, read past its local header."""
+    fh.seek(info.header_offset)
+    header = fh.read(30)
+    if header[:4] != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    fh.seek(info.header_offset + 30 + name_len + extra_len)
+    return fh.read(info.compress_size)
+
+def _deflate(data):
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+class _ZipWriter:
+    """Writes a zip from members that are already compressed, so untouched parts go in without being
+    inflated and deflated again (zipfile can only write what it compresses itself). No zip64: a
+    workbook that needs it is left to openpyxl."""
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.central = []
+
+    def add(self, info, data, crc, file_size, compress_type, copied):
+        if info.flag_bits & 0x01:
+            raise _Unsupported("encrypted member")
+        offset = self.fh.tell()
+        if max(offset, len(data), file_size) > 0xFFFFFFFF or len(self.central) >= 0xFFFF:
+            raise _Unsupported("zip64")
+        name = info.filename.encode("utf-8")
+        # Copied members keep their compression options; CRC and sizes go in the local header,
+        # never in a trailing data descriptor
+        flags = (info.flag_bits & ~0x08 if copied else 0) | (0 if info.filename.isascii() else 0x800)
+        year, month, day, hour, minute, second = info.date_time
+        dos_time = hour << 11 | minute << 5 | second // 2
+        dos_date = (year - 1980) << 9 | month << 5 | day
+        needed = 20 if compress_type == zipfile.ZIP_DEFLATED else max(info.extract_version, 10)
+        self.fh.write(struct.pack("<IHHHHHIIIHH", 0x04034b50, needed, flags, compress_type, dos_time, dos_date,
+                                  crc, len(data), file_size, len(name), 0) + name)
+        self.fh.write(data)
+        self.central.append(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014b50, info.create_system << 8 | info.create_version,
+                                        needed, flags, compress_type, dos_time, dos_date, crc, len(data), file_size,
+                                        len(name), 0, 0, 0, info.internal_attr, info.external_attr, offset) + name)
+
+    def close(self):
+        start = self.fh.tell()
+        for entry in self.central:
+            self.fh.write(entry)
+        size = self.fh.tell() - start
+        if start > 0xFFFFFFFF:
+            raise _Unsupported("zip64")
+        self.fh.write(struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, len(self.central), len(self.central), size, start, 0))
+
+def patch_workbook(file_path, edits, deletes):
+    """Patch-saves an .xlsx: edits is {sheet: {(row, col): value}}, deletes {sheet: Excel rows to delete},
+    all 1-based. Only those sheets' XML (and the shared strings) is rewritten; the file is replaced
+    atomically. Returns False, without touching the file, if it needs a full openpyxl save instead."""
+    try:
+        with zipfile.ZipFile(file_path) as zin:
+            workbook, sheets, shared, calc_chain = _workbook_parts(zin)
+            strings = _SharedStrings(zin.read(shared).decode("utf-8")) if shared else None
+            replaced, deleted_rows, formulas = {}, {}, False
+            for sheet_name in set(edits) | set(deletes):
+                part = sheets.get(sheet_name)
+                if part is None:
+                    continue
+                deleted = sorted(set(deletes.get(sheet_name) or ()))
+                xml = zin.read(part).decode("utf-8")
+                formulas = formulas or re.search(r'<f[\s>]', xml) is not None
+                replaced[part] = _patch_sheet(xml, sheet_name, edits.get(sheet_name) or {}, deleted, strings).encode("utf-8")
+                if deleted:
+                    deleted_rows[sheet_name] = deleted
+            if not replaced:
+                return True
+
+            if strings is not None and strings.added:
+                replaced[shared] = strings.render().encode("utf-8")
+            dropped = set()
+            if formulas or deleted_rows:
+                book = _shift_defined_names(zin.read(workbook).decode("utf-8"), deleted_rows)
+                replaced[workbook] = (_full_calc_on_load(book) if formulas else book).encode("utf-8")
+            if formulas:
+                if calc_chain and calc_chain in zin.NameToInfo:
+                    # The calculation chain lists formula cells by position; Excel rebuilds it
+                    dropped.add(calc_chain)
+                    types = zin.read("[Content_Types].xml").decode("utf-8")
+                    replaced["[Content_Types].xml"] = re.sub(rf'<Override\b[^>]*PartName="/{re.escape(calc_chain)}"[^>]*/>', '', types).encode("utf-8")
+                    rels = zin.read(_rels_path(workbook)).decode("utf-8")
+                    replaced[_rels_path(workbook)] = re.sub(r'<Relationship\b[^>]*/calcChain"[^>]*/>', '', rels).encode("utf-8")
+
+            folder = os.path.dirname(os.path.abspath(file_path))
+            fd, temp_path = tempfile.mkstemp(suffix=".xlsx", dir=folder)
+            try:
+                with os.fdopen(fd, "wb") as fh, open(file_path, "rb") as src:
+                    zout = _ZipWriter(fh)
+                    for info in zin.infolist():
+                        if info.filename in dropped:
+                            continue
+                        if info.filename in replaced:
+                            data = replaced[info.filename]
+                            zout.add(info, _deflate(data), zlib.crc32(data), len(data), zipfile.ZIP_DEFLATED, copied=False)
+                        else:
+                            zout.add(info, _raw_member(src, info), info.CRC, info.file_size, info.compress_type, copied=True)
+                    zout.close()
+                shutil.copymode(file_path, temp_path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+    except (_Unsupported, KeyError, ET.ParseError, UnicodeDecodeError, zipfile.BadZipFile):
+        return False
+    os.replace(temp_path, file_path)
+    return True